@@ -1,25 +1,126 @@
-from flask import Flask, request, render_template, jsonify, send_file, send_from_directory
+from flask import Flask, Response, request, render_template, jsonify, send_file
+import importlib
+import math
 import os
-import subprocess
+import re
+import tempfile
+import threading
 from datetime import datetime
 import json
-import numpy as np
+from collections import OrderedDict
+from werkzeug.security import safe_join
+from werkzeug.utils import secure_filename
 
-# Import del extractor (archivo en la raíz del repo)
-from pcoords_extraction import extract_and_store_pcoord_sets
-
-# Intentamos importar la función de circularización si existe
-try:
-    from circularizarDNA import circularize_pdb
-except ImportError:
-    circularize_pdb = None
+# Solo módulos livianos al cargar la app. Los que dependen de NumPy (constructor de
+# B-DNA, lectores, extractor de P, registro de subidas, análisis) se importan dentro
+# de las rutas que los usan, al primer request; warm_up() los carga por adelantado.
+from metrics import REGISTRY as metrics_registry, RequestTimer
+from result_cache import ResultCache, cache_key, variant_key
+from jobs import JobQueue
+from compression import compress, ensure_precompressed, iter_gunzip, iter_gzip, negotiate_encoding
 
 app = Flask(__name__)
-UPLOAD_FOLDER = 'uploads'
+UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'uploads')
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+app.config['MAX_UPLOAD_BYTES'] = int(os.environ.get('MAX_UPLOAD_BYTES', 512 * 1024 * 1024))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Arrays parseados de las subidas, mapeados en memoria y compartidos entre workers
+UPLOAD_REGISTRY_MAX_BYTES = int(os.environ.get('UPLOAD_REGISTRY_MAX_BYTES', 1024 * 1024 * 1024))
+_upload_registries = {}  # carpeta de subidas -> registro
+_upload_registry_lock = threading.Lock()
+
+# Módulos que las rutas importan al primer uso; warm_up() los carga de antemano
+WARM_UP_MODULES = (
+    'batch_generation', 'circularizarDNA', 'generate_b_dna', 'incremental_generation', 'level_of_detail',
+    'ordenar_pdb', 'pcoords_extraction', 'pdb_reader', 'steric_clashes', 'structure_format',
+    'structure_selection', 'upload_registry', 'writhe_twist',
+)
+
+# Análisis de P por subida (r, CM, A, B), indexado por hash de contenido
+PCOORDS_CACHE_ITEMS = 128
+pcoords_cache = OrderedDict()  # hash -> análisis
+pcoords_lock = threading.Lock()
+# Wr/Tw/Lk por (hash, método, cierre): la integral de Gauss es O(n^2)
+writhe_cache = OrderedDict()
+# Choques estéricos por (hash, superposición) de las subidas
+clash_cache = OrderedDict()
+
+# Caché de resultados de /generate (LRU en memoria + disco con tope de tamaño)
+RESULT_CACHE_FOLDER = os.environ.get('RESULT_CACHE_FOLDER', 'cache')
+RESULT_CACHE_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+result_cache = ResultCache(RESULT_CACHE_FOLDER, max_bytes=RESULT_CACHE_MAX_BYTES)
+# Mismo directorio para la variante binaria (.npz), con su propio tope
+structure_cache = ResultCache(RESULT_CACHE_FOLDER, max_bytes=RESULT_CACHE_MAX_BYTES, suffix='.npz')
+# Secuencia, sigma y topología de cada estructura generada, por X-Structure-Id (para editarla)
+structure_records = ResultCache(RESULT_CACHE_FOLDER, max_bytes=64 * 1024 * 1024, suffix='.json')
+
+# Arrays lineales (antes de circularizar) de las últimas estructuras generadas, para /generate/edit
+EDIT_ARRAYS_ITEMS = 4
+edit_arrays = OrderedDict()  # X-Structure-Id -> estructura lineal
+edit_arrays_lock = threading.Lock()
+
+# Formatos de salida: PDB (texto) o binario compacto (structure_format); mimetypes en _format_mimetype
+OUTPUT_FORMATS = ('pdb', 'npz')
+
+# Trabajos asíncronos de generación (pool de procesos; estado compartido en disco)
+JOBS_FOLDER = os.environ.get('JOBS_FOLDER', 'jobs')
+JOB_WORKERS = int(os.environ['JOB_WORKERS']) if os.environ.get('JOB_WORKERS') else None
+job_queue = JobQueue(JOBS_FOLDER, result_cache, max_workers=JOB_WORKERS)
+
+# Respuestas armadas en memoria más chicas que esto se envían sin comprimir
+COMPRESS_MIN_BYTES = 1024
+
+# Pares fuera de rango que se incluyen en X-Validation (el resto solo se cuenta)
+VALIDATION_HEADER_OUTLIERS = 10
+
+# Formatos de /uploads/<archivo>/select y tope de átomos para responder en JSON
+SELECTION_FORMATS = ('json', 'npz', 'f32')
+SELECTION_JSON_MAX_ATOMS = 100000
+
+# Tope de pares de residuos listados por /uploads/<archivo>/clashes
+CLASH_MAX_PAIRS = 10000
+
+# Tope de estructuras por lote en /generate/batch
+BATCH_MAX_STRUCTURES = int(os.environ.get('BATCH_MAX_STRUCTURES', 500))
+# Tope de pares de bases sumando todas las estructuras del lote
+BATCH_MAX_BASE_PAIRS = int(os.environ.get('BATCH_MAX_BASE_PAIRS', 2000000))
+
+
+def get_upload_registry():
+    """Registro de subidas (ver upload_registry) de app.config['UPLOAD_FOLDER'], creado al primer uso.
+
+    Hay uno por carpeta: si la configuración cambia (benchmark.py, pruebas), el
+    registro sigue a la carpeta donde las rutas guardan y sirven los archivos.
+    """
+    from upload_registry import UploadRegistry
+
+    folder = app.config['UPLOAD_FOLDER']
+    with _upload_registry_lock:
+        if folder not in _upload_registries:
+            _upload_registries[folder] = UploadRegistry(folder, max_bytes=UPLOAD_REGISTRY_MAX_BYTES)
+        return _upload_registries[folder]
+
+
+def warm_up():
+    """Carga por adelantado lo que pagaría el primer request de cada ruta.
+
+    Importa los módulos con NumPy, parsea las plantillas AT/TA/CG/GC y arma y
+    escribe una hélice mínima. Con gunicorn y preload_app (ver gunicorn.conf.py)
+    se llama en el proceso maestro antes de crear los workers, que heredan todo
+    por copy-on-write. No crea pools de hilos ni de procesos: no sobreviven al fork.
+    """
+    for module in WARM_UP_MODULES:
+        importlib.import_module(module)
+    from generate_b_dna import build_duplex, get_template_store
+    from ordenar_pdb import format_structure_pdb
+
+    get_template_store()
+    format_structure_pdb(build_duplex('ACGT', 0.0))
+    get_upload_registry()
+
 
 @app.route('/')
 def index():
@@ -29,142 +130,995 @@ def index():
 @app.route('/upload', methods=['POST'])
 def upload():
     """
-    Recibe un .pdb, lo guarda en uploads/ y extrae coordenadas de átomos P.
-    Guarda un JSON silencioso: uploads/<filename>_P_coords.json con A y B.
+    Recibe un .pdb y lo procesa por chunks: cada chunk se escribe en uploads/ y, en la
+    misma pasada, se extraen las coordenadas de átomos P; al final se calculan radio
+    de giro y CM. El análisis queda en memoria y en uploads/<base>_P_coords.npz, y la
+    estructura parseada en el registro de subidas, antes de reemplazar el archivo.
+
+    Acepta el cuerpo crudo con ?filename=<nombre>.pdb (lo que envía la página) o
+    multipart (campo 'file'); en multipart Werkzeug recibe el cuerpo completo antes
+    de que empiece el parseo por chunks.
+    Un .pdb.gz se descomprime al vuelo y se guarda como <nombre>.pdb; el .gz recibido
+    queda como su variante precomprimida para servirlo.
+    Rechaza archivos de más de MAX_UPLOAD_BYTES (descomprimidos) o cuyo contenido no parece PDB.
     """
-    file = request.files.get('file')
-    if file and file.filename.endswith('.pdb'):
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], file.filename)
-        file.save(filepath)
+    max_bytes = app.config['MAX_UPLOAD_BYTES']
+    if request.content_length is not None and request.content_length > max_bytes:
+        return jsonify({'success': False, 'error': 'File too large'}), 413
 
-        # Extraer y guardar coordenadas P (silencioso; no interrumpe el flujo si falla)
-        try:
-            out_json = extract_and_store_pcoord_sets(filepath)
-            app.logger.info(f"P coords guardadas en {out_json}")
-        except Exception as e:
-            app.logger.warning(f"Extracción P falló para {filepath}: {e}")
+    # Solo se toca request.files en multipart; el cuerpo crudo se lee directamente del socket
+    if request.mimetype == 'multipart/form-data':
+        file = request.files.get('file')
+        filename, stream = (file.filename, file.stream) if file else ('', None)
+    else:
+        filename, stream = request.args.get('filename', ''), request.stream
+
+    filename = secure_filename(filename or '')
+    gzipped = filename.endswith('.pdb.gz')
+    if gzipped:
+        filename = filename[:-len('.gz')]
+    if stream is None or not filename.endswith('.pdb'):
+        return jsonify({'success': False, 'error': 'Invalid file type'}), 400
+
+    from pcoords_extraction import PCoordStreamParser
 
-        return jsonify({'success': True, 'filename': file.filename})
-    return jsonify({'success': False, 'error': 'Invalid file type'}), 400
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    parser = PCoordStreamParser()
+    fd, tmp_path = tempfile.mkstemp(dir=app.config['UPLOAD_FOLDER'], suffix='.part')
+    gz_fd, gz_tmp_path = tempfile.mkstemp(dir=app.config['UPLOAD_FOLDER'], suffix='.part') if gzipped else (None, None)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            if gzipped:
+                with os.fdopen(gz_fd, 'wb') as gz_out:
+                    chunks = iter_gunzip(stream, UPLOAD_CHUNK_BYTES, raw_sink=gz_out)
+                    error = _store_upload_chunks(chunks, parser, out, max_bytes)
+            else:
+                chunks = iter(lambda: stream.read(UPLOAD_CHUNK_BYTES), b'')
+                error = _store_upload_chunks(chunks, parser, out, max_bytes)
+            if error:
+                return error
+            analysis = parser.finish()
+        # Se registra, analiza y vincula el temporal antes de reemplazar el archivo: quien
+        # lea el nombre en el medio ve el contenido anterior con su hash, o el nuevo ya
+        # registrado, nunca uno con el hash del otro
+        registry = get_upload_registry()
+        registry.add(analysis['hash'], tmp_path)
+        _store_analysis(filepath, analysis)
+        registry.link(filename, analysis['hash'])
+        os.replace(tmp_path, filepath)
+        if gzipped:
+            os.replace(gz_tmp_path, filepath + '.gz')
+            os.utime(filepath + '.gz')  # más nuevo que el .pdb: variante precomprimida válida
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    finally:
+        for path in (tmp_path, gz_tmp_path):
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    return jsonify({'success': True, 'filename': filename})
+
+
+def _store_analysis(filepath, analysis):
+    """Guarda el análisis de P de una subida (silencioso; no interrumpe el flujo si falla)."""
+    from pcoords_extraction import pcoord_analysis_path, save_pcoord_analysis
+
+    try:
+        out_path = save_pcoord_analysis(pcoord_analysis_path(filepath), analysis)
+        _remember_analysis(analysis)
+        app.logger.info(f"P coords guardadas en {out_path}")
+    except Exception as e:
+        app.logger.warning(f"Extracción P falló para {filepath}: {e}")
+
+
+def _store_upload_chunks(chunks, parser, out, max_bytes):
+    """Escribe y analiza los chunks de una subida; devuelve una respuesta 413 si pasa el tope."""
+    for chunk in chunks:
+        if parser.size + len(chunk) > max_bytes:
+            return jsonify({'success': False, 'error': 'File too large'}), 413
+        parser.feed(chunk)
+        out.write(chunk)
+    return None
+
+
+def _remember_analysis(analysis):
+    """Guarda el análisis en el LRU en memoria, por hash de contenido."""
+    with pcoords_lock:
+        pcoords_cache[analysis['hash']] = analysis
+        pcoords_cache.move_to_end(analysis['hash'])
+        while len(pcoords_cache) > PCOORDS_CACHE_ITEMS:
+            pcoords_cache.popitem(last=False)
+
+
+def _upload_hash(filename):
+    """Hash vigente del contenido de un .pdb subido, según el registro de subidas; None si no existe.
+
+    Se consulta en cada request: si otro worker volvió a subir el archivo, los
+    análisis en memoria del contenido anterior dejan de usarse.
+    """
+    filename = secure_filename(filename)
+    if not filename.endswith('.pdb'):
+        return None
+    return get_upload_registry().lookup(filename)
+
+
+def _upload_analysis(filename, content_hash=None):
+    """Análisis de P de un archivo subido: de memoria o, si no está, del .npz. None si no existe.
+
+    content_hash es el de _upload_hash (se consulta si no se pasa). Si el .npz es de
+    otro contenido (la subida nueva todavía no lo guardó), se analiza el archivo de nuevo.
+    """
+    from pcoords_extraction import extract_and_store_pcoord_analysis, load_pcoord_analysis, pcoord_analysis_path
+
+    if content_hash is None:
+        content_hash = _upload_hash(filename)
+    if content_hash is None:
+        return None
+    with pcoords_lock:
+        analysis = pcoords_cache.get(content_hash)
+        if analysis is not None:
+            pcoords_cache.move_to_end(content_hash)
+            return analysis
+    pdb_path = os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(filename))
+    npz_path = pcoord_analysis_path(pdb_path)
+    analysis = load_pcoord_analysis(npz_path) if os.path.exists(npz_path) else None
+    if analysis is None or analysis['hash'] != content_hash:
+        if not os.path.isfile(pdb_path):
+            return None
+        _, analysis = extract_and_store_pcoord_analysis(pdb_path)
+    _remember_analysis(analysis)
+    return analysis
 
 
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
-    """Permite acceder al archivo .pdb subido desde el frontend para ser renderizado por 3Dmol.js"""
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    """
+    Permite acceder al archivo .pdb subido desde el frontend para ser renderizado por 3Dmol.js.
+    Se envía precomprimido (gzip/br) si el cliente lo acepta, con soporte de Range.
+    Con ?format=npz devuelve la estructura en formato binario, desde el registro de subidas.
+    Con ?lod=backbone|bead|strand (y opcionalmente &step=N) devuelve una variante de menor
+    detalle para el visor (ver level_of_detail). El npz y las variantes se arman una vez y
+    se guardan en la caché, con sus versiones comprimidas.
+    """
+    output_format = request.args.get('format', 'pdb')
+    if output_format not in OUTPUT_FORMATS:
+        return jsonify({'error': 'Invalid format'}), 400
+    lod, error = _requested_lod()
+    if error:
+        return error
+    if output_format == 'pdb' and lod is None:
+        path = safe_join(app.config['UPLOAD_FOLDER'], filename)
+        if path is None or not os.path.isfile(path):
+            return jsonify({'error': f'File not found: {filename}'}), 404
+        return _send_stored_file(path, 'chemical/x-pdb')
 
+    from level_of_detail import coarse_structure
+    from structure_format import arrays_bytes
 
-@app.route('/generate', methods=['POST'])
-def generate():
+    entry = _registered_upload(filename)
+    if entry is None:
+        return jsonify({'error': f'File not found: {filename}'}), 404
+    if lod is None:
+        base = os.path.splitext(secure_filename(filename))[0]
+        key = variant_key(entry.content_hash, format=output_format)
+        headers = {'Content-Disposition': f'attachment; filename={base}.npz'}
+        build = lambda: arrays_bytes(entry.arrays())
+    else:
+        level, step = lod
+        key = variant_key(entry.content_hash, format=output_format, lod=level, step=step)
+        headers = {'X-Level-Of-Detail': level}
+        build = lambda: _encode_structure(coarse_structure(entry.structure(), level, step), output_format)
+    if _etag_matches(key):
+        return Response(status=304, headers={'ETag': f'"{key}"'})
+    cache = structure_cache if output_format == 'npz' else result_cache
+    data = cache.get(key)
+    if data is None:
+        # Las variantes más grandes que el LRU en memoria se sirven desde el disco
+        cached_path = cache.disk_path(key)
+        if cached_path is not None:
+            return _send_stored_file(cached_path, _format_mimetype(output_format), etag=key, headers=headers)
+        try:
+            data = build()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        cache.put(key, data)
+    return _bytes_response(data, _format_mimetype(output_format), key, headers, cache)
+
+
+def _etag_matches(key):
+    """True si If-None-Match trae la clave, sin codificar o en alguna de sus variantes comprimidas."""
+    return any(tag in request.if_none_match for tag in (key, f'{key}-gzip', f'{key}-br'))
+
+
+def _send_stored_file(path, mimetype, download_name=None, etag=True, headers=None):
+    """Envía un archivo guardado (caché o subida), precomprimido si el cliente lo acepta.
+
+    La variante comprimida se crea la primera vez; send_file maneja If-None-Match y Range
+    (sobre los bytes enviados).
     """
-    Genera un PDB a partir de secuencia y sigma usando generate_b_dna.py y ordenar_pdb.py.
-    Si topology == "circular", intenta circularizar con circularizarDNA.py.
-    No ejecuta extracción de P: solo aplica al flujo de subida/visualización.
+    encoding = negotiate_encoding(request.accept_encodings)
+    encoded_path = ensure_precompressed(path, encoding) if encoding else None
+    if encoded_path is not None:
+        path = encoded_path
+        if isinstance(etag, str):
+            etag = f'{etag}-{encoding}'
+    response = send_file(os.path.abspath(path), mimetype=mimetype, as_attachment=download_name is not None,
+                         download_name=download_name, etag=etag)
+    if headers:
+        response.headers.update({name: value for name, value in headers.items() if name != 'ETag'})
+    if encoded_path is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def _bytes_response(data, mimetype, key, headers=None, cache=None):
+    """Respuesta para un resultado en memoria: comprimida si conviene y con soporte de Range.
+
+    Si el resultado está guardado en cache bajo key, la variante comprimida se toma
+    de ahí (ver ResultCache.get_encoded) en lugar de comprimir en cada request.
     """
-    data = request.get_json()
-    sequence = data.get('sequence', '').upper()
+    headers = dict(headers or {})
+    encoding = negotiate_encoding(request.accept_encodings) if len(data) >= COMPRESS_MIN_BYTES else None
+    if encoding:
+        encoded = cache.get_encoded(key, encoding) if cache is not None else None
+        data = encoded if encoded is not None else compress(data, encoding)
+        headers['Content-Encoding'] = encoding
+        key = f'{key}-{encoding}'
+    headers.update({'ETag': f'"{key}"', 'Vary': 'Accept-Encoding'})
+    response = Response(data, mimetype=mimetype, headers=headers)
+    return response.make_conditional(request, accept_ranges=True, complete_length=len(data))
+
+
+def _requested_lod():
+    """Nivel de detalle pedido (JSON o ?lod=, ?step=). Devuelve ((nivel, step) o None si es completo, None)
+    o (None, respuesta de error)."""
+    from level_of_detail import LEVELS, MAX_STEP as LOD_MAX_STEP
+
+    data = request.get_json(silent=True) or {}
+    level = data.get('lod') or request.args.get('lod', 'full')
+    step = data.get('lod_step') or request.args.get('step', 1)
+    if level not in LEVELS:
+        return None, (jsonify({'error': 'Invalid level of detail'}), 400)
+    try:
+        step = int(step)
+        if not 1 <= step <= LOD_MAX_STEP:
+            raise ValueError
+    except (TypeError, ValueError):
+        return None, (jsonify({'error': 'Invalid level of detail step'}), 400)
+    if level == 'full':
+        return None, None
+    return (level, step), None
+
+
+def _encode_structure(structure, output_format):
+    """Bytes de una estructura en el formato de salida pedido."""
+    from ordenar_pdb import format_structure_pdb
+    from structure_format import structure_bytes
+
+    if output_format == 'npz':
+        return structure_bytes(structure)
+    return format_structure_pdb(structure).encode()
+
+
+def _format_mimetype(output_format):
+    """Mimetype de un formato de OUTPUT_FORMATS o SELECTION_FORMATS.
+
+    El de npz es structure_format.STRUCTURE_MIMETYPE; se importa acá para no cargar
+    NumPy al importar la app.
+    """
+    from structure_format import STRUCTURE_MIMETYPE
+
+    return {'pdb': 'chemical/x-pdb', 'npz': STRUCTURE_MIMETYPE, 'json': 'application/json',
+            'f32': 'application/octet-stream'}[output_format]
+
+
+def _registered_upload(filename):
+    """Estructura mapeada de un .pdb subido (ver upload_registry), o None si no existe."""
+    filename = secure_filename(filename)
+    if not filename.endswith('.pdb'):
+        return None
+    return get_upload_registry().get(filename)
+
+
+def _parse_generate_request():
+    """Valida el JSON {sequence, sigma, topology}. Devuelve ((sequence, sigma, topology), None) o (None, respuesta de error)."""
+    data = request.get_json(silent=True) or {}
+    sequence = str(data.get('sequence', '')).upper()
     sigma = data.get('sigma')
     topology = data.get('topology', 'linear')
 
     # Validaciones
     if not sequence or not all(base in 'ATCG' for base in sequence):
-        return jsonify({'error': 'Invalid DNA sequence'}), 400
+        return None, (jsonify({'error': 'Invalid DNA sequence'}), 400)
     try:
         sigma = float(sigma)
+        if not math.isfinite(sigma):
+            raise ValueError("Sigma must be finite")
     except (TypeError, ValueError):
-        return jsonify({'error': 'Invalid sigma value'}), 400
+        return None, (jsonify({'error': 'Invalid sigma value'}), 400)
 
-    # Simula input para generate_b_dna.py
-    temp_input = f"{sequence}\n{sigma}\n"
+    if topology not in ('linear', 'circular'):
+        return None, (jsonify({'error': 'Invalid topology'}), 400)
+    return (sequence, sigma, topology), None
 
-    try:
-        subprocess.run(
-            ['python3', 'generate_b_dna.py'],
-            input=temp_input.encode(),
-            check=True,
-            capture_output=True
-        )
-    except subprocess.CalledProcessError as e:
-        details = (e.stderr or b'').decode(errors='ignore')
-        return jsonify({'error': 'DNA generation failed', 'details': details}), 500
 
-    # Ejecuta ordenar_pdb.py
+def _validation_requested():
+    return bool((request.get_json(silent=True) or {}).get('validate'))
+
+
+def _clashes_requested():
+    return bool((request.get_json(silent=True) or {}).get('clashes'))
+
+
+def _requested_format():
+    """Formato de salida pedido en el JSON o en ?format= ('pdb' por defecto); None si no es válido."""
+    output_format = (request.get_json(silent=True) or {}).get('format') or request.args.get('format', 'pdb')
+    return output_format if output_format in OUTPUT_FORMATS else None
+
+
+def _validation_header(structure):
+    """Reporte de validación compacto (JSON de una línea) para un encabezado HTTP."""
+    from generate_b_dna import validate_duplex
+
+    return json.dumps(validate_duplex(structure, max_outliers=VALIDATION_HEADER_OUTLIERS),
+                      separators=(',', ':'), ensure_ascii=True)
+
+
+def _clash_header(structure):
+    """Reporte de choques compacto (JSON de una línea) para un encabezado HTTP."""
+    from steric_clashes import find_clashes
+
+    return json.dumps(find_clashes(structure, max_pairs=VALIDATION_HEADER_OUTLIERS),
+                      separators=(',', ':'), ensure_ascii=True)
+
+
+@app.route('/generate', methods=['POST'])
+def generate():
+    """
+    Genera un PDB a partir de secuencia y sigma con generate_b_dna.build_duplex, en proceso.
+    Si topology == "circular", circulariza las coordenadas con circularizarDNA.
+    No ejecuta extracción de P: solo aplica al flujo de subida/visualización.
+    Con "validate": true, agrega el reporte de validate_duplex en el encabezado X-Validation.
+    Con "clashes": true, agrega el reporte de choques estéricos (steric_clashes) en X-Clashes.
+    Con "format": "npz" (o ?format=npz), devuelve la estructura en formato binario
+    (structure_format) en lugar de PDB.
+    Con "lod": "backbone" | "bead" | "strand" (y "lod_step"), devuelve una variante de
+    menor detalle para visualizar (ver level_of_detail).
+    """
+    from circularizarDNA import circularize_coords
+    from generate_b_dna import build_duplex
+    from level_of_detail import coarse_structure
+
+    params, error = _parse_generate_request()
+    if error:
+        return error
+    sequence, sigma, topology = params
+    validate = _validation_requested()
+    clashes = _clashes_requested()
+    output_format = _requested_format()
+    if output_format is None:
+        return jsonify({'error': 'Invalid format'}), 400
+    lod, error = _requested_lod()
+    if error:
+        return error
+    if lod is not None and (validate or clashes):
+        return jsonify({'error': 'Validation needs the full-atom structure (lod=full)'}), 400
+    cache = structure_cache if output_format == 'npz' else result_cache
+
+    # Resultado direccionado por contenido: la clave es el ETag y el ID de salida.
+    # Todo ocurre en memoria o en archivos únicos por clave, sin nombres fijos en el CWD,
+    # así que la ruta puede atender varios workers/hilos en paralelo.
+    structure_id = cache_key(sequence, sigma, topology)
+    key = cache_key(sequence, sigma, topology, output_format)
+    if lod is not None:
+        key = variant_key(key, lod=lod[0], step=lod[1])
+    output_name, headers = _generate_headers(key, structure_id, output_format)
+    _remember_structure(structure_id, sequence, sigma, topology)
+    timer = RequestTimer(length=len(sequence))
+    if _etag_matches(key):
+        metrics_registry.count('generate_requests', 'not_modified')
+        return Response(status=304, headers={'ETag': headers['ETag']})
+    response = _cached_generate_response(cache, key, output_format, output_name, headers, timer,
+                                         validate, clashes)
+    if response is not None:
+        metrics_registry.count('generate_requests', 'hit')
+        return response
+
+    # Construye la hélice en memoria y circulariza si corresponde (etapas medidas por separado)
     try:
-        subprocess.run(['python3', 'ordenar_pdb.py'], check=True, capture_output=True)
-    except subprocess.CalledProcessError as e:
-        details = (e.stderr or b'').decode(errors='ignore')
-        return jsonify({'error': 'Sorting failed', 'details': details}), 500
+        with timer.stage('build'):
+            structure = build_duplex(sequence, sigma)
+        _remember_arrays(structure_id, dict(structure))
+        if topology == 'circular':
+            with timer.stage('circularize'):
+                structure['coords'] = circularize_coords(structure['coords'], len(sequence))
+    except Exception as e:
+        metrics_registry.count('generate_requests', 'error')
+        return jsonify({'error': 'DNA generation failed', 'details': str(e)}), 500
+    _structure_report_headers(structure, headers, timer, validate, clashes)
+    if lod is not None:
+        with timer.stage('coarsen'):
+            structure = coarse_structure(structure, *lod)
+    metrics_registry.count('generate_requests', 'miss')
+    return _generated_response(structure, cache, key, output_format, headers, timer)
+
 
-    # Renombra salida ordenada
+def _generate_headers(key, structure_id, output_format):
+    """Nombre de descarga y encabezados de una estructura generada."""
+    output_id = key[:16]
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_name = f"ADN_{timestamp}.pdb"
-    os.rename("ADN_ordenado.pdb", output_name)
+    output_name = f"ADN_{timestamp}_{output_id}.{output_format}"
+    return output_name, {
+        'Content-Disposition': f'attachment; filename={output_name}',
+        'ETag': f'"{key}"',
+        'X-Output-Id': output_id,
+        'X-Structure-Id': structure_id,
+    }
 
-    # Circulariza si corresponde
-    if topology == "circular":
-        if circularize_pdb is None:
-            return jsonify({'error': 'Circularization script not available'}), 500
-        try:
-            circularize_pdb(output_name, output_name)  # sobrescribe el archivo
-        except Exception as e:
-            return jsonify({'error': 'Circularization failed', 'details': str(e)}), 500
 
-    return send_file(output_name, as_attachment=True)
+def _remember_structure(structure_id, sequence, sigma, topology):
+    """Guarda secuencia, sigma y topología de una estructura para poder editarla después."""
+    if structure_records.disk_path(structure_id) is None:
+        record = {'sequence': sequence, 'sigma': sigma, 'topology': topology}
+        structure_records.put(structure_id, json.dumps(record).encode())
 
 
-# ============
-# Cálculo de radio de giro (usando la matriz A del JSON de P)
-# Tu fórmula de MATLAB: r = sqrt((1/n^2) * sum_{i,j} ||ri - rj||^2) = sqrt(2 * mean(||ri - CM||^2))
-# ============
+def _structure_report_headers(structure, headers, timer, validate, clashes):
+    """Agrega X-Validation y X-Clashes (si se pidieron) para una estructura completa."""
+    if validate:
+        with timer.stage('validate'):
+            headers['X-Validation'] = _validation_header(structure)
+    if clashes:
+        with timer.stage('clashes'):
+            headers['X-Clashes'] = _clash_header(structure)
+
+
+def _cached_generate_response(cache, key, output_format, output_name, headers, timer, validate, clashes):
+    """Respuesta desde la caché de resultados, o None si la clave no está."""
+    from pdb_reader import read_pdb
+    from structure_format import load_structure
 
-def calc_radius_of_gyration_and_cm_from_A(A_list):
+    mimetype = _format_mimetype(output_format)
+    # Si el cliente acepta compresión se prefiere el archivo en disco (y su variante precomprimida)
+    compressed = negotiate_encoding(request.accept_encodings) is not None
+    with timer.stage('cache'):
+        cached = cache.get(key)
+        cached_path = cache.disk_path(key) if cached is None or compressed else None
+    if cached is None and cached_path is None:
+        return None
+    if validate or clashes:
+        source = cached if cached is not None else cached_path
+        structure = load_structure(source) if output_format == 'npz' else read_pdb(source)
+        _structure_report_headers(structure, headers, timer, validate, clashes)
+    if cached_path is not None:
+        response = _send_stored_file(cached_path, mimetype, output_name, key, headers)
+    else:
+        response = _bytes_response(cached, mimetype, key, headers, cache)
+    response.headers['Server-Timing'] = timer.server_timing()
+    timer.finish()
+    return response
+
+
+def _generated_response(structure, cache, key, output_format, headers, timer, chunks=None):
+    """Respuesta para una estructura recién armada, guardándola en la caché.
+
+    chunks reemplaza al texto de iter_structure_pdb (por ejemplo, un PDB parcheado).
+    """
+    from ordenar_pdb import iter_structure_pdb
+    from structure_format import structure_bytes
+
+    mimetype = _format_mimetype(output_format)
+    if output_format == 'npz':
+        # El binario es chico y se arma de una vez (sin pasar por texto)
+        with timer.stage('write'):
+            data = structure_bytes(structure)
+            cache.put(key, data)
+        headers['Server-Timing'] = timer.server_timing()
+        timer.finish()
+        return _bytes_response(data, mimetype, key, headers, cache)
+
+    headers['Server-Timing'] = timer.server_timing()
+    # Emite cadena A, TER, cadena B, TER directamente desde los arrays, guardándolo en caché
+    # sin comprimir; al cliente le llega comprimido en gzip por partes si lo acepta.
+    # La escritura ocurre después de enviar los encabezados: solo se publica en /metrics.
+    chunks = iter_structure_pdb(structure) if chunks is None else chunks
+    chunks = _timed_stream(timer, 'write', cache.store_stream(key, chunks))
+    headers['Vary'] = 'Accept-Encoding'
+    if negotiate_encoding(request.accept_encodings, ('gzip',)):
+        chunks = iter_gzip(chunks)
+        headers.update({'Content-Encoding': 'gzip', 'ETag': f'"{key}-gzip"'})
+    return Response(chunks, mimetype=mimetype, headers=headers)
+
+
+def _timed_stream(timer, stage, chunks):
+    """Reenvía los chunks midiendo la etapa y publica las métricas del request al final."""
+    try:
+        with timer.stage(stage):
+            yield from chunks
+    finally:
+        timer.finish()
+
+
+def _remember_arrays(structure_id, structure):
+    """Guarda los arrays lineales de una estructura en el LRU de /generate/edit."""
+    with edit_arrays_lock:
+        edit_arrays[structure_id] = structure
+        edit_arrays.move_to_end(structure_id)
+        while len(edit_arrays) > EDIT_ARRAYS_ITEMS:
+            edit_arrays.popitem(last=False)
+
+
+def _linear_arrays(structure_id, sequence, sigma):
+    """Arrays lineales de una estructura generada: del LRU o, si ya no están, armados de nuevo."""
+    from generate_b_dna import build_duplex
+
+    with edit_arrays_lock:
+        structure = edit_arrays.get(structure_id)
+        if structure is not None:
+            edit_arrays.move_to_end(structure_id)
+            return structure
+    structure = build_duplex(sequence, sigma)
+    _remember_arrays(structure_id, structure)
+    return structure
+
+
+def _stored_pdb_text(key):
+    """Texto del PDB guardado en la caché de resultados bajo key, o None."""
+    data = result_cache.get(key)
+    if data is not None:
+        return data
+    path = result_cache.disk_path(key)
+    if path is None:
+        return None
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+@app.route('/generate/edit', methods=['POST'])
+def generate_edit():
+    """
+    Regenera una estructura ya generada aplicando una lista de ediciones de secuencia.
+
+    JSON: {"base": <X-Structure-Id de /generate o /generate/edit>,
+           "edits": [{"op": "substitute", "position": 12, "base": "G"},
+                     {"op": "insert", "position": 40, "bases": "AT"},
+                     {"op": "delete", "position": 90, "length": 3}],
+           "format": "pdb" | "npz", "validate": bool, "clashes": bool}
+    Posiciones 1-based, aplicadas en orden. Sigma y topología son las de la base.
+
+    Solo se arman los pares cambiados (y, tras una inserción o un borrado, los
+    siguientes); el resto se copia de la estructura base y, en PDB lineales, también
+    sus líneas de texto (ver incremental_generation). El resultado es idéntico al de
+    /generate con la secuencia editada y comparte su caché y su ETag.
+    """
+    from circularizarDNA import circularize_coords
+    from incremental_generation import apply_edits, iter_patched_pdb, patch_duplex, pdb_text_reusable
+    from ordenar_pdb import chain_ends
+
+    data = request.get_json(silent=True) or {}
+    base = str(data.get('base', ''))
+    output_format = _requested_format()
+    if output_format is None:
+        return jsonify({'error': 'Invalid format'}), 400
+    record = structure_records.get(base) if re.fullmatch(r'[0-9a-f]{64}', base) else None
+    if record is None:
+        metrics_registry.count('edit_requests', 'unknown_base')
+        return jsonify({'error': f'Unknown base structure: {base}'}), 404
+    record = json.loads(record)
+    old_sequence, sigma, topology = record['sequence'], record['sigma'], record['topology']
+    # Registros guardados antes de validar sigma en /generate pueden traer NaN o infinito
+    if not math.isfinite(sigma):
+        metrics_registry.count('edit_requests', 'error')
+        return jsonify({'error': 'Invalid sigma value'}), 400
+    try:
+        sequence, origin = apply_edits(old_sequence, data.get('edits'))
+    except ValueError as e:
+        metrics_registry.count('edit_requests', 'error')
+        return jsonify({'error': str(e)}), 400
+    validate = _validation_requested()
+    clashes = _clashes_requested()
+    cache = structure_cache if output_format == 'npz' else result_cache
+
+    structure_id = cache_key(sequence, sigma, topology)
+    key = cache_key(sequence, sigma, topology, output_format)
+    output_name, headers = _generate_headers(key, structure_id, output_format)
+    headers['X-Edit-Base'] = base
+    _remember_structure(structure_id, sequence, sigma, topology)
+    timer = RequestTimer(length=len(sequence))
+    if _etag_matches(key):
+        metrics_registry.count('edit_requests', 'not_modified')
+        return Response(status=304, headers={'ETag': headers['ETag']})
+    response = _cached_generate_response(cache, key, output_format, output_name, headers, timer,
+                                         validate, clashes)
+    if response is not None:
+        metrics_registry.count('edit_requests', 'hit')
+        return response
+
+    try:
+        with timer.stage('patch'):
+            old = _linear_arrays(base, old_sequence, sigma)
+            structure, source, rebuilt = patch_duplex(old, old_sequence, sequence, origin, sigma)
+        _remember_arrays(structure_id, dict(structure))
+        if topology == 'circular':
+            # Circularizar mueve todos los átomos: no hay líneas que reutilizar
+            with timer.stage('circularize'):
+                structure['coords'] = circularize_coords(structure['coords'], len(sequence))
+    except Exception as e:
+        metrics_registry.count('edit_requests', 'error')
+        return jsonify({'error': 'DNA generation failed', 'details': str(e)}), 500
+    headers['X-Rebuilt-Pairs'] = str(rebuilt)
+    _structure_report_headers(structure, headers, timer, validate, clashes)
+
+    chunks = None
+    if output_format == 'pdb' and topology == 'linear':
+        old_text = _stored_pdb_text(cache_key(old_sequence, sigma, topology, 'pdb'))
+        if pdb_text_reusable(old_text, old):
+            chunks = iter_patched_pdb(structure, source, old_text, chain_ends(old))
+    metrics_registry.count('edit_requests', 'patched_text' if chunks is not None else 'miss')
+    return _generated_response(structure, cache, key, output_format, headers, timer, chunks)
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Métricas por etapa de /generate en formato Prometheus (por proceso)."""
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/generate/batch', methods=['POST'])
+def generate_batch():
     """
-    A_list: lista de [x, y, z] (matriz A).
-    Devuelve: (r, CM) donde r es el radio de giro (según tu fórmula en MATLAB)
-              y CM es [CMx, CMy, CMz].
+    Genera un lote de PDB (secuencias x sigmas) en paralelo y devuelve un .zip
+    (o .tar) que se emite a medida que se construyen, con un manifest.json al final.
+
+    JSON: {"sequences": [...], "sigmas": [...] o "sigma_range": {"start", "stop", "step"},
+           "topology": "linear" | "circular", "format": "zip" | "tar"}
     """
-    A = np.asarray(A_list, dtype=float)
-    nTotal = A.shape[0]
-    if nTotal == 0:
-        return 0.0, [0.0, 0.0, 0.0]
+    from batch_generation import ARCHIVE_FORMATS, batch_entries, iter_archive, iter_batch, sigma_count, sigma_range
 
-    # Centro de masa
-    CM = A.mean(axis=0)
+    data = request.get_json(silent=True) or {}
+    sequences = data.get('sequences')
+    topology = data.get('topology', 'linear')
+    archive_format = data.get('format', 'zip')
 
-    # r = sqrt( (1/n^2) * sum_{i,j} ||ri - rj||^2 )
-    # Equivalente eficiente: mean_pairwise_sq = 2 * mean(||ri - CM||^2)
-    dif = A - CM
-    mean_sq_to_CM = np.mean(np.sum(dif * dif, axis=1))
-    mean_pairwise_sq = 2.0 * mean_sq_to_CM
-    r = float(np.sqrt(mean_pairwise_sq))
-    return r, [float(CM[0]), float(CM[1]), float(CM[2])]
+    if not isinstance(sequences, list) or not sequences:
+        return jsonify({'error': 'Invalid sequences list'}), 400
+    if topology not in ('linear', 'circular'):
+        return jsonify({'error': 'Invalid topology'}), 400
+    if archive_format not in ARCHIVE_FORMATS:
+        return jsonify({'error': 'Invalid archive format'}), 400
+    # El tamaño del lote se valida antes de armar sigmas y combinaciones
+    try:
+        if 'sigma_range' in data:
+            bounds = data['sigma_range']
+            bounds = (float(bounds['start']), float(bounds['stop']), float(bounds.get('step', 0.01)))
+            count = sigma_count(*bounds)
+        else:
+            sigmas = data.get('sigmas', [])
+            if not isinstance(sigmas, list):
+                raise ValueError("Sigmas must be a list")
+            count = len(sigmas)
+        if not count:
+            raise ValueError("Empty sigma list")
+    except (TypeError, ValueError, KeyError) as e:
+        return jsonify({'error': 'Invalid sigma values', 'details': str(e)}), 400
+    if len(sequences) * count > BATCH_MAX_STRUCTURES:
+        return jsonify({'error': f'Too many structures (max {BATCH_MAX_STRUCTURES})'}), 400
+    if sum(len(str(sequence).strip()) for sequence in sequences) * count > BATCH_MAX_BASE_PAIRS:
+        return jsonify({'error': f'Too many base pairs in batch (max {BATCH_MAX_BASE_PAIRS})'}), 400
 
+    try:
+        if 'sigma_range' in data:
+            sigmas = sigma_range(*bounds)
+        else:
+            sigmas = [float(sigma) for sigma in sigmas]
+            if not all(math.isfinite(sigma) for sigma in sigmas):
+                raise ValueError("Sigma values must be finite")
+        entries = batch_entries([str(sequence) for sequence in sequences], sigmas, topology)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_name = f"ADN_batch_{timestamp}.{archive_format}"
+    mimetype = 'application/zip' if archive_format == 'zip' else 'application/x-tar'
+    return Response(
+        iter_archive(iter_batch(entries), archive_format, {'sigmas': sigmas, 'topology': topology}),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={output_name}'}
+    )
+
+
+@app.route('/jobs/generate', methods=['POST'])
+def submit_generate_job():
+    """
+    Versión asíncrona de /generate para secuencias largas: encola la construcción
+    en el pool de procesos y responde 202 con el job_id sin esperar al resultado.
+    Con "validate": true, el estado del trabajo terminado incluye 'validation'.
+    """
+    params, error = _parse_generate_request()
+    if error:
+        return error
+    sequence, sigma, topology = params
+
+    status = job_queue.submit(cache_key(sequence, sigma, topology), sequence, sigma, topology,
+                              validate=_validation_requested())
+    job_id = status['job_id']
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status': status['status'],
+        'status_url': f'/jobs/{job_id}',
+        'result_url': f'/jobs/{job_id}/result',
+    }), 202
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Estado de un trabajo: queued, running (con stage), done o failed (con error)."""
+    status = job_queue.status(job_id)
+    if status is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({key: value for key, value in status.items() if key != 'key'})
+
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    """Descarga el PDB de un trabajo terminado."""
+    status = job_queue.status(job_id)
+    if status is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if status['status'] == 'failed':
+        return jsonify({'error': 'DNA generation failed', 'details': status.get('error')}), 500
+    if status['status'] != 'done':
+        return jsonify({'error': 'Job not finished', 'status': status['status']}), 409
+
+    key = status['key']
+    cached_path = result_cache.disk_path(key)
+    if cached_path is None:
+        return jsonify({'error': 'Result expired, submit the job again'}), 410
+    output_name = f"ADN_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{key[:16]}.pdb"
+    return _send_stored_file(cached_path, 'chemical/x-pdb', output_name, key)
+
+
+# ============
+# Radio de giro (usando la matriz A de P, calculado una vez al subir)
+# Tu fórmula de MATLAB: r = sqrt((1/n^2) * sum_{i,j} ||ri - rj||^2) = sqrt(2 * mean(||ri - CM||^2))
+# ============
 
 @app.route('/pcoords/rg/<filename>', methods=['GET'])
 def pcoords_rg(filename):
     """
-    Lee uploads/<filename>_P_coords.json, toma la matriz A y devuelve r y CM.
+    Devuelve r y CM de la matriz A, ya calculados al subir el archivo.
     'filename' debe ser EXACTAMENTE el nombre del .pdb subido (ej: 'miADN.pdb').
     """
     try:
-        json_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{filename}_P_coords.json")
-        if not os.path.exists(json_path):
-            return jsonify({'error': f'P-coords JSON not found for {filename}'}), 404
+        analysis = _upload_analysis(filename)
+        if analysis is None:
+            return jsonify({'error': f'P-coords analysis not found for {filename}'}), 404
+
+        nTotal = len(analysis['A'])
+        if not nTotal:
+            return jsonify({'error': 'Matrix A is empty or missing'}), 400
+
+        # Con modelos desparejos, r y CM son los del primer modelo
+        return jsonify({'success': True, 'r': analysis['r'], 'CM': analysis['CM'], 'nTotal': nTotal,
+                        'consistent_frames': analysis['consistent_frames']})
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
 
-        A = data.get('A', [])
-        if not A:
+@app.route('/pcoords/rg_series/<filename>', methods=['GET'])
+def pcoords_rg_series(filename):
+    """
+    Serie temporal de r y CM para un PDB multi-modelo (un valor por MODEL/ENDMDL),
+    calculada para todos los cuadros a la vez al subir el archivo. Responde 422 si
+    los modelos no tienen la misma cantidad de átomos P.
+    """
+    try:
+        analysis = _upload_analysis(filename)
+        if analysis is None:
+            return jsonify({'error': f'P-coords analysis not found for {filename}'}), 404
+        if not analysis['n_frames']:
             return jsonify({'error': 'Matrix A is empty or missing'}), 400
+        if not analysis['consistent_frames']:
+            return jsonify({'success': False, 'error': 'Inconsistent trajectory: models have different '
+                                                       'numbers of P atoms'}), 422
 
-        r, CM = calc_radius_of_gyration_and_cm_from_A(A)
-        return jsonify({'success': True, 'r': r, 'CM': CM, 'nTotal': len(A)})
+        return jsonify({
+            'success': True,
+            'n_frames': int(analysis['n_frames']),
+            'r': analysis['series_r'].tolist(),
+            'CM': analysis['series_CM'].tolist(),
+            'nTotal': len(analysis['A']),
+        })
 
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+# ============
+# Selección de átomos de una subida (índices precalculados del registro de subidas)
+# ============
+
+def _split_values(name):
+    """Lista de valores separados por comas de ?name=, o None si no se pasó."""
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def _parse_residue_range(value):
+    """'10-50' o '12' -> (10, 50) o (12, 12); ValueError si no es un rango válido."""
+    match = re.fullmatch(r'\s*(-?\d+)\s*(?:-\s*(-?\d+)\s*)?', value)
+    if not match:
+        raise ValueError(f"Invalid residue range: {value}")
+    low = int(match.group(1))
+    high = int(match.group(2)) if match.group(2) is not None else low
+    if high < low:
+        raise ValueError(f"Invalid residue range: {value}")
+    return low, high
+
+
+@app.route('/uploads/<filename>/select', methods=['GET'])
+def uploaded_selection(filename):
+    """
+    Subconjunto de átomos de una subida, sin volver a leer el PDB:
+      chain=A,B  residues=10-50  name=P,C1'  element=P   (filtros combinables)
+      format=json (columnas, por defecto) | npz (structure_format) | f32 (coordenadas
+      float32 little-endian (n, 3) crudas, con la cantidad en X-Atom-Count)
+    """
+    output_format = request.args.get('format', 'json')
+    if output_format not in SELECTION_FORMATS:
+        return jsonify({'success': False, 'error': 'Invalid format'}), 400
+    filters = {'chains': _split_values('chain'), 'names': _split_values('name'),
+               'elements': _split_values('element'), 'residue_range': None}
+    try:
+        if request.args.get('residues'):
+            filters['residue_range'] = _parse_residue_range(request.args['residues'])
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    entry = _registered_upload(filename)
+    if entry is None:
+        return jsonify({'error': f'File not found: {filename}'}), 404
+    key = variant_key(entry.content_hash, format=output_format,
+                      select=json.dumps(filters, sort_keys=True, ensure_ascii=True))
+    if _etag_matches(key):
+        return Response(status=304, headers={'ETag': f'"{key}"'})
+
+    import numpy as np
+    from structure_format import structure_bytes
+    from structure_selection import selected_structure
+
+    atoms = entry.select(**filters)
+    headers = {'X-Atom-Count': str(len(atoms))}
+    if output_format == 'f32':
+        data = np.ascontiguousarray(entry.coords[atoms], dtype='<f4').tobytes()
+        return _bytes_response(data, _format_mimetype(output_format), key, headers)
+    structure = selected_structure(entry.arrays(), atoms)
+    if output_format == 'npz':
+        return _bytes_response(structure_bytes(structure), _format_mimetype(output_format), key, headers)
+    if len(atoms) > SELECTION_JSON_MAX_ATOMS:
+        return jsonify({'success': False, 'error': f'Selection too large for JSON ({len(atoms)} atoms, '
+                                                   f'max {SELECTION_JSON_MAX_ATOMS}); use format=f32 or npz'}), 400
+    body = {'success': True, 'count': int(len(atoms)), 'index': atoms.tolist()}
+    body.update({field: structure[field].tolist() for field in ('name', 'resName', 'chainID', 'resSeq', 'element')})
+    body['coords'] = np.round(structure['coords'].astype(float), 3).tolist()
+    return _bytes_response(json.dumps(body, separators=(',', ':')).encode(), _format_mimetype('json'), key, headers)
+
+
+# ============
+# Choques estéricos de una subida (todos los átomos, desde el registro de subidas)
+# ============
+
+@app.route('/uploads/<filename>/clashes', methods=['GET'])
+def uploaded_clashes(filename):
+    """
+    Pares de residuos con átomos no enlazados superpuestos (ver steric_clashes).
+    ?overlap=<Å> cambia la superposición mínima (0.4 Å por defecto, menor que MAX_OVERLAP);
+    ?max_pairs=N limita los pares listados (50 por defecto, hasta CLASH_MAX_PAIRS).
+    """
+    from steric_clashes import CLASH_OVERLAP, MAX_OVERLAP, find_clashes
+
+    try:
+        overlap = float(request.args.get('overlap', CLASH_OVERLAP))
+        max_pairs = int(request.args.get('max_pairs', 50))
+        if not (math.isfinite(overlap) and 0 <= overlap < MAX_OVERLAP):
+            raise ValueError(f"overlap must be in [0, {MAX_OVERLAP}) Å")
+        if not 0 <= max_pairs <= CLASH_MAX_PAIRS:
+            raise ValueError(f"max_pairs must be in [0, {CLASH_MAX_PAIRS}]")
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    entry = _registered_upload(filename)
+    if entry is None:
+        return jsonify({'error': f'File not found: {filename}'}), 404
+    key = (entry.content_hash, overlap)
+    with pcoords_lock:
+        report = clash_cache.get(key)
+        if report is not None:
+            clash_cache.move_to_end(key)
+    if report is None:
+        structure = entry.structure()
+        structure['residue_starts'] = entry.residue_starts
+        report = find_clashes(structure, overlap=overlap, max_pairs=None)
+        with pcoords_lock:
+            clash_cache[key] = report
+            while len(clash_cache) > PCOORDS_CACHE_ITEMS:
+                clash_cache.popitem(last=False)
+    return jsonify({'success': True, **report, 'residue_pairs': report['residue_pairs'][:max_pairs]})
+
+
+# ============
+# Writhe, twist y número de enlace (matrices A y B de P; ver writhe_twist.py)
+# ============
+
+def _parse_bool(value):
+    if value is None or value == '':
+        return None
+    if value.lower() in ('1', 'true', 'yes'):
+        return True
+    if value.lower() in ('0', 'false', 'no'):
+        return False
+    raise ValueError(f"Invalid boolean: {value}")
+
+
+@app.route('/pcoords/writhe/<filename>', methods=['GET'])
+def pcoords_writhe(filename):
+    """
+    Wr, Tw y Lk del dúplex subido. Parámetros opcionales:
+      method=exact|sampled  (sampled submuestrea el eje en plásmidos largos)
+      closed=true|false     (por defecto se detecta si la molécula es circular)
+      sigma=<float>         sigma pedida al generar, para compararla con la medida
+    """
+    from writhe_twist import calc_supercoiling_from_AB
+
+    try:
+        method = request.args.get('method', 'exact')
+        closed = _parse_bool(request.args.get('closed'))
+        expected_sigma = request.args.get('sigma')
+        expected_sigma = float(expected_sigma) if expected_sigma not in (None, '') else None
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    try:
+        content_hash = _upload_hash(filename)
+        if content_hash is None:
+            return jsonify({'error': f'P-coords analysis not found for {filename}'}), 404
+
+        # Clave por el hash vigente del registro: se consulta antes de cargar el análisis
+        key = (content_hash, method, closed)
+        with pcoords_lock:
+            result = writhe_cache.get(key)
+            if result is not None:
+                writhe_cache.move_to_end(key)
+        if result is None:
+            analysis = _upload_analysis(filename, content_hash)
+            if analysis is None:
+                return jsonify({'error': f'P-coords analysis not found for {filename}'}), 404
+            result = calc_supercoiling_from_AB(analysis['A'], analysis['B'], closed=closed, method=method)
+            with pcoords_lock:
+                writhe_cache[key] = result
+                while len(writhe_cache) > PCOORDS_CACHE_ITEMS:
+                    writhe_cache.popitem(last=False)
+
+        response = {'success': True, **result}
+        if expected_sigma is not None:
+            response['expected_sigma'] = expected_sigma
+            response['sigma_error'] = result['sigma'] - expected_sigma
+        return jsonify(response)
+
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 if __name__ == '__main__':
+    warm_up()
     port = int(os.environ.get("PORT", 5000))
     app.run(host='0.0.0.0', port=port)
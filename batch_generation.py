@@ -0,0 +1,217 @@
+"""
+Generación por lotes para barridos de parámetros (secuencias x rango de sigma).
+
+Cada estructura se construye con generate_b_dna.build_duplex en un pool de
+procesos. Las plantillas se cargan una sola vez en el proceso padre antes de
+crear el pool, así los workers las heredan (fork) en lugar de volver a parsearlas.
+El resultado es un .zip (o .tar) con un PDB por combinación y un manifest.json.
+
+Uso CLI:
+    python batch_generation.py secuencias.txt --sigma-start -0.06 --sigma-stop 0 \
+        --sigma-step 0.02 --topology circular -o barrido.zip
+"""
+from __future__ import annotations
+import argparse
+import hashlib
+import io
+import json
+import math
+import os
+import tarfile
+import threading
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from generate_b_dna import build_duplex, get_template_store, twist_per_base
+from ordenar_pdb import format_structure_pdb
+
+ARCHIVE_FORMATS = ('zip', 'tar')
+SIGMA_STEP_MIN = 1e-4  # resolución de sigma en los nombres de archivo (+.4f)
+BATCH_WINDOW = 2 * (os.cpu_count() or 1)  # estructuras encargadas al pool a la vez
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def sigma_count(start: float, stop: float, step: float) -> int:
+    """Cantidad de valores de sigma_range, sin construirlos; ValueError si el rango no es válido."""
+    if not all(math.isfinite(value) for value in (start, stop, step)):
+        raise ValueError("Sigma range values must be finite")
+    if step == 0:
+        return 1
+    if step < SIGMA_STEP_MIN:
+        raise ValueError(f"Sigma step must be 0 or at least {SIGMA_STEP_MIN}")
+    count = int(np.floor((stop - start) / step + 1e-9)) + 1
+    if count <= 0:
+        raise ValueError("Empty sigma range")
+    return count
+
+
+def sigma_range(start: float, stop: float, step: float, max_count: Optional[int] = None) -> List[float]:
+    """Valores de sigma de start a stop (incluido) cada step (0 o >= SIGMA_STEP_MIN).
+
+    Con max_count, lanza ValueError antes de armar la lista si el rango es más largo.
+    """
+    count = sigma_count(start, stop, step)
+    if max_count is not None and count > max_count:
+        raise ValueError(f"Too many sigma values (max {max_count})")
+    return [round(float(start + i * step), 10) for i in range(count)]
+
+
+def batch_entries(sequences: Sequence[str], sigmas: Sequence[float], topology: str) -> List[dict]:
+    """Lista de combinaciones (secuencia x sigma) con el nombre de archivo de cada PDB.
+
+    Lanza ValueError si dos sigmas dan el mismo nombre (difieren en menos de 1e-4).
+    """
+    names = [f"{float(sigma):+.4f}" for sigma in sigmas]
+    if len(set(names)) != len(names):
+        raise ValueError("Sigma values must differ by at least 1e-4")
+    entries = []
+    for seq_index, sequence in enumerate(sequences):
+        sequence = sequence.strip().upper()
+        if not sequence or not all(base in 'ATCG' for base in sequence):
+            raise ValueError(f"Invalid DNA sequence at index {seq_index}")
+        for sigma in sigmas:
+            sigma = float(sigma)
+            entries.append({
+                'file': f"seq{seq_index:03d}_sigma{sigma:+.4f}_{topology}.pdb",
+                'sequence_index': seq_index,
+                'sequence': sequence,
+                'length': len(sequence),
+                'sigma': sigma,
+                'topology': topology,
+            })
+    return entries
+
+
+def build_entry(entry: dict) -> Tuple[dict, bytes]:
+    """Construye un PDB del lote (se ejecuta en el pool)."""
+    started = time.perf_counter()
+    structure = build_duplex(entry['sequence'], entry['sigma'], entry['topology'])
+    data = format_structure_pdb(structure).encode()
+    info = {key: value for key, value in entry.items() if key != 'sequence'}
+    info.update({
+        'twist_per_base': twist_per_base(entry['length'], entry['sigma']),
+        'n_atoms': len(structure['coords']),
+        'sha256': hashlib.sha256(data).hexdigest(),
+        'seconds': round(time.perf_counter() - started, 4),
+    })
+    return info, data
+
+
+def get_pool(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """Pool compartido del módulo; las plantillas se cargan antes de crearlo."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            get_template_store()
+            _pool = ProcessPoolExecutor(max_workers=max_workers)
+        return _pool
+
+
+def iter_batch(entries: Iterable[dict], pool: Optional[ProcessPoolExecutor] = None,
+               window: int = BATCH_WINDOW) -> Iterator[Tuple[dict, bytes]]:
+    """Construye las entradas en paralelo y las devuelve en orden.
+
+    Solo hay window entradas encargadas al pool a la vez; si el generador se cierra
+    antes de terminar (cliente desconectado), se cancelan las que no empezaron.
+    """
+    pool = pool or get_pool()
+    pending = deque()
+    try:
+        for entry in entries:
+            pending.append(pool.submit(build_entry, entry))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+class _StreamBuffer(io.RawIOBase):
+    """Archivo de solo escritura y sin seek: acumula bytes hasta que se leen con pop()."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_archive(results: Iterable[Tuple[dict, bytes]], archive_format: str = 'zip',
+                 manifest_extra: Optional[dict] = None) -> Iterator[bytes]:
+    """Empaqueta (info, pdb) en un .zip o .tar que se emite por partes, con manifest.json al final."""
+    if archive_format not in ARCHIVE_FORMATS:
+        raise ValueError(f"Unknown archive format: {archive_format}")
+    buffer = _StreamBuffer()
+    manifest = dict(manifest_extra or {}, structures=[])
+
+    if archive_format == 'zip':
+        archive = zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED)
+
+        def add(name, data):
+            archive.writestr(name, data)
+    else:
+        archive = tarfile.open(fileobj=buffer, mode='w|')
+
+        def add(name, data):
+            tar_info = tarfile.TarInfo(name)
+            tar_info.size = len(data)
+            tar_info.mtime = int(time.time())
+            archive.addfile(tar_info, io.BytesIO(data))
+
+    with archive:
+        for info, data in results:
+            add(info['file'], data)
+            manifest['structures'].append(info)
+            yield buffer.pop()
+        manifest['count'] = len(manifest['structures'])
+        add('manifest.json', json.dumps(manifest, indent=2).encode())
+    yield buffer.pop()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Genera PDB de B-DNA para secuencias x rango de sigma.")
+    parser.add_argument('sequences', help="Archivo con una secuencia por línea (líneas vacías o con # se ignoran)")
+    parser.add_argument('--sigma-start', type=float, required=True)
+    parser.add_argument('--sigma-stop', type=float, default=None, help="Por defecto, igual a --sigma-start")
+    parser.add_argument('--sigma-step', type=float, default=0.01)
+    parser.add_argument('--topology', choices=('linear', 'circular'), default='linear')
+    parser.add_argument('--format', choices=ARCHIVE_FORMATS, default='zip')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('-o', '--output', required=True)
+    args = parser.parse_args(argv)
+
+    with open(args.sequences, 'r') as f:
+        sequences = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    stop = args.sigma_start if args.sigma_stop is None else args.sigma_stop
+    try:
+        sigmas = sigma_range(args.sigma_start, stop, args.sigma_step)
+        entries = batch_entries(sequences, sigmas, args.topology)
+    except ValueError as e:
+        parser.error(str(e))
+
+    with open(args.output, 'wb') as out:
+        for chunk in iter_archive(iter_batch(entries, get_pool(args.workers)), args.format):
+            out.write(chunk)
+    print(f"{len(entries)} estructuras guardadas en {args.output}")
+
+
+if __name__ == '__main__':
+    main()
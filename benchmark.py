@@ -0,0 +1,227 @@
+"""
+Benchmarks reproducibles (sin red) de las etapas principales.
+
+Mide, para cada longitud de secuencia:
+    - generate     generate_b_dna.build_duplex (geometría)
+    - sort         ordenar_pdb.sort_pdb sobre un ADN.pdb sin ordenar
+    - circularize  circularizarDNA.circularize_pdb
+    - pcoords      pcoords_extraction.extract_and_store_pcoord_sets
+    - rg           radius_of_gyration.calc_radius_of_gyration_and_cm_from_A sobre la matriz A
+    - http_generate / http_upload / http_rg   rutas Flask /generate, /upload (cuerpo
+                   crudo, como lo envía la página) y /pcoords/rg (test client)
+
+y reporta tiempo (mínimo y mediana de --repeat corridas), throughput en pb/s y
+MB/s y el pico de memoria (tracemalloc, en una corrida aparte para no sesgar
+los tiempos). El resultado se escribe como JSON para comparar entre versiones.
+
+Uso CLI:
+    python benchmark.py -o bench.json
+    python benchmark.py --lengths 10 100 1000 --repeat 5 --stages generate sort
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+DEFAULT_LENGTHS = (10, 100, 1000, 10000, 50000)
+STAGES = ('generate', 'sort', 'circularize', 'pcoords', 'rg', 'http_generate', 'http_upload', 'http_rg')
+SIGMA = -0.06
+SEED = 12345
+
+
+def random_sequence(length: int, seed: int = SEED) -> str:
+    """Secuencia reproducible de la longitud dada."""
+    rng = random.Random(seed + length)
+    return ''.join(rng.choice('ACGT') for _ in range(length))
+
+
+def _measure(run: Callable[[], object], repeat: int, memory: bool) -> Dict[str, Optional[float]]:
+    """Tiempos de repeat corridas de run() y, opcionalmente, pico de memoria de una más."""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - started)
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            run()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return {
+        'seconds_min': min(times),
+        'seconds_median': statistics.median(times),
+        'peak_memory_bytes': peak,
+    }
+
+
+class _Workspace:
+    """Directorio temporal con las entradas de cada etapa para una longitud dada."""
+
+    def __init__(self, root: str, length: int):
+        from generate_b_dna import build_duplex
+        from ordenar_pdb import write_structure_pdb
+        from pcoords_extraction import get_p_frames, split_even_frames
+
+        self.dir = os.path.join(root, f"bp{length}")
+        os.makedirs(self.dir, exist_ok=True)
+        self.sequence = random_sequence(length)
+        structure = build_duplex(self.sequence, SIGMA)
+
+        # Entrada de sort_pdb: la numeración previa al ordenamiento (cadena B n..1)
+        self.sorted_pdb = os.path.join(self.dir, 'ADN_ordenado.pdb')
+        write_structure_pdb(structure, self.sorted_pdb)
+        structure['resSeq'][structure['chainID'] == 'B'] -= length
+        self.unsorted_pdb = os.path.join(self.dir, 'ADN.pdb')
+        write_structure_pdb(structure, self.unsorted_pdb)
+        self.output_pdb = os.path.join(self.dir, 'out.pdb')
+        with open(self.sorted_pdb, 'rb') as f:
+            self.sorted_bytes = f.read()
+        # Matriz A (primera mitad de los P) para la etapa rg
+        self.p_coords_A = split_even_frames(get_p_frames(self.sorted_bytes))[0][0]
+
+
+def _flask_client(root: str):
+    """Cliente de prueba de la app con caché y carpetas dentro de root.
+
+    Las carpetas se fijan por entorno antes de importar app, que las crea al cargarse.
+    """
+    os.environ.setdefault('RESULT_CACHE_FOLDER', os.path.join(root, 'cache'))
+    os.environ.setdefault('JOBS_FOLDER', os.path.join(root, 'jobs'))
+    os.environ.setdefault('UPLOAD_FOLDER', os.path.join(root, 'uploads'))
+    import app as app_module
+    app_module.app.config['UPLOAD_FOLDER'] = os.path.join(root, 'uploads')
+    os.makedirs(app_module.app.config['UPLOAD_FOLDER'], exist_ok=True)
+    return app_module, app_module.app.test_client()
+
+
+def _stage_runners(stage: str, ws: _Workspace, root: str) -> Callable[[], object]:
+    if stage == 'generate':
+        from generate_b_dna import build_duplex
+        return lambda: build_duplex(ws.sequence, SIGMA)
+    if stage == 'sort':
+        from ordenar_pdb import sort_pdb
+        return lambda: sort_pdb(ws.unsorted_pdb, ws.output_pdb)
+    if stage == 'circularize':
+        from circularizarDNA import circularize_pdb
+        return lambda: circularize_pdb(ws.sorted_pdb, ws.output_pdb)
+    if stage == 'pcoords':
+        from pcoords_extraction import extract_and_store_pcoord_sets
+        return lambda: extract_and_store_pcoord_sets(ws.sorted_pdb)
+    if stage == 'rg':
+        from radius_of_gyration import calc_radius_of_gyration_and_cm_from_A
+        return lambda: calc_radius_of_gyration_and_cm_from_A(ws.p_coords_A)
+    if stage == 'http_generate':
+        app_module, client = _flask_client(root)
+
+        def run():
+            # Sin caché: se mide la construcción completa
+            app_module.result_cache._memory.clear()
+            shutil.rmtree(app_module.result_cache.directory, ignore_errors=True)
+            response = client.post('/generate', json={'sequence': ws.sequence, 'sigma': SIGMA})
+            assert response.status_code == 200, response.status_code
+            return response.data
+        return run
+    if stage == 'http_upload':
+        _, client = _flask_client(root)
+
+        def run():
+            response = client.post('/upload?filename=bench.pdb', data=ws.sorted_bytes,
+                                   content_type='application/octet-stream')
+            assert response.status_code == 200, response.status_code
+            return response.data
+        return run
+    if stage == 'http_rg':
+        app_module, client = _flask_client(root)
+        response = client.post('/upload?filename=bench_rg.pdb', data=ws.sorted_bytes,
+                               content_type='application/octet-stream')
+        assert response.status_code == 200, response.status_code
+
+        def run():
+            # Sin el LRU en memoria: se mide la lectura del análisis guardado al subir
+            app_module.pcoords_cache.clear()
+            response = client.get('/pcoords/rg/bench_rg.pdb')
+            assert response.status_code == 200, response.status_code
+            return response.data
+        return run
+    raise ValueError(f"Unknown stage: {stage}")
+
+
+def _environment() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'git_commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+
+def run_benchmarks(lengths=DEFAULT_LENGTHS, stages=STAGES, repeat: int = 3, memory: bool = True,
+                   progress: Callable[[str], None] = print) -> dict:
+    """Corre las etapas para cada longitud y devuelve el reporte como dict."""
+    results: List[dict] = []
+    root = tempfile.mkdtemp(prefix='dna_tools_bench_')
+    try:
+        for length in lengths:
+            ws = _Workspace(root, length)
+            size_mb = len(ws.sorted_bytes) / 1e6
+            for stage in stages:
+                measured = _measure(_stage_runners(stage, ws, root), repeat, memory)
+                best = measured['seconds_min']
+                entry = {
+                    'stage': stage,
+                    'length_bp': length,
+                    'pdb_megabytes': round(size_mb, 3),
+                    'bp_per_second': length / best if best else None,
+                    'megabytes_per_second': size_mb / best if best else None,
+                    **measured,
+                }
+                results.append(entry)
+                progress(f"{stage:>14} {length:>7} bp  {best * 1000:10.2f} ms  "
+                         f"{entry['bp_per_second']:12.0f} bp/s")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return {'environment': _environment(), 'repeat': repeat, 'sigma': SIGMA, 'results': results}
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks de generación, ordenamiento, circularización y Rg.")
+    parser.add_argument('--lengths', type=int, nargs='+', default=list(DEFAULT_LENGTHS))
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-memory', action='store_true', help="No medir el pico de memoria")
+    parser.add_argument('-o', '--output', help="Archivo JSON de salida (por defecto, stdout)")
+    args = parser.parse_args(argv)
+
+    log = (lambda message: print(message, file=sys.stderr))
+    report = run_benchmarks(args.lengths, args.stages, args.repeat, not args.no_memory, progress=log)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as out:
+            out.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
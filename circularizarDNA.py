@@ -1,76 +1,80 @@
 # circularizarDNA_v2.py (Python 3)
 import math
+import numpy as np
 
-def circularize_pdb(input_file, output_file="ADN_circularizado.pdb"):
-    pi = math.pi
-    M = []  # Coordenadas
-    lineas_atom = []
-    lineas_no_atom = []
-
-    with open(input_file, 'r') as archivo:
-        lineas = archivo.readlines()
+from pdb_reader import coords_fit_columns, format_coord_columns, hybrid36_encode, read_pdb
 
-    for i, linea in enumerate(lineas):
-        if linea.startswith("ATOM"):
-            x = float(linea[30:38])
-            y = float(linea[38:46])
-            z = float(linea[46:54])
-            M.append([x, y, z])
-            lineas_atom.append(linea)
-        else:
-            lineas_no_atom.append(linea)
+ATOM_FORMAT = "ATOM  %5d %-4s %-3s %1s%4d    %8.3f%8.3f%8.3f  1.00  0.00          %2s\n"
+# Serial y resSeq en hybrid-36 y coordenadas ya formateadas (más de 99,999 átomos,
+# 9,999 residuos o coordenadas fuera del rango de %8.3f, típico de círculos grandes)
+ATOM_FORMAT_TEXT = "ATOM  %5s %-4s %-3s %1s%4s    %24s  1.00  0.00          %2s\n"
 
-    if not M:
-        raise ValueError("No valid ATOM lines found")
+def circularize_coords(M, pares_base):
+    """Cierra una hélice lineal (eje z) en un círculo.
 
-    z_min = min(M, key=lambda v: v[2])[2]
-    z_max = max(M, key=lambda v: v[2])[2]
+    M: array (N, 3) (o lista de [x, y, z]); pares_base: número de pares de bases.
+    Devuelve un array (N, 3) nuevo con las coordenadas transformadas.
+    """
+    pi = math.pi
+    M = np.asarray(M, dtype=float)
+    z_min = M[:, 2].min()
+    z_max = M[:, 2].max()
     delta_z = z_max - z_min
+    if delta_z == 0:
+        raise ValueError("La hélice no tiene extensión en z")
     radio = delta_z / (2 * pi)
 
-    partes_ultima = lineas_atom[-1].split()
-    pares_base = int(partes_ultima[5]) // 2
-    angulo_total = 0
+    # La rotación previa alrededor de z usaba angulo_total = 0 (identidad): se omite.
+    x = M[:, 0] - radio
+    z = M[:, 2] - (delta_z / 2)
+
+    # Para z >= 0 y z < 0 la fórmula original se reduce a la misma expresión:
+    # theta = -(2 z / delta_z) * (pi + 0.45 pi / pares_base)
+    theta = -(2 * z / delta_z) * (pi + (0.45 * pi) / pares_base)
 
-    nuevas_coords = []
-    for i in range(len(M)):
-        x, y, z = M[i]
-        theta = ((z - z_min) / delta_z) * angulo_total if delta_z != 0 else 0
-        cos_theta = math.cos(theta)
-        sin_theta = math.sin(theta)
-        x_rot = cos_theta * x - sin_theta * y
-        y_rot = sin_theta * x + cos_theta * y
-        x_rot_shifted = x_rot - radio
-        z_shifted = z - (delta_z / 2)
-        nuevas_coords.append([x_rot_shifted, y_rot, z_shifted])
+    nuevas_coords = np.empty_like(M)
+    nuevas_coords[:, 0] = np.cos(theta) * x
+    nuevas_coords[:, 1] = M[:, 1]
+    nuevas_coords[:, 2] = np.sin(theta) * x
+    return nuevas_coords
+
+
+def circularize_pdb(input_file, output_file="ADN_circularizado.pdb"):
+    with open(input_file, 'rb') as archivo:
+        data = archivo.read()
+
+    atoms = read_pdb(data, records=('ATOM',))
+    if len(atoms['coords']) == 0:
+        raise ValueError("No valid ATOM lines found")
 
-    nuevas_coords2 = []
-    for x, y, z in nuevas_coords:
-        if z >= 0:
-            theta = (1 - 2 * ((delta_z / 2 - z) / delta_z)) * (-pi - (0.45 * pi) / pares_base)
-        else:
-            theta = (1 - 2 * ((delta_z / 2 + z) / delta_z)) * (pi + (0.45 * pi) / pares_base)
-        cos_theta = math.cos(theta)
-        sin_theta = math.sin(theta)
-        x_rot = cos_theta * x
-        z_rot = sin_theta * x
-        nuevas_coords2.append([x_rot, y, z_rot])
+    pares_base = int(atoms['resSeq'][-1]) // 2
+    nuevas_coords = circularize_coords(atoms['coords'], pares_base)
 
-    nuevas_lineas = []
-    for idx, linea in enumerate(lineas_atom):
-        coord = nuevas_coords2[idx]
-        nueva_linea = "ATOM  {serial:5d} {name:<4} {resName:3} {chainID:1}{resSeq:4d}    {x:8.3f}{y:8.3f}{z:8.3f}  1.00  0.00          {element:>2}\n".format(
-            serial=idx + 1,
-            name=linea[12:16].strip(),
-            resName=linea[17:20].strip(),
-            chainID=linea[21].strip(),
-            resSeq=int(linea[22:26].strip()),
-            x=coord[0],
-            y=coord[1],
-            z=coord[2],
-            element=linea[76:78].strip()
-        )
-        nuevas_lineas.append(nueva_linea)
+    lineas_no_atom = [
+        linea + '\n'
+        for linea in data.decode('utf-8', errors='ignore').splitlines()
+        if not linea.startswith("ATOM")
+    ]
+    seriales = np.arange(1, len(nuevas_coords) + 1)
+    res_seqs = atoms['resSeq']
+    if seriales[-1] <= 99999 and res_seqs.min() >= -999 and res_seqs.max() <= 9999 \
+            and coords_fit_columns(nuevas_coords):
+        nuevas_lineas = [
+            ATOM_FORMAT % (serial, name, res_name, chain_id, res_seq, x, y, z, element)
+            for serial, name, res_name, chain_id, res_seq, (x, y, z), element in zip(
+                seriales.tolist(), atoms['name'].tolist(), atoms['resName'].tolist(), atoms['chainID'].tolist(),
+                res_seqs.tolist(), nuevas_coords.tolist(), atoms['element'].tolist()
+            )
+        ]
+    else:
+        nuevas_lineas = [
+            ATOM_FORMAT_TEXT % fila
+            for fila in zip(
+                hybrid36_encode(seriales, 5).tolist(), atoms['name'].tolist(), atoms['resName'].tolist(),
+                atoms['chainID'].tolist(), hybrid36_encode(res_seqs, 4).tolist(),
+                format_coord_columns(nuevas_coords), atoms['element'].tolist()
+            )
+        ]
 
     with open(output_file, 'w') as salida:
         salida.writelines(lineas_no_atom + nuevas_lineas)
@@ -0,0 +1,135 @@
+"""
+Compresión para transferir PDB: variantes precomprimidas y subidas .pdb.gz.
+
+El texto PDB es muy repetitivo y se reduce 5-10x. Para cada archivo servido
+(resultado en caché, subida) se guarda, la primera vez que un cliente lo pide,
+una variante junto al original (<archivo>.gz y, si está instalado el paquete
+brotli, <archivo>.br); las siguientes respuestas envían ese archivo tal cual,
+con Content-Encoding y soporte de Range sobre los bytes comprimidos.
+
+    encoding = negotiate_encoding(request.accept_encodings)   # 'br', 'gzip' o None
+    path = ensure_precompressed('cache/<key>.pdb', encoding)
+
+Las respuestas que se arman al vuelo (generación sin caché) se comprimen por
+partes con iter_gzip.
+"""
+from __future__ import annotations
+import gzip
+import os
+import tempfile
+import zlib
+from typing import BinaryIO, Iterable, Iterator, Optional
+
+try:
+    import brotli
+except ImportError:  # opcional: sin brotli solo se ofrece gzip
+    brotli = None
+
+GZIP_LEVEL = 6
+STREAM_GZIP_LEVEL = 3  # más rápido: se comprime mientras se genera
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate_encoding(accept_encodings, encodings=ENCODINGS) -> Optional[str]:
+    """Mejor codificación aceptada por el cliente (Accept de werkzeug), o None para enviar sin comprimir."""
+    return accept_encodings.best_match(encodings)
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    if encoding == 'br' and brotli is not None:
+        return brotli.compress(data, quality=9)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def precompressed_path(path: str, encoding: str) -> str:
+    return path + SUFFIXES[encoding]
+
+
+def _compress_file(path: str, encoding: str, out: BinaryIO, chunk_bytes: int = 1024 * 1024) -> None:
+    with open(path, 'rb') as src:
+        if encoding == 'gzip':
+            with gzip.GzipFile(fileobj=out, mode='wb', compresslevel=GZIP_LEVEL, mtime=0) as gz:
+                for chunk in iter(lambda: src.read(chunk_bytes), b''):
+                    gz.write(chunk)
+        else:
+            compressor = brotli.Compressor(quality=9)
+            for chunk in iter(lambda: src.read(chunk_bytes), b''):
+                out.write(compressor.process(chunk))
+            out.write(compressor.finish())
+
+
+def ensure_precompressed(path: str, encoding: str) -> Optional[str]:
+    """Ruta de la variante comprimida de path, creándola si falta o es más vieja que el original.
+
+    Devuelve None si la codificación no está disponible o el original no existe.
+    """
+    if encoding not in ENCODINGS:
+        return None
+    target = precompressed_path(path, encoding)
+    try:
+        source_mtime = os.path.getmtime(path)
+        if os.path.getmtime(target) >= source_mtime:
+            return target
+    except OSError:
+        if not os.path.exists(path):
+            return None
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            _compress_file(path, encoding, tmp)
+        os.replace(tmp_path, target)
+    except FileNotFoundError:
+        return None  # el original se desalojó mientras se comprimía
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return target
+
+
+def iter_gzip(chunks: Iterable, level: int = STREAM_GZIP_LEVEL) -> Iterator[bytes]:
+    """Comprime en gzip una secuencia de chunks (str o bytes) a medida que llegan."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_gunzip(stream: BinaryIO, chunk_bytes: int, raw_sink: Optional[BinaryIO] = None) -> Iterator[bytes]:
+    """Descomprime un stream gzip por partes, en bloques de hasta chunk_bytes.
+
+    Nunca expande más de chunk_bytes por vez, así el tope de tamaño se aplica
+    sobre el contenido descomprimido. Si se pasa raw_sink, copia ahí los bytes
+    comprimidos tal como llegan. Acepta gzip de varios miembros.
+    """
+    decompressor = zlib.decompressobj(31)
+    started = False
+    try:
+        while True:
+            chunk = stream.read(chunk_bytes)
+            if not chunk:
+                break
+            if raw_sink is not None:
+                raw_sink.write(chunk)
+            data = chunk
+            while data:
+                started = True
+                out = decompressor.decompress(data, chunk_bytes)
+                if out:
+                    yield out
+                data = decompressor.unconsumed_tail
+                if decompressor.eof:
+                    data = decompressor.unused_data + data
+                    decompressor = zlib.decompressobj(31)
+                    started = bool(data)
+        out = decompressor.flush()
+        if out:
+            yield out
+    except zlib.error as e:
+        raise ValueError(f"Invalid gzip upload: {e}")
+    if started and not decompressor.eof:
+        raise ValueError("Invalid gzip upload: truncated")
@@ -1,138 +1,332 @@
 # -*- coding: utf-8 -*-
+import hashlib
+import os
+import sys
+import tempfile
+import threading
 import numpy as np
-from math import cos, sin, radians
-
-
-def read_pdb_template(filename):
-    """Lee un archivo PDB y retorna las coordenadas de los átomos por residuo."""
-    atoms = []
-    with open(filename, 'r') as f:
-        for line in f:
-            if line.startswith('ATOM'):
-                atom_data = {
-                    'serial': int(line[6:11].strip()),
-                    'name': line[12:16].strip(),
-                    'resName': line[17:20].strip(),
-                    'chainID': line[21:22].strip(),
-                    'resSeq': int(line[22:26].strip()),
-                    'x': float(line[30:38].strip()),
-                    'y': float(line[38:46].strip()),
-                    'z': float(line[46:54].strip()),
-                    'element': line[76:78].strip()
-                }
-                atoms.append(atom_data)
-    return atoms
-
-def get_nucleotide_coords(template, chain, res_seq):
-    """Extrae coordenadas de un nucleótido específico de una cadena y número de residuo."""
-    return [atom for atom in template if atom['chainID'] == chain and atom['resSeq'] == res_seq]
+
+from pdb_reader import read_pdb
+
+TEMPLATE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Parámetros de la hélice B
+RISE = 3.4
+TWIST = 34.3
+
+# Base en la cadena A -> (plantilla, residuo en A, residuo en B)
+BASE_PAIRS = {
+    'A': ('AT', 'DA', 'DT'),
+    'T': ('TA', 'DT', 'DA'),
+    'C': ('CG', 'DC', 'DG'),
+    'G': ('GC', 'DG', 'DC'),
+}
+
 
 def complementary_base(base):
     """Retorna la base complementaria."""
     pairs = {'A': 'T', 'T': 'A', 'C': 'G', 'G': 'C'}
     return pairs[base]
 
-def rotate_z(coords, angle_deg):
-    """Rota coordenadas alrededor del eje z por un ángulo en grados."""
-    angle_rad = radians(angle_deg)
-    rotation_matrix = np.array([
-        [cos(angle_rad), -sin(angle_rad), 0],
-        [sin(angle_rad), cos(angle_rad), 0],
-        [0, 0, 1]
-    ])
-    new_coords = []
-    for atom in coords:
-        xyz = np.array([atom['x'], atom['y'], atom['z']])
-        rotated_xyz = rotation_matrix.dot(xyz)
-        new_atom = atom.copy()
-        new_atom['x'], new_atom['y'], new_atom['z'] = rotated_xyz
-        new_coords.append(new_atom)
-    return new_coords
-
-def translate(coords, dz):
-    """Traslada coordenadas en la dirección z."""
-    new_coords = []
-    for atom in coords:
-        new_atom = atom.copy()
-        new_atom['z'] += dz
-        new_coords.append(new_atom)
-    return new_coords
-
-def calculate_distance(atom1, atom2):
-    """Calcula la distancia euclidiana entre dos átomos."""
-    return np.sqrt(
-        (atom1['x'] - atom2['x'])**2 +
-        (atom1['y'] - atom2['y'])**2 +
-        (atom1['z'] - atom2['z'])**2
-    )
-
-def validate_hbonds(chain_a_atoms, chain_b_atoms, base_a, base_b):
-    """Valida las distancias de los puentes de hidrógeno."""
-    expected_range = (2.8, 3.0)
-    if base_a == 'A' and base_b == 'T':
-        # A-T: N6-H61...O4, N1...H3-N3
-        n6 = next((a for a in chain_a_atoms if a['name'] == 'N6'), None)
-        h61 = next((a for a in chain_a_atoms if a['name'] == 'H61'), None)
-        o4 = next((a for a in chain_b_atoms if a['name'] == 'O4'), None)
-        n1 = next((a for a in chain_a_atoms if a['name'] == 'N1'), None)
-        h3 = next((a for a in chain_b_atoms if a['name'] == 'H3'), None)
-        n3 = next((a for a in chain_b_atoms if a['name'] == 'N3'), None)
-        if h61 and o4:
-            dist1 = calculate_distance(h61, o4)
-            print(f"A-T H61...O4 distance: {dist1:.2f} Å")
-            if not (expected_range[0] <= dist1 <= expected_range[1]):
-                print(f"Warning: A-T H61...O4 distance out of range {expected_range}")
-        if n1 and h3:
-            dist2 = calculate_distance(n1, h3)
-            print(f"A-T N1...H3 distance: {dist2:.2f} Å")
-            if not (expected_range[0] <= dist2 <= expected_range[1]):
-                print(f"Warning: A-T N1...H3 distance out of range {expected_range}")
-    elif base_a == 'C' and base_b == 'G':
-        # C-G: O6...H41-N4, H1-N1...N3, H22-N2...O2
-        o6 = next((a for a in chain_b_atoms if a['name'] == 'O6'), None)
-        h41 = next((a for a in chain_a_atoms if a['name'] == 'H41'), None)
-        n1 = next((a for a in chain_b_atoms if a['name'] == 'N1'), None)
-        h1 = next((a for a in chain_b_atoms if a['name'] == 'H1'), None)
-        n3 = next((a for a in chain_a_atoms if a['name'] == 'N3'), None)
-        h22 = next((a for a in chain_b_atoms if a['name'] == 'H22'), None)
-        o2 = next((a for a in chain_a_atoms if a['name'] == 'O2'), None)
-        if h41 and o6:
-            dist1 = calculate_distance(h41, o6)
-            print(f"C-G H41...O6 distance: {dist1:.2f} Å")
-            if not (expected_range[0] <= dist1 <= expected_range[1]):
-                print(f"Warning: C-G H41...O6 distance out of range {expected_range}")
-        if h1 and n3:
-            dist2 = calculate_distance(h1, n3)
-            print(f"C-G H1...N3 distance: {dist2:.2f} Å")
-            if not (expected_range[0] <= dist2 <= expected_range[1]):
-                print(f"Warning: C-G H1...N3 distance out of range {expected_range}")
-        if h22 and o2:
-            dist3 = calculate_distance(h22, o2)
-            print(f"C-G H22...O2 distance: {dist3:.2f} Å")
-            if not (expected_range[0] <= dist3 <= expected_range[1]):
-                print(f"Warning: C-G H22...O2 distance out of range {expected_range}")
-
-def validate_backbone_connectivity(prev_atoms, curr_atoms):
-    """Valida la distancia O3'-P entre residuos consecutivos."""
-    o3p = next((a for a in prev_atoms if a['name'] == "O3'"), None)
-    p = next((a for a in curr_atoms if a['name'] == 'P'), None)
-    if o3p and p:
-        dist = calculate_distance(o3p, p)
-        print(f"O3'-P distance: {dist:.2f} Å")
-        if not (1.5 <= dist <= 1.7):
-            print(f"Warning: O3'-P distance out of range (1.5-1.7 Å)")
-
-def write_pdb(atoms, filename):
-    """Escribe las coordenadas en un archivo PDB."""
-    with open(filename, 'w') as f:
-        for atom in atoms:
-            f.write(
-                f"ATOM  {atom['serial']:5d} {atom['name']:<4} {atom['resName']:3} "
-                f"{atom['chainID']:1}{atom['resSeq']:4d}    "
-                f"{atom['x']:8.3f}{atom['y']:8.3f}{atom['z']:8.3f}"
-                f"  1.00  0.00          {atom['element']:>2}\n"
+def twist_per_base(length, sigma):
+    """Retorna el giro por par de bases (grados) para una densidad superhelicoidal sigma."""
+    Lk0 = length / 10.5
+    DLk = sigma * Lk0
+    AnguloTotal = DLk * 360
+    anguloPorBase = AnguloTotal / length
+    return TWIST + anguloPorBase
+
+TEMPLATE_NAMES = ('AT', 'TA', 'CG', 'GC')
+TEMPLATE_CACHE_FILE = 'templates_cache.npz'
+_TEMPLATE_FIELDS = ('coords', 'name', 'resName', 'chainID', 'resSeq', 'element')
+_template_stores = {}
+_template_stores_lock = threading.Lock()
+
+def _template_hash(template_dir):
+    """Hash SHA-256 del contenido de las cuatro plantillas."""
+    digest = hashlib.sha256()
+    for name in TEMPLATE_NAMES:
+        with open(os.path.join(template_dir, f'{name}.pdb'), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def _index_residues(template):
+    """Agrega a la plantilla el índice (chainID, resSeq) -> slice de sus átomos."""
+    residues = {}
+    chain_ids, res_seqs = template['chainID'], template['resSeq']
+    start = 0
+    for idx in range(1, len(res_seqs) + 1):
+        if idx == len(res_seqs) or chain_ids[idx] != chain_ids[start] or res_seqs[idx] != res_seqs[start]:
+            residues[(str(chain_ids[start]), int(res_seqs[start]))] = slice(start, idx)
+            start = idx
+    template['residues'] = residues
+    return template
+
+def _template_arrays(filename):
+    """Lee una plantilla como arrays por columna."""
+    columns = read_pdb(filename, records=('ATOM',))
+    return {field: columns[field] for field in _TEMPLATE_FIELDS}
+
+def load_template_store(template_dir=TEMPLATE_DIR, cache_file=TEMPLATE_CACHE_FILE):
+    """Carga las plantillas AT/TA/CG/GC como arrays NumPy indexados por residuo.
+
+    Usa el archivo binario cache_file (en template_dir) si su hash coincide con
+    el de las plantillas; si no, parsea los PDB y lo regenera. Con cache_file=None
+    no se lee ni escribe ningún archivo auxiliar.
+    """
+    key = _template_hash(template_dir)
+    cache_path = os.path.join(template_dir, cache_file) if cache_file else None
+
+    store = None
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with np.load(cache_path) as data:
+                if str(data['hash']) == key:
+                    store = {
+                        name: {field: data[f'{name}_{field}'] for field in _TEMPLATE_FIELDS}
+                        for name in TEMPLATE_NAMES
+                    }
+        except (OSError, KeyError, ValueError):
+            store = None
+
+    if store is None:
+        store = {
+            name: _template_arrays(os.path.join(template_dir, f'{name}.pdb'))
+            for name in TEMPLATE_NAMES
+        }
+        if cache_path:
+            arrays = {
+                f'{name}_{field}': store[name][field]
+                for name in TEMPLATE_NAMES for field in _TEMPLATE_FIELDS
+            }
+            # Escritura atómica: otro proceso nunca ve un .npz a medio escribir
+            try:
+                fd, tmp_path = tempfile.mkstemp(dir=template_dir, suffix='.npz.tmp')
+                try:
+                    with os.fdopen(fd, 'wb') as tmp:
+                        np.savez(tmp, hash=np.array(key), **arrays)
+                    os.replace(tmp_path, cache_path)
+                finally:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+            except OSError:
+                pass  # Directorio de solo lectura: se usa la copia en memoria
+
+    for template in store.values():
+        _index_residues(template)
+    return store
+
+def get_template_store(template_dir=TEMPLATE_DIR):
+    """Retorna las plantillas cargadas, parseándolas solo una vez por proceso."""
+    with _template_stores_lock:
+        if template_dir not in _template_stores:
+            _template_stores[template_dir] = load_template_store(template_dir)
+        return _template_stores[template_dir]
+
+def helix_transforms(n, twist, rise=RISE):
+    """Retorna las rotaciones (n, 3, 3) alrededor de z y traslaciones (n, 3) de cada par de bases."""
+    steps = np.arange(n)
+    angles = np.radians(steps * twist)
+    cos_a, sin_a = np.cos(angles), np.sin(angles)
+    rotations = np.zeros((n, 3, 3))
+    rotations[:, 0, 0] = cos_a
+    rotations[:, 0, 1] = -sin_a
+    rotations[:, 1, 0] = sin_a
+    rotations[:, 1, 1] = cos_a
+    rotations[:, 2, 2] = 1.0
+    shifts = np.zeros((n, 3))
+    shifts[:, 2] = steps * rise
+    return rotations, shifts
+
+def transform_blocks(coords, rotations, shifts):
+    """Aplica rotaciones (k, 3, 3) y traslaciones (k, 3) a bloques de coordenadas (k, m, 3)."""
+    return np.einsum('kij,kmj->kmi', rotations, coords) + shifts[:, None, :]
+
+def _assemble_chain(bases, order, chain, res_seqs, templates, rotations, shifts):
+    """Construye los arrays de una cadena con los pares de bases en el orden 'order'.
+
+    Agrupa los pares por plantilla y transforma cada grupo en una sola operación.
+    """
+    template_res, name_col = (1, 1) if chain == 'A' else (36, 2)
+    ordered_bases = bases[order]
+    counts = np.zeros(len(order), dtype=int)
+    groups = []
+    for base, pair in BASE_PAIRS.items():
+        positions = np.flatnonzero(ordered_bases == base)
+        if positions.size == 0:
+            continue
+        template = templates[pair[0]]
+        atoms = template['residues'][(chain, template_res)]
+        counts[positions] = atoms.stop - atoms.start
+        groups.append((positions, template, atoms, pair[name_col]))
+
+    offsets = np.cumsum(counts) - counts
+    total = int(counts.sum())
+    chain_arrays = {
+        'coords': np.empty((total, 3)),
+        'name': np.empty(total, dtype='<U4'),
+        'resName': np.empty(total, dtype='<U3'),
+        'chainID': np.full(total, chain, dtype='<U1'),
+        'resSeq': np.repeat(np.asarray(res_seqs, dtype=int), counts),
+        'element': np.empty(total, dtype='<U2'),
+    }
+    for positions, template, atoms, res_name in groups:
+        block = template['coords'][atoms]
+        idx = offsets[positions][:, None] + np.arange(len(block))
+        pairs = order[positions]
+        stacked = np.broadcast_to(block, (len(positions),) + block.shape)
+        chain_arrays['coords'][idx] = transform_blocks(stacked, rotations[pairs], shifts[pairs])
+        chain_arrays['name'][idx] = template['name'][atoms]
+        chain_arrays['element'][idx] = template['element'][atoms]
+        chain_arrays['resName'][idx] = res_name
+    return chain_arrays
+
+def build_duplex(sequence, sigma, topology='linear', templates=None):
+    """Construye la doble hélice B en memoria, sin archivos intermedios.
+
+    Retorna un dict con arrays por átomo ('coords' (N, 3), 'name', 'resName',
+    'chainID', 'resSeq', 'element') ya en el orden final: cadena A 1..n y
+    cadena B con la numeración continua n+1..2n que produce ordenar_pdb.py.
+    Si topology == 'circular', aplica circularizarDNA sobre las coordenadas.
+    """
+    sequence = sequence.upper()
+    if not sequence or not all(base in 'ATCG' for base in sequence):
+        raise ValueError("La secuencia solo debe contener A, T, C o G.")
+    if topology not in ('linear', 'circular'):
+        raise ValueError(f"Topología desconocida: {topology}")
+    if templates is None:
+        templates = get_template_store()
+
+    n = len(sequence)
+    bases = np.array(list(sequence))
+    rotations, shifts = helix_transforms(n, twist_per_base(n, sigma))
+
+    # Cadena A: 1..n; cadena B: el par n primero, numerado n+1..2n
+    forward = np.arange(n)
+    chain_a = _assemble_chain(bases, forward, 'A', forward + 1, templates, rotations, shifts)
+    chain_b = _assemble_chain(bases, forward[::-1], 'B', forward + n + 1, templates, rotations, shifts)
+    structure = {key: np.concatenate([chain_a[key], chain_b[key]]) for key in chain_a}
+
+    if topology == 'circular':
+        from circularizarDNA import circularize_coords
+        structure['coords'] = circularize_coords(structure['coords'], n)
+    return structure
+
+# Puentes de hidrógeno por base de la cadena A: (átomo en A, átomo en B)
+HBOND_ATOMS = {
+    'A': (('H61', 'O4'), ('N1', 'H3')),
+    'T': (('O4', 'H61'), ('H3', 'N1')),
+    'C': (('H41', 'O6'), ('N3', 'H1'), ('O2', 'H22')),
+    'G': (('O6', 'H41'), ('H1', 'N3'), ('H22', 'O2')),
+}
+HBOND_RANGE = (2.8, 3.0)
+BACKBONE_RANGE = (1.5, 1.7)
+
+def _pair_atom_index(structure, chain, name, n):
+    """Índice de átomo 'name' de la cadena 'chain' para cada par de bases (-1 si falta).
+
+    Usa la numeración final de build_duplex: cadena A 1..n, cadena B 2n..n+1.
+    """
+    atoms = np.flatnonzero((structure['chainID'] == chain) & (structure['name'] == name))
+    res_seq = structure['resSeq'][atoms]
+    pairs = res_seq - 1 if chain == 'A' else 2 * n - res_seq
+    keep = (pairs >= 0) & (pairs < n)
+    index = np.full(n, -1)
+    index[pairs[keep]] = atoms[keep]
+    return index
+
+def _distance_summary(distances, expected_range, outliers, max_outliers):
+    """Resumen de un conjunto de distancias: conteos, mínimo, máximo, media y fuera de rango."""
+    summary = {
+        'expected_range': list(expected_range),
+        'count': int(len(distances)),
+        'out_of_range': len(outliers),
+        'min': float(distances.min()) if len(distances) else None,
+        'max': float(distances.max()) if len(distances) else None,
+        'mean': float(distances.mean()) if len(distances) else None,
+        'outliers': outliers[:max_outliers],
+    }
+    return summary
+
+def validate_duplex(structure, max_outliers=50):
+    """Valida puentes de hidrógeno y distancias O3'-P de una doble hélice, sin bucles por átomo.
+
+    structure: dict de arrays de build_duplex (o del lector pdb_reader con la misma
+    numeración). Devuelve un reporte con conteos, mínimo/máximo/media y los pares
+    fuera de rango (hasta max_outliers por categoría).
+    """
+    coords = structure['coords']
+    chain_a = structure['chainID'] == 'A'
+    res_a, first = np.unique(structure['resSeq'][chain_a], return_index=True)
+    n = len(res_a)
+    sequence = np.array([name[-1] for name in structure['resName'][chain_a][first]])
+
+    index_cache = {}
+    def atom_index(chain, name):
+        if (chain, name) not in index_cache:
+            index_cache[(chain, name)] = _pair_atom_index(structure, chain, name, n)
+        return index_cache[(chain, name)]
+
+    # Puentes de hidrógeno: una operación por tipo de enlace
+    hb_pairs, hb_labels, hb_dist = [], [], []
+    for base, bonds in HBOND_ATOMS.items():
+        pairs = np.flatnonzero(sequence == base)
+        if pairs.size == 0:
+            continue
+        for name_a, name_b in bonds:
+            ia, ib = atom_index('A', name_a)[pairs], atom_index('B', name_b)[pairs]
+            ok = (ia >= 0) & (ib >= 0)
+            hb_pairs.append(pairs[ok])
+            hb_labels.extend([f"{base}-{complementary_base(base)} {name_a}...{name_b}"] * int(ok.sum()))
+            hb_dist.append(np.linalg.norm(coords[ia[ok]] - coords[ib[ok]], axis=1))
+    hb_pairs = np.concatenate(hb_pairs) if hb_pairs else np.empty(0, dtype=int)
+    hb_dist = np.concatenate(hb_dist) if hb_dist else np.empty(0)
+    bad = np.flatnonzero((hb_dist < HBOND_RANGE[0]) | (hb_dist > HBOND_RANGE[1]))
+    hb_outliers = [
+        {'pair': int(hb_pairs[i]) + 1, 'bond': hb_labels[i], 'distance': round(float(hb_dist[i]), 3)}
+        for i in bad[:max_outliers]
+    ]
+    hbonds = _distance_summary(hb_dist, HBOND_RANGE, hb_outliers, max_outliers)
+    hbonds['out_of_range'] = int(bad.size)
+
+    # Conectividad O3'-P: A del par i al i+1; B (antiparalela) del par i+1 al i
+    bb_dist, bb_outliers, bb_bad = [], [], 0
+    for chain, o3_pairs, p_pairs in (
+        ('A', np.arange(n - 1), np.arange(1, n)),
+        ('B', np.arange(1, n), np.arange(n - 1)),
+    ):
+        io3, ip = atom_index(chain, "O3'")[o3_pairs], atom_index(chain, 'P')[p_pairs]
+        ok = (io3 >= 0) & (ip >= 0)
+        dist = np.linalg.norm(coords[io3[ok]] - coords[ip[ok]], axis=1)
+        bad = np.flatnonzero((dist < BACKBONE_RANGE[0]) | (dist > BACKBONE_RANGE[1]))
+        bb_bad += int(bad.size)
+        res_o3, res_p = structure['resSeq'][io3[ok]], structure['resSeq'][ip[ok]]
+        bb_outliers.extend(
+            {'chain': chain, 'from_residue': int(res_o3[i]), 'to_residue': int(res_p[i]),
+             'distance': round(float(dist[i]), 3)}
+            for i in bad[:max_outliers]
+        )
+        bb_dist.append(dist)
+    bb_dist = np.concatenate(bb_dist)
+    backbone = _distance_summary(bb_dist, BACKBONE_RANGE, bb_outliers, max_outliers)
+    backbone['out_of_range'] = bb_bad
+
+    return {'base_pairs': n, 'hbonds': hbonds, 'backbone': backbone}
+
+def format_validation_report(report):
+    """Resumen de validate_duplex en pocas líneas de texto."""
+    lines = [f"Base pairs: {report['base_pairs']}"]
+    for key, title in (('hbonds', 'H-bond'), ('backbone', "O3'-P")):
+        section = report[key]
+        low, high = section['expected_range']
+        if section['count']:
+            lines.append(
+                f"{title} distances: {section['count']} checked, min {section['min']:.2f} Å, "
+                f"max {section['max']:.2f} Å, {section['out_of_range']} out of range ({low}-{high} Å)"
             )
-        f.write("TER\n")
+        else:
+            lines.append(f"{title} distances: none checked")
+    return "\n".join(lines)
 
 def main():
     # Solicitar secuencia al usuario
@@ -150,93 +344,19 @@ def main():
     DLk=sigma*Lk0
     AnguloTotal=DLk*360
     anguloPorBase=AnguloTotal/longitud
-    # Cargar plantillas
-    templates = {
-        'AT': read_pdb_template('AT.pdb'),
-        'TA': read_pdb_template('TA.pdb'),
-        'CG': read_pdb_template('CG.pdb'),
-        'GC': read_pdb_template('GC.pdb')
-    }
 
-    # Parámetros de la hélice B
-    rise = 3.4
-    twist = 34.3+anguloPorBase
-
-    # Inicializar lista de átomos
-    all_atoms = []
-    atom_serial = 1
-    prev_chain_a_atoms = None
-    prev_chain_b_atoms = None
-
-    # Construir la doble hélice
-    for i, base in enumerate(sequence, start=1):
-        # Seleccionar plantilla según la base en la cadena principal
-        if base == 'A':
-            template = templates['AT']
-            res_a, res_b = 1, 36  # DA en A, DT en B
-            base_a, base_b = 'DA', 'DT'
-        elif base == 'T':
-            template = templates['TA']
-            res_a, res_b = 1, 36  # DT en A, DA en B
-            base_a, base_b = 'DT', 'DA'
-        elif base == 'C':
-            template = templates['CG']
-            res_a, res_b = 1, 36  # DC en A, DG en B
-            base_a, base_b = 'DC', 'DG'
-        elif base == 'G':
-            template = templates['GC']
-            res_a, res_b = 1, 36  # DG en A, DC en B
-            base_a, base_b = 'DG', 'DC'
-
-        # Extraer coordenadas de los nucleótidos
-        chain_a_atoms = get_nucleotide_coords(template, 'A', res_a)
-        chain_b_atoms = get_nucleotide_coords(template, 'B', res_b)
-
-        # Aplicar transformaciones geométricas
-        dz = (i - 1) * rise
-        angle = (i - 1) * twist
-        chain_a_atoms = translate(rotate_z(chain_a_atoms, angle), dz)
-        chain_b_atoms = translate(rotate_z(chain_b_atoms, angle), dz)
-
-        # Actualizar números de serie y residuos
-        for atom in chain_a_atoms:
-            atom['serial'] = atom_serial
-            atom['resSeq'] = i
-            atom['chainID'] = 'A'
-            atom['resName'] = base_a
-            atom_serial += 1
-        for atom in chain_b_atoms:
-            atom['serial'] = atom_serial
-            atom['resSeq'] = len(sequence) + 1 - i  # Cadena B en orden inverso
-            atom['chainID'] = 'B'
-            atom['resName'] = base_b
-            atom_serial += 1
-
-        # Validar puentes de hidrógeno
-        print(f"\nValidating base pair {i} ({base_a} - {base_b}):")
-        validate_hbonds(chain_a_atoms, chain_b_atoms, base, complementary_base(base))
-
-        # Validar conectividad del esqueleto
-        if prev_chain_a_atoms:
-            print(f"Validating backbone connectivity (Chain A, residue {i-1} to {i}):")
-            validate_backbone_connectivity(prev_chain_a_atoms, chain_a_atoms)
-        if prev_chain_b_atoms:
-            print(f"Validating backbone connectivity (Chain B, residue {len(sequence)+2-i} to {len(sequence)+1-i}):")
-            validate_backbone_connectivity(chain_b_atoms, prev_chain_b_atoms)  # B en orden inverso
-
-        # Agregar átomos a la lista
-        all_atoms.extend(chain_a_atoms)
-        all_atoms.extend(chain_b_atoms)
-
-        # Actualizar átomos previos
-        prev_chain_a_atoms = chain_a_atoms
-        prev_chain_b_atoms = chain_b_atoms
-
-    # Escribir archivo PDB
-    write_pdb(all_atoms, 'ADN.pdb')
+    # Construir la doble hélice y validarla en bloque
+    structure = build_duplex(sequence, sigma)
+    print(format_validation_report(validate_duplex(structure)))
+
+    # ADN.pdb conserva la numeración que espera ordenar_pdb.py (cadena B n..1)
+    chain_b = structure['chainID'] == 'B'
+    structure['resSeq'][chain_b] -= longitud
+    from ordenar_pdb import write_structure_pdb
+    write_structure_pdb(structure, 'ADN.pdb')
     print(f"\nDLk: {DLk}")
     print(f"\nAngulo por base: {anguloPorBase}")
     print("\nArchivo ADN.pdb generado exitosamente.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,24 @@
+"""
+Configuración de gunicorn:  gunicorn -c gunicorn.conf.py app:app
+
+La app se carga una sola vez en el proceso maestro (preload_app) y warm_up()
+importa NumPy y los módulos de análisis y parsea las plantillas antes de crear
+los workers: cada worker nace con todo cargado y comparte esas páginas por
+copy-on-write. gc.freeze() saca esos objetos del recolector de basura, para que
+sus recorridos no escriban en las páginas compartidas y las copien.
+"""
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+preload_app = True
+
+
+def when_ready(server):
+    """Maestro listo, antes del primer fork."""
+    import app
+
+    app.warm_up()
+    gc.freeze()
+    server.log.info("App precargada: plantillas y módulos listos para los workers")
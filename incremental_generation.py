@@ -0,0 +1,215 @@
+"""
+Regeneración incremental: ediciones de secuencia sobre una estructura ya generada.
+
+Cada par de bases de build_duplex depende solo de su índice, su base y el giro
+por par (la sigma), así que al editar la secuencia:
+
+    sustitución   cambia solo el bloque de ese par (en las dos cadenas)
+    inserción /   los pares anteriores quedan iguales; los siguientes cambian
+    borrado       de índice y se vuelven a armar
+
+patch_duplex copia de la estructura anterior los bloques de los pares que
+conservan índice y base, y arma con las plantillas solo los demás. El resultado
+es idéntico, bit a bit, al de build_duplex con la secuencia nueva.
+
+iter_patched_pdb hace lo mismo con el texto: las líneas ATOM de los átomos
+copiados se toman del PDB anterior (ancho fijo) reescribiendo solo las columnas
+de serial y resSeq, y se formatean solo las de los átomos nuevos.
+
+    sequence, origin = apply_edits('ACGT...', [{'op': 'substitute', 'position': 12, 'base': 'G'}])
+    structure, source, rebuilt = patch_duplex(old, old_sequence, sequence, origin, sigma)
+"""
+from __future__ import annotations
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from generate_b_dna import _assemble_chain, get_template_store, helix_transforms, twist_per_base
+from ordenar_pdb import chain_ends, format_atom_lines, format_ter_line
+from pdb_reader import hybrid36_bytes
+from structure_format import STRUCTURE_FIELDS, residue_starts
+
+EDIT_OPS = ('substitute', 'insert', 'delete')
+MAX_EDITS = 1000
+ATOM_LINE_BYTES = 81
+TER_LINE_BYTES = 27
+_SERIAL_COLUMNS = slice(6, 11)
+_RESSEQ_COLUMNS = slice(22, 26)
+
+
+def _edit_position(edit: dict, length: int, allow_end: bool = False) -> int:
+    """Posición 1-based de una edición, como índice 0-based; ValueError si está fuera de rango."""
+    try:
+        position = int(edit['position'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Each edit needs an integer 'position'")
+    if not 1 <= position <= length + (1 if allow_end else 0):
+        raise ValueError(f"Edit position out of range: {position}")
+    return position - 1
+
+
+def _edit_bases(value) -> List[str]:
+    bases = str(value or '').upper()
+    if not bases or not all(base in 'ATCG' for base in bases):
+        raise ValueError(f"Invalid bases in edit: {value!r}")
+    return list(bases)
+
+
+def apply_edits(sequence: str, edits: List[dict]) -> Tuple[str, np.ndarray]:
+    """Aplica las ediciones en orden (cada posición se refiere a la secuencia ya editada).
+
+    Ediciones: {'op': 'substitute', 'position': p, 'base': 'G'},
+    {'op': 'insert', 'position': p, 'bases': 'AT'} (antes de p; len + 1 agrega al final)
+    y {'op': 'delete', 'position': p, 'length': k}. Posiciones 1-based.
+    Devuelve la secuencia nueva y, por cada par, el índice del par anterior del
+    que proviene con la misma base (-1 si es nuevo o cambió).
+    """
+    if not isinstance(edits, list) or not edits:
+        raise ValueError("Edits must be a non-empty list")
+    if len(edits) > MAX_EDITS:
+        raise ValueError(f"Too many edits (max {MAX_EDITS})")
+    bases = list(sequence)
+    origin = list(range(len(sequence)))
+    for edit in edits:
+        op = edit.get('op') if isinstance(edit, dict) else None
+        if op == 'substitute':
+            index = _edit_position(edit, len(bases))
+            base = _edit_bases(edit.get('base'))
+            if len(base) != 1:
+                raise ValueError("A substitution replaces exactly one base")
+            if base[0] != bases[index]:
+                bases[index], origin[index] = base[0], -1
+        elif op == 'insert':
+            index = _edit_position(edit, len(bases), allow_end=True)
+            inserted = _edit_bases(edit.get('bases'))
+            bases[index:index] = inserted
+            origin[index:index] = [-1] * len(inserted)
+        elif op == 'delete':
+            index = _edit_position(edit, len(bases))
+            try:
+                length = int(edit.get('length', 1))
+            except (TypeError, ValueError):
+                raise ValueError("Deletion length must be an integer")
+            if length < 1 or index + length > len(bases):
+                raise ValueError(f"Deletion out of range: {length} bases at {index + 1}")
+            del bases[index:index + length]
+            del origin[index:index + length]
+        else:
+            raise ValueError(f"Unknown edit op: {op!r} (expected one of {', '.join(EDIT_OPS)})")
+    if not bases:
+        raise ValueError("Edits leave an empty sequence")
+    return ''.join(bases), np.array(origin, dtype=np.int64)
+
+
+def _runs(flags: np.ndarray) -> List[Tuple[int, int]]:
+    """Tramos [inicio, fin) de valores iguales consecutivos en flags."""
+    if not len(flags):
+        return []
+    bounds = np.concatenate(([0], np.flatnonzero(flags[1:] != flags[:-1]) + 1, [len(flags)]))
+    return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+
+def patch_duplex(old: Dict[str, np.ndarray], old_sequence: str, sequence: str, origin: np.ndarray,
+                 sigma: float, templates=None) -> Tuple[Dict[str, np.ndarray], np.ndarray, int]:
+    """Estructura lineal de sequence armada a partir de old (la de old_sequence, lineal).
+
+    Devuelve (estructura, source, rebuilt): source[i] es el átomo de old del que se
+    copió el átomo i (-1 si se armó de nuevo) y rebuilt la cantidad de pares armados.
+    """
+    if templates is None:
+        templates = get_template_store()
+    n, m = len(old_sequence), len(sequence)
+    twist = twist_per_base(m, sigma)
+    # Se copian los pares con el mismo índice y la misma base; si el giro calculado
+    # para el largo nuevo difiere en el último bit, se arma todo para no perder la igualdad
+    keep = origin == np.arange(m)
+    if twist != twist_per_base(n, sigma):
+        keep[:] = False
+    bases = np.array(list(sequence))
+    rotations, shifts = helix_transforms(m, twist)
+    old_starts = residue_starts(old)
+
+    pieces, sources = {key: [] for key in STRUCTURE_FIELDS}, []
+    for chain, order, res_seqs, old_residue, res_shift in (
+        ('A', np.arange(m), np.arange(1, m + 1), lambda pair: pair, 0),
+        ('B', np.arange(m)[::-1], np.arange(m + 1, 2 * m + 1), lambda pair: 2 * n - 1 - pair, 2 * (m - n)),
+    ):
+        in_order = keep[order]
+        built = _assemble_chain(bases, order[~in_order], chain, res_seqs[~in_order], templates, rotations, shifts)
+        built_starts = residue_starts(built)
+        built_at = 0
+        for lo, hi in _runs(in_order):
+            if in_order[lo]:
+                # Pares consecutivos conservados: un tramo contiguo de átomos en old
+                first = old_starts[old_residue(order[lo])]
+                last = old_starts[old_residue(order[hi - 1]) + 1]
+                for key in pieces:
+                    block = old[key][first:last]
+                    pieces[key].append(block + res_shift if key == 'resSeq' else block)
+                sources.append(np.arange(first, last))
+            else:
+                first, last = built_starts[built_at], built_starts[built_at + hi - lo]
+                built_at += hi - lo
+                for key in pieces:
+                    pieces[key].append(built[key][first:last])
+                sources.append(np.full(last - first, -1, dtype=np.int64))
+
+    structure = {key: np.concatenate(blocks) for key, blocks in pieces.items()}
+    return structure, np.concatenate(sources), int(m - keep.sum())
+
+
+def expected_pdb_size(n_atoms: int, n_chains: int) -> int:
+    """Tamaño en bytes del PDB de iter_structure_pdb (líneas ATOM y TER de ancho fijo)."""
+    return n_atoms * ATOM_LINE_BYTES + n_chains * TER_LINE_BYTES
+
+
+def iter_patched_pdb(structure: Dict[str, np.ndarray], source: np.ndarray, old_text: bytes,
+                     old_chain_ends, chunk_atoms: int = 4096) -> Iterator[bytes]:
+    """PDB de structure reutilizando las líneas de old_text para los átomos con source >= 0.
+
+    old_text debe ser el PDB (de iter_structure_pdb) de la estructura de la que
+    provienen los átomos, con el cierre de cada cadena en old_chain_ends. Las
+    líneas copiadas solo cambian serial y resSeq; el resto se formatea.
+    """
+    old_lines = np.frombuffer(old_text, dtype=np.uint8)
+    old_chain_ends = np.asarray(old_chain_ends)
+    start = 0
+    for n_ters, end in enumerate(chain_ends(structure)):
+        copied = source[start:end] >= 0
+        # Un tramo copiado se corta donde los átomos de origen dejan de ser consecutivos
+        breaks = np.zeros(end - start, dtype=bool)
+        breaks[1:] = (copied[1:] != copied[:-1]) | (copied[1:] & (np.diff(source[start:end]) != 1))
+        bounds = np.append(np.flatnonzero(breaks | (np.arange(end - start) == 0)), end - start) + start
+        for lo, hi in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+            for chunk_lo in range(lo, hi, chunk_atoms):
+                chunk_hi = min(chunk_lo + chunk_atoms, hi)
+                first_serial = chunk_lo + 1 + n_ters
+                if not copied[lo - start]:
+                    yield format_atom_lines(structure, chunk_lo, chunk_hi, first_serial).encode()
+                    continue
+                old_first = int(source[chunk_lo])
+                old_ters = int(np.searchsorted(old_chain_ends, old_first, side='right'))
+                offset = old_first * ATOM_LINE_BYTES + old_ters * TER_LINE_BYTES
+                rows = old_lines[offset:offset + (chunk_hi - chunk_lo) * ATOM_LINE_BYTES]
+                rows = rows.reshape(-1, ATOM_LINE_BYTES).copy()
+                serials = np.arange(first_serial, first_serial + chunk_hi - chunk_lo)
+                rows[:, _SERIAL_COLUMNS] = hybrid36_bytes(serials, 5)
+                rows[:, _RESSEQ_COLUMNS] = hybrid36_bytes(structure['resSeq'][chunk_lo:chunk_hi], 4)
+                yield rows.tobytes()
+        last = end - 1
+        yield format_ter_line(end + 1 + n_ters, str(structure['resName'][last]),
+                              str(structure['chainID'][last]), int(structure['resSeq'][last])).encode()
+        start = end
+
+
+def pdb_text_reusable(old_text: Optional[bytes], old: Dict[str, np.ndarray]) -> bool:
+    """True si old_text tiene el tamaño y los saltos de línea esperados para old."""
+    if old_text is None:
+        return False
+    ends = chain_ends(old)
+    if len(old_text) != expected_pdb_size(len(old['coords']), len(ends)):
+        return False
+    lines = np.frombuffer(old_text, dtype=np.uint8)
+    atoms = np.arange(len(old['coords']))
+    offsets = atoms * ATOM_LINE_BYTES + np.searchsorted(ends, atoms, side='right') * TER_LINE_BYTES
+    return bool((lines[offsets + ATOM_LINE_BYTES - 1] == ord('\n')).all())
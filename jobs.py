@@ -0,0 +1,172 @@
+"""
+Cola de trabajos asíncrona para generar secuencias largas.
+
+POST /jobs/generate encola la construcción en un pool de procesos y devuelve un
+job_id; el estado de cada trabajo se guarda como JSON en un directorio compartido
+(jobs/<job_id>.json), así cualquier worker de gunicorn puede responder el sondeo.
+El PDB resultante queda en la caché de resultados (result_cache).
+
+Estados: queued -> running (stage: building | writing) -> done | failed.
+Si un proceso del pool muere (OOM, segfault), sus trabajos pasan a failed y el
+pool se vuelve a crear para los siguientes.
+"""
+from __future__ import annotations
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from functools import partial
+from typing import TYPE_CHECKING, Optional
+
+from result_cache import ResultCache
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future, ProcessPoolExecutor
+
+JOB_TTL_SECONDS = 24 * 3600
+_JOB_ID_RE = re.compile(r'[0-9a-f]{32}')
+
+
+def _status_path(jobs_dir: str, job_id: str) -> str:
+    return os.path.join(jobs_dir, f"{job_id}.json")
+
+
+def write_job_status(jobs_dir: str, job_id: str, **fields) -> dict:
+    """Actualiza (de forma atómica) el JSON de estado de un trabajo."""
+    status = read_job_status(jobs_dir, job_id) or {'job_id': job_id}
+    status.update(fields)
+    status['updated'] = time.time()
+    fd, tmp_path = tempfile.mkstemp(dir=jobs_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as tmp:
+            json.dump(status, tmp)
+        os.replace(tmp_path, _status_path(jobs_dir, job_id))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return status
+
+
+def read_job_status(jobs_dir: str, job_id: str) -> Optional[dict]:
+    """Devuelve el estado de un trabajo, o None si no existe."""
+    try:
+        with open(_status_path(jobs_dir, job_id), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def run_generation_job(jobs_dir, job_id, cache_dir, cache_max_bytes, key, sequence, sigma, topology,
+                       validate=False):
+    """Trabajo ejecutado en el pool: construye la hélice y la guarda en la caché."""
+    # Importes diferidos: el proceso hijo solo carga NumPy y las plantillas al trabajar
+    from generate_b_dna import build_duplex, validate_duplex
+    from ordenar_pdb import iter_structure_pdb
+
+    try:
+        write_job_status(jobs_dir, job_id, status='running', stage='building')
+        structure = build_duplex(sequence, sigma, topology)
+        if validate:
+            write_job_status(jobs_dir, job_id, validation=validate_duplex(structure))
+        write_job_status(jobs_dir, job_id, stage='writing', n_atoms=len(structure['coords']))
+        cache = ResultCache(cache_dir, max_bytes=cache_max_bytes)
+        for _ in cache.store_stream(key, iter_structure_pdb(structure)):
+            pass
+    except Exception as e:
+        write_job_status(jobs_dir, job_id, status='failed', error=str(e))
+        return
+    write_job_status(jobs_dir, job_id, status='done', stage=None)
+
+
+class JobQueue:
+    """Pool de procesos para trabajos de generación, creado al primer uso."""
+
+    def __init__(self, jobs_dir: str, result_cache: ResultCache, max_workers: Optional[int] = None):
+        self.jobs_dir = jobs_dir
+        self.result_cache = result_cache
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    def _pool(self) -> ProcessPoolExecutor:
+        # multiprocessing se importa recién con el primer trabajo
+        from concurrent.futures import ProcessPoolExecutor
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def _discard_pool(self, executor: ProcessPoolExecutor) -> None:
+        """Descarta un pool roto; el próximo trabajo crea uno nuevo."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def _job_finished(self, job_id: str, executor: ProcessPoolExecutor, future: Future) -> None:
+        """Callback del pool: registra como failed los trabajos que no terminaron por sí mismos."""
+        from concurrent.futures.process import BrokenProcessPool
+
+        if future.cancelled():
+            write_job_status(self.jobs_dir, job_id, status='failed', error='Job cancelled')
+            return
+        error = future.exception()
+        if error is None:
+            return  # run_generation_job ya escribió done o failed
+        if isinstance(error, BrokenProcessPool):
+            self._discard_pool(executor)
+        write_job_status(self.jobs_dir, job_id, status='failed', error=str(error) or type(error).__name__)
+
+    def submit(self, key: str, sequence: str, sigma: float, topology: str, validate: bool = False) -> dict:
+        """Encola una generación y devuelve su estado inicial.
+
+        Si el resultado ya está en la caché, el trabajo nace terminado.
+        """
+        self.purge_expired()
+        job_id = uuid.uuid4().hex
+        fields = {'key': key, 'length': len(sequence), 'sigma': sigma, 'topology': topology,
+                  'created': time.time()}
+        cached_path = self.result_cache.disk_path(key)
+        if cached_path is not None:
+            if validate:
+                from generate_b_dna import validate_duplex
+                from pdb_reader import read_pdb
+                fields['validation'] = validate_duplex(read_pdb(cached_path))
+            return write_job_status(self.jobs_dir, job_id, status='done', stage=None, **fields)
+
+        from concurrent.futures.process import BrokenProcessPool
+
+        status = write_job_status(self.jobs_dir, job_id, status='queued', stage=None, **fields)
+        args = (run_generation_job, self.jobs_dir, job_id, self.result_cache.root,
+                self.result_cache.max_bytes, key, sequence, sigma, topology, validate)
+        executor = self._pool()
+        try:
+            future = executor.submit(*args)
+        except BrokenProcessPool:
+            # El pool se rompió antes de que llegara el callback: uno nuevo y un reintento
+            self._discard_pool(executor)
+            executor = self._pool()
+            future = executor.submit(*args)
+        future.add_done_callback(partial(self._job_finished, job_id, executor))
+        return status
+
+    def status(self, job_id: str) -> Optional[dict]:
+        """Estado de un trabajo; None si no existe o el ID no es válido."""
+        if not _JOB_ID_RE.fullmatch(job_id):
+            return None
+        return read_job_status(self.jobs_dir, job_id)
+
+    def purge_expired(self, ttl: float = JOB_TTL_SECONDS) -> None:
+        """Borra los JSON de estado de trabajos más viejos que ttl segundos."""
+        cutoff = time.time() - ttl
+        for entry in os.scandir(self.jobs_dir):
+            try:
+                if entry.name.endswith('.json') and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                continue
@@ -0,0 +1,107 @@
+"""
+Variantes de menor detalle (LOD) de una estructura para el visor 3Dmol.
+
+A partir de los mismos arrays por átomo (build_duplex, read_pdb o el registro
+de subidas) arma una estructura reducida con el mismo formato de dict, que se
+escribe con ordenar_pdb.iter_structure_pdb:
+
+    full       todos los átomos (sin cambios)
+    backbone   traza de fósforos: solo los átomos P
+    bead       una esfera por par de bases (centroide de los dos nucleótidos)
+    strand     una esfera por nucleótido (centroide del residuo)
+
+step > 1 conserva uno de cada step residuos (o pares) por cadena.
+Las esferas se llaman 'BP' (par de bases) o 'NT' (nucleótido), sin elemento.
+"""
+from __future__ import annotations
+from typing import Dict
+
+import numpy as np
+
+from structure_format import residue_starts
+
+LEVELS = ('full', 'backbone', 'bead', 'strand')
+MAX_STEP = 1000
+
+
+def _chain_residues(structure: Dict[str, np.ndarray]):
+    """(inicios de residuo, cadena de cada residuo) con los residuos en orden de archivo."""
+    starts = residue_starts(structure)
+    return starts, np.asarray(structure['chainID'])[starts[:-1]]
+
+
+def _every(indices: np.ndarray, step: int) -> np.ndarray:
+    return indices[::step]
+
+
+def _residue_centroids(structure: Dict[str, np.ndarray], starts: np.ndarray) -> np.ndarray:
+    coords = np.asarray(structure['coords'], dtype=float)
+    counts = np.diff(starts)[:, None]
+    return np.add.reduceat(coords, starts[:-1], axis=0) / counts
+
+
+def _beads(structure, residues, coords, name) -> Dict[str, np.ndarray]:
+    """Estructura de esferas: una por residuo de residues (índices de primer átomo)."""
+    return {
+        'coords': coords,
+        'name': np.full(len(residues), name),
+        'resName': np.asarray(structure['resName'])[residues],
+        'chainID': np.asarray(structure['chainID'])[residues],
+        'resSeq': np.asarray(structure['resSeq'])[residues],
+        'element': np.full(len(residues), ''),
+    }
+
+
+def backbone_trace(structure: Dict[str, np.ndarray], step: int = 1) -> Dict[str, np.ndarray]:
+    """Solo los átomos P, uno de cada step por cadena."""
+    is_p = np.asarray(structure['name']) == 'P'
+    chain_ids = np.asarray(structure['chainID'])
+    keep = []
+    for chain in dict.fromkeys(chain_ids[is_p].tolist()):
+        keep.append(_every(np.flatnonzero(is_p & (chain_ids == chain)), step))
+    keep = np.concatenate(keep) if keep else np.empty(0, dtype=int)
+    return {field: np.asarray(values)[keep] for field, values in structure.items() if field != 'residue_starts'}
+
+
+def nucleotide_beads(structure: Dict[str, np.ndarray], step: int = 1) -> Dict[str, np.ndarray]:
+    """Una esfera por nucleótido (centroide del residuo), uno de cada step por cadena."""
+    starts, chains = _chain_residues(structure)
+    centroids = _residue_centroids(structure, starts)
+    keep = np.concatenate([_every(np.flatnonzero(chains == chain), step)
+                           for chain in dict.fromkeys(chains.tolist())]) if len(chains) else np.empty(0, dtype=int)
+    return _beads(structure, starts[keep], centroids[keep], 'NT')
+
+
+def base_pair_beads(structure: Dict[str, np.ndarray], step: int = 1) -> Dict[str, np.ndarray]:
+    """Una esfera por par de bases, en el centro de los dos nucleótidos apareados.
+
+    Espera un dúplex: dos cadenas con la misma cantidad de residuos, la segunda
+    en sentido inverso (el residuo i de la primera se aparea con el n-1-i de la
+    segunda), como las que genera build_duplex.
+    """
+    starts, chains = _chain_residues(structure)
+    chain_order = list(dict.fromkeys(chains.tolist()))
+    if len(chain_order) != 2:
+        raise ValueError("Base-pair beads need a duplex with exactly two chains")
+    first = np.flatnonzero(chains == chain_order[0])
+    second = np.flatnonzero(chains == chain_order[1])[::-1]
+    if len(first) != len(second):
+        raise ValueError("Base-pair beads need two chains of equal length")
+    centroids = _residue_centroids(structure, starts)
+    first, second = _every(first, step), _every(second, step)
+    return _beads(structure, starts[first], (centroids[first] + centroids[second]) / 2, 'BP')
+
+
+def coarse_structure(structure: Dict[str, np.ndarray], level: str, step: int = 1) -> Dict[str, np.ndarray]:
+    """Variante de nivel level (ver LEVELS) de una estructura."""
+    if level not in LEVELS:
+        raise ValueError(f"Unknown level of detail: {level}")
+    if not 1 <= step <= MAX_STEP:
+        raise ValueError(f"step must be between 1 and {MAX_STEP}")
+    if level == 'full':
+        return structure
+    if level == 'backbone':
+        return backbone_trace(structure, step)
+    if level == 'bead':
+        return base_pair_beads(structure, step)
+    return nucleotide_beads(structure, step)
@@ -0,0 +1,174 @@
+"""
+Instrumentación por etapa para /generate: tiempos, memoria y métricas Prometheus.
+
+Cada request usa un RequestTimer:
+
+    timer = RequestTimer(length=len(sequence))
+    with timer.stage('build'):
+        ...
+    response.headers['Server-Timing'] = timer.server_timing()
+    timer.finish()          # vuelca las observaciones al registro global
+
+El registro (REGISTRY) guarda un histograma de duración por (etapa, rango de
+longitud), el pico de memoria por etapa y contadores de resultados, y se expone
+en formato de texto Prometheus con REGISTRY.render(). Los valores son por
+proceso: con varios workers de gunicorn, cada uno publica los suyos.
+
+El pico de memoria por etapa usa tracemalloc, que ralentiza el código medido;
+solo se activa con METRICS_TRACEMALLOC=1. Sin eso se reporta el RSS máximo.
+"""
+from __future__ import annotations
+import bisect
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LENGTH_BUCKETS = (100, 1000, 10000, 100000)
+TRACE_MEMORY = os.environ.get('METRICS_TRACEMALLOC') == '1'
+_trace_lock = threading.Lock()
+
+
+def length_bucket(length: int) -> str:
+    """Etiqueta del rango de longitud de secuencia: '<=100', ..., '>100000'."""
+    for limit in LENGTH_BUCKETS:
+        if length <= limit:
+            return f"<={limit}"
+    return f">{LENGTH_BUCKETS[-1]}"
+
+
+def max_rss_bytes() -> int:
+    """RSS máximo del proceso (ru_maxrss está en KiB en Linux y en bytes en macOS)."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+
+
+class MetricsRegistry:
+    """Histogramas de duración por etapa y contadores, seguros entre hilos."""
+
+    def __init__(self, prefix: str = 'dna_tools'):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._durations: Dict[Tuple[str, str], _Histogram] = {}
+        self._peak_memory: Dict[str, int] = {}
+        self._counters: Dict[Tuple[str, str], int] = {}
+
+    def observe(self, stage: str, length: int, seconds: float, peak_bytes: Optional[int] = None) -> None:
+        key = (stage, length_bucket(length))
+        with self._lock:
+            histogram = self._durations.get(key)
+            if histogram is None:
+                histogram = self._durations[key] = _Histogram(DURATION_BUCKETS)
+            histogram.observe(seconds)
+            if peak_bytes is not None:
+                self._peak_memory[stage] = max(self._peak_memory.get(stage, 0), peak_bytes)
+
+    def count(self, name: str, label: str) -> None:
+        with self._lock:
+            self._counters[(name, label)] = self._counters.get((name, label), 0) + 1
+
+    def render(self) -> str:
+        """Métricas en formato de texto de exposición Prometheus (0.0.4)."""
+        p = self.prefix
+        lines: List[str] = []
+        with self._lock:
+            lines += [f"# HELP {p}_stage_seconds Duration of each /generate stage.",
+                      f"# TYPE {p}_stage_seconds histogram"]
+            for (stage, bucket), histogram in sorted(self._durations.items()):
+                labels = f'stage="{stage}",length_bucket="{bucket}"'
+                cumulative = 0
+                for limit, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{p}_stage_seconds_bucket{{{labels},le="{limit}"}} {cumulative}')
+                cumulative += histogram.counts[-1]
+                lines.append(f'{p}_stage_seconds_bucket{{{labels},le="+Inf"}} {cumulative}')
+                lines.append(f'{p}_stage_seconds_sum{{{labels}}} {histogram.total:.6f}')
+                lines.append(f'{p}_stage_seconds_count{{{labels}}} {cumulative}')
+
+            lines += [f"# HELP {p}_stage_peak_memory_bytes Largest traced allocation peak per stage.",
+                      f"# TYPE {p}_stage_peak_memory_bytes gauge"]
+            for stage, peak in sorted(self._peak_memory.items()):
+                lines.append(f'{p}_stage_peak_memory_bytes{{stage="{stage}"}} {peak}')
+
+            names = sorted({name for name, _ in self._counters})
+            for name in names:
+                lines += [f"# TYPE {p}_{name}_total counter"]
+                for (counter, label), value in sorted(self._counters.items()):
+                    if counter == name:
+                        lines.append(f'{p}_{name}_total{{outcome="{label}"}} {value}')
+
+        lines += [f"# HELP {p}_process_max_rss_bytes Maximum resident set size of this process.",
+                  f"# TYPE {p}_process_max_rss_bytes gauge",
+                  f"{p}_process_max_rss_bytes {max_rss_bytes()}"]
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+class RequestTimer:
+    """Mide las etapas de un request y las publica en el registro al terminar."""
+
+    def __init__(self, length: int, registry: MetricsRegistry = REGISTRY, trace_memory: bool = TRACE_MEMORY):
+        self.length = length
+        self.registry = registry
+        self.trace_memory = trace_memory
+        self.stages: List[Tuple[str, float, Optional[int]]] = []
+        self._started = time.perf_counter()
+        self._finished = False
+
+    @contextmanager
+    def stage(self, name: str):
+        # tracemalloc es global al proceso: solo un request a la vez lo usa
+        tracing = self.trace_memory and _trace_lock.acquire(blocking=False)
+        if tracing and tracemalloc.is_tracing():
+            _trace_lock.release()
+            tracing = False
+        if tracing:
+            tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            peak = None
+            if tracing:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                _trace_lock.release()
+            self.stages.append((name, elapsed, peak))
+
+    def server_timing(self) -> str:
+        """Valor del encabezado Server-Timing con las etapas medidas hasta ahora (en ms)."""
+        parts = []
+        for name, seconds, peak in self.stages:
+            part = f"{name};dur={seconds * 1000:.2f}"
+            if peak is not None:
+                part += f';desc="peak {peak / 1e6:.1f}MB"'
+            parts.append(part)
+        return ", ".join(parts)
+
+    def finish(self) -> None:
+        """Publica las etapas y el total en el registro (una sola vez)."""
+        if self._finished:
+            return
+        self._finished = True
+        for name, seconds, peak in self.stages:
+            self.registry.observe(name, self.length, seconds, peak)
+        self.registry.observe('total', self.length, time.perf_counter() - self._started)
@@ -1,4 +1,15 @@
-import pandas as pd
+import numpy as np
+
+from pdb_reader import coords_fit_columns, format_coord_columns, hybrid36_encode, read_pdb
+
+# Formato %-style (más rápido que str.format); el nombre llega ya centrado a 4 columnas
+ATOM_FORMAT = "ATOM  %5d %4s %-3s %1s%4d    %8.3f%8.3f%8.3f  1.00  0.00          %2s  \n"
+# Igual, con serial y resSeq en hybrid-36 y las coordenadas ya formateadas, para los
+# bloques que pasan de 99,999 átomos, 9,999 residuos o el rango de %8.3f
+ATOM_FORMAT_TEXT = "ATOM  %5s %4s %-3s %1s%4s    %24s  1.00  0.00          %2s  \n"
+TER_FORMAT = "TER   {:>5s}      {:3s} {:1s}{:>4s}\n"
+MAX_DECIMAL_SERIAL = 99999
+RESSEQ_DECIMAL_RANGE = (-999, 9999)
 
 def parse_pdb_line(line):
     """Parses a PDB ATOM line into a dictionary."""
@@ -40,94 +51,93 @@ def format_pdb_line(record):
         record['charge']
     )
 
-def sort_pdb(input_pdb_file="ADN.pdb", output_pdb_file="ADN_ordenado.pdb"):
-    atom_records = []
-    with open(input_pdb_file, 'r') as infile:
-        for line in infile:
-            if line.startswith("ATOM"):
-                atom_records.append(parse_pdb_line(line))
+def format_ter_line(atom_number, residue_name, chain_id, residue_number):
+    """Formats a TER record closing a chain (hybrid-36 numbers past the decimal limits)."""
+    return TER_FORMAT.format(hybrid36_encode([atom_number], 5)[0], residue_name, chain_id,
+                             hybrid36_encode([residue_number], 4)[0])
 
-    df = pd.DataFrame(atom_records)
+def _fits_decimal_resseq(res_seqs):
+    """True if every residue number fits the 4-column decimal resSeq field."""
+    low, high = RESSEQ_DECIMAL_RANGE
+    return not len(res_seqs) or (res_seqs.min() >= low and res_seqs.max() <= high)
 
-    # Separar las cadenas
-    chain_a = df[df['chain_id'] == 'A'].copy()
-    chain_b = df[df['chain_id'] == 'B'].copy()
+def format_atom_lines(structure, start, end, first_serial):
+    """Returns the ATOM lines of atoms start..end-1, numbered from first_serial.
 
-    # Ordenar cada una por número de residuo
-    chain_a_sorted = chain_a.sort_values(by='residue_number')
-    chain_b_sorted = chain_b.sort_values(by='residue_number')
+    Each line depends only on its own atom, so a block can be formatted on its
+    own: the result is the same text iter_structure_pdb writes for those atoms.
+    """
+    serials = np.arange(first_serial, first_serial + end - start)
+    res_seqs = np.asarray(structure['resSeq'][start:end])
+    coords = structure['coords'][start:end]
+    names = np.char.center(np.asarray(structure['name'][start:end], dtype=str), 4).tolist()
+    columns = (structure['resName'][start:end].tolist(), structure['chainID'][start:end].tolist())
+    elements = structure['element'][start:end].tolist()
+    if serials[-1] <= MAX_DECIMAL_SERIAL and _fits_decimal_resseq(res_seqs) and coords_fit_columns(coords):
+        rows = zip(serials.tolist(), names, *columns, res_seqs.tolist(), coords.tolist(), elements)
+        return ''.join(
+            ATOM_FORMAT % (serial, name, res_name, chain, res_seq, xyz[0], xyz[1], xyz[2], element)
+            for serial, name, res_name, chain, res_seq, xyz, element in rows
+        )
+    rows = zip(hybrid36_encode(serials, 5).tolist(), names, *columns,
+               hybrid36_encode(res_seqs, 4).tolist(), format_coord_columns(coords), elements)
+    return ''.join(ATOM_FORMAT_TEXT % row for row in rows)
 
-    # Calcular el offset para la cadena B
-    max_resid_a = chain_a_sorted['residue_number'].max() if not chain_a_sorted.empty else 0
-    chain_b_sorted['residue_number'] += max_resid_a
-
-    # Renumerar los átomos
-    sorted_records = []
-    atom_counter = 1
-    for _, row in chain_a_sorted.iterrows():
-        row_dict = row.to_dict()
-        row_dict['atom_number'] = atom_counter
-        sorted_records.append(row_dict)
-        atom_counter += 1
-
-    # TER después de A
-    if not chain_a_sorted.empty:
-        sorted_records.append({
-            'record_type': 'TER',
-            'atom_number': atom_counter,
-            'atom_name': '',
-            'alt_loc': '',
-            'residue_name': chain_a_sorted.iloc[-1]['residue_name'],
-            'chain_id': 'A',
-            'residue_number': chain_a_sorted.iloc[-1]['residue_number'],
-            'insertion_code': '',
-            'x_coord': 0.0,
-            'y_coord': 0.0,
-            'z_coord': 0.0,
-            'occupancy': 1.00,
-            'temp_factor': 0.00,
-            'element_symbol': '',
-            'charge': ''
-        })
-        atom_counter += 1
-
-    for _, row in chain_b_sorted.iterrows():
-        row_dict = row.to_dict()
-        row_dict['atom_number'] = atom_counter
-        sorted_records.append(row_dict)
-        atom_counter += 1
-
-    # TER después de B
-    if not chain_b_sorted.empty:
-        sorted_records.append({
-            'record_type': 'TER',
-            'atom_number': atom_counter,
-            'atom_name': '',
-            'alt_loc': '',
-            'residue_name': chain_b_sorted.iloc[-1]['residue_name'],
-            'chain_id': 'B',
-            'residue_number': chain_b_sorted.iloc[-1]['residue_number'],
-            'insertion_code': '',
-            'x_coord': 0.0,
-            'y_coord': 0.0,
-            'z_coord': 0.0,
-            'occupancy': 1.00,
-            'temp_factor': 0.00,
-            'element_symbol': '',
-            'charge': ''
-        })
+def chain_ends(structure):
+    """Index one past the last atom of each chain (chains are contiguous runs of chainID)."""
+    chain_ids = np.asarray(structure['chainID'])
+    n_atoms = len(chain_ids)
+    return np.append(np.flatnonzero(chain_ids[1:] != chain_ids[:-1]) + 1, n_atoms) if n_atoms else []
+
+def iter_structure_pdb(structure, chunk_atoms=4096):
+    """Yields the PDB text of a structure in chunks of up to chunk_atoms lines.
+
+    The structure is a dict of per-atom arrays ('coords', 'name', 'resName',
+    'chainID', 'resSeq', 'element') already in final order, as returned by
+    generate_b_dna.build_duplex. A TER record closes each chain. Nothing is
+    re-sorted, so the output can be streamed straight into an HTTP response.
+    Chunks whose values no longer fit their columns (more than 99,999 atoms or
+    9,999 residues) are written with hybrid-36 numbers, and coordinates beyond
+    the %8.3f range with fewer decimals.
+    """
+    start = 0
+    for n_ters, end in enumerate(chain_ends(structure)):
+        for chunk_start in range(start, end, chunk_atoms):
+            chunk_end = min(chunk_start + chunk_atoms, end)
+            yield format_atom_lines(structure, chunk_start, chunk_end, chunk_start + 1 + n_ters)
+        last = end - 1
+        yield format_ter_line(end + 1 + n_ters, str(structure['resName'][last]),
+                              str(structure['chainID'][last]), int(structure['resSeq'][last]))
+        start = end
+
+def format_structure_pdb(structure):
+    """Returns the full PDB text of a structure (see iter_structure_pdb)."""
+    return ''.join(iter_structure_pdb(structure))
 
+def write_structure_pdb(structure, output_pdb_file):
+    """Writes a structure to output_pdb_file chunk by chunk."""
     with open(output_pdb_file, 'w') as outfile:
-        for record in sorted_records:
-            if record['record_type'] == "ATOM":
-                outfile.write(format_pdb_line(record))
-            elif record['record_type'] == "TER":
-                outfile.write("TER   {:5d}      {:3s} {:1s}{:4d}\n".format(
-                    record['atom_number'],
-                    record['residue_name'],
-                    record['chain_id'],
-                    record['residue_number']
-                ))
+        for chunk in iter_structure_pdb(structure):
+            outfile.write(chunk)
+
+def sort_pdb(input_pdb_file="ADN.pdb", output_pdb_file="ADN_ordenado.pdb"):
+    """Sorts each chain by residue number, renumbers atoms and offsets chain B residues."""
+    atoms = read_pdb(input_pdb_file, records=('ATOM',))
+
+    # Ordenar cada cadena por número de residuo (estable: conserva el orden de átomos)
+    chain_a = np.flatnonzero(atoms['chainID'] == 'A')
+    chain_b = np.flatnonzero(atoms['chainID'] == 'B')
+    chain_a = chain_a[np.argsort(atoms['resSeq'][chain_a], kind='stable')]
+    chain_b = chain_b[np.argsort(atoms['resSeq'][chain_b], kind='stable')]
+    order = np.concatenate([chain_a, chain_b])
+
+    structure = {key: atoms[key][order] for key in ('coords', 'name', 'resName', 'chainID', 'resSeq', 'element')}
+
+    # Calcular el offset para la cadena B
+    max_resid_a = atoms['resSeq'][chain_a[-1]] if chain_a.size else 0
+    structure['resSeq'][len(chain_a):] += max_resid_a
+
+    write_structure_pdb(structure, output_pdb_file)
 
 if __name__ == "__main__":
     sort_pdb()
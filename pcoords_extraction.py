@@ -1,21 +1,77 @@
 """
-Utilidad para extraer coordenadas de átomos de Fósforo (P) desde un PDB,
-partirlas en dos mitades (A y B) y guardarlas en un JSON junto al archivo.
+Extracción de coordenadas de átomos de Fósforo (P) de un PDB y su análisis.
 
-No realiza ningún cálculo adicional con las coordenadas.
+Las coordenadas P se parten en dos mitades (A y B, una por hebra); de A se
+calculan radio de giro y CM y, en PDB multi-modelo, la serie r/CM por cuadro.
+El análisis se guarda como "<base>_P_coords.npz" junto al PDB, con el SHA-256
+del contenido para saber a qué versión del archivo corresponde.
 
-Uso CLI:
+Las subidas se procesan por chunks con PCoordStreamParser, mientras se escriben
+a disco, sin cargar el archivo entero; analyze_pcoords y
+extract_and_store_pcoord_analysis hacen lo mismo sobre un PDB ya en memoria o
+en disco. extract_and_store_pcoord_sets conserva la salida JSON original (solo
+A y B, sin cálculos).
+
+Uso CLI (salida JSON):
     python pcoords_extraction.py ruta/al/archivo.pdb
 
-Integración Flask (ver al final del archivo):
-    from utils.pcoords_extraction import extract_and_store_pcoord_sets
-    out_json = extract_and_store_pcoord_sets(pdb_path)
+Integración Flask (ver app.upload):
+    parser = PCoordStreamParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+    analysis = parser.finish()
+    save_pcoord_analysis(pcoord_analysis_path(pdb_path), analysis)
 """
 from __future__ import annotations
 import os
 import json
-import re
-from typing import List, Tuple
+import hashlib
+import tempfile
+from typing import List, Tuple, Union
+
+import numpy as np
+
+from pdb_reader import read_pdb, infer_elements
+from radius_of_gyration import calc_radius_of_gyration_and_cm_from_A, calc_radius_of_gyration_and_cm_series
+
+
+def _p_atoms(source: Union[str, bytes]) -> Tuple[np.ndarray, np.ndarray]:
+    """Coordenadas (n, 3) e índice de modelo (n,) de cada átomo P."""
+    atoms = read_pdb(source, records=('ATOM', 'HETATM'), elements=('P',))
+    is_p = (infer_elements(atoms) == 'P') | (atoms['name'] == 'P')
+    return atoms['coords'][is_p], atoms['model'][is_p]
+
+
+def get_p_coords_array(source: Union[str, bytes]) -> np.ndarray:
+    """Como get_p_coords_from_pdb, pero acepta ruta o bytes y devuelve un array (n, 3)."""
+    return _p_atoms(source)[0]
+
+
+def group_frames(coords: np.ndarray, models: np.ndarray) -> np.ndarray:
+    """Agrupa coordenadas por modelo (MODEL/ENDMDL) en un array (n_frames, n_P, 3).
+
+    Un PDB sin registros MODEL es un único cuadro. Lanza ValueError si los
+    cuadros no tienen la misma cantidad de átomos P.
+    """
+    if len(coords) == 0:
+        return np.empty((0, 0, 3))
+    _, counts = np.unique(models, return_counts=True)
+    if not np.all(counts == counts[0]):
+        raise ValueError("Frames have different numbers of P atoms")
+    order = np.argsort(models, kind='stable')
+    return coords[order].reshape(len(counts), counts[0], 3)
+
+
+def get_p_frames(source: Union[str, bytes]) -> np.ndarray:
+    """Coordenadas P por cuadro de un PDB multi-modelo: array (n_frames, n_P, 3)."""
+    return group_frames(*_p_atoms(source))
+
+
+def split_even_frames(frames: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """split_even_coords aplicado a cada cuadro de un array (n_frames, n, 3)."""
+    n = frames.shape[1] - frames.shape[1] % 2
+    mid = n // 2
+    return frames[:, :mid], frames[:, mid:n]
 
 
 def get_p_coords_from_pdb(pdb_path: str) -> List[List[float]]:
@@ -28,29 +84,7 @@ def get_p_coords_from_pdb(pdb_path: str) -> List[List[float]]:
     - Considera P cuando element == 'P' o atom name == 'P'.
     - Ignora líneas mal formateadas.
     """
-    coords: List[List[float]] = []
-    with open(pdb_path, 'r', encoding='utf-8', errors='ignore') as f:
-        for line in f:
-            if not (line.startswith('ATOM') or line.startswith('HETATM')):
-                continue
-            # Aseguramos longitud para cortes por columnas
-            if len(line) < 54:
-                continue
-            name = line[12:16].strip()
-            element = line[76:78].strip() if len(line) >= 78 else ''
-            if not element:
-                # Fallback: primer carácter alfabético de name
-                name_alpha = re.sub(r'[^A-Za-z]', '', name)
-                element = name_alpha[:1].upper() if name_alpha else ''
-            if element == 'P' or name == 'P':
-                try:
-                    x = float(line[30:38])
-                    y = float(line[38:46])
-                    z = float(line[46:54])
-                except ValueError:
-                    continue
-                coords.append([x, y, z])
-    return coords
+    return get_p_coords_array(pdb_path).tolist()
 
 
 essential_msg = (
@@ -96,7 +130,8 @@ def save_pcoord_sets_json(base_path_no_ext: str, A: List[List[float]], B: List[L
 def extract_and_store_pcoord_sets(pdb_path: str) -> str:
     """Extrae coordenadas P de un PDB, las divide en A/B y las guarda en JSON.
 
-    Devuelve la ruta del JSON generado.
+    Lee el archivo entero y no calcula nada; la app usa el análisis .npz
+    (PCoordStreamParser, extract_and_store_pcoord_analysis). Devuelve la ruta del JSON.
     """
     coords = get_p_coords_from_pdb(pdb_path)
     A, B = split_even_coords(coords)
@@ -105,6 +140,188 @@ def extract_and_store_pcoord_sets(pdb_path: str) -> str:
     return out_json
 
 
+def pcoord_analysis_path(pdb_path: str) -> str:
+    """Ruta del análisis binario "<base>_P_coords.npz" asociado a un PDB."""
+    base_no_ext, _ = os.path.splitext(pdb_path)
+    return base_no_ext + "_P_coords.npz"
+
+
+def _pcoord_analysis(coords: np.ndarray, models: np.ndarray, content_hash: str) -> dict:
+    """Análisis de P: A y B del primer cuadro con su r y CM, más la serie r/CM por cuadro.
+
+    Si los modelos no tienen la misma cantidad de P, no hay serie: se analiza solo
+    el primero y consistent_frames queda en False.
+    """
+    consistent = True
+    try:
+        frames = group_frames(coords, models)
+    except ValueError:
+        consistent = False
+        first = coords[models == models.min()]
+        frames = first[None]
+    frames_A, frames_B = split_even_frames(frames)
+    series_r, series_CM = calc_radius_of_gyration_and_cm_series(frames_A)
+
+    A = frames_A[0] if len(frames_A) else np.empty((0, 3))
+    B = frames_B[0] if len(frames_B) else np.empty((0, 3))
+    r, CM = calc_radius_of_gyration_and_cm_from_A(A)
+    return {
+        'hash': content_hash,
+        'A': A,
+        'B': B,
+        'r': r,
+        'CM': CM,
+        'n_total': len(A) + len(B),
+        'n_frames': len(frames),
+        'series_r': series_r,
+        'series_CM': series_CM,
+        'consistent_frames': consistent,
+    }
+
+
+def analyze_pcoords(data: bytes) -> dict:
+    """Extrae P, divide en A/B y calcula radio de giro y CM de A, en una sola pasada.
+
+    data: contenido del PDB. Devuelve un dict con 'hash' (SHA-256 del contenido),
+    'A', 'B' (arrays (n, 3) del primer cuadro), 'r', 'CM', 'n_total', y para
+    trayectorias multi-modelo 'n_frames', 'series_r' (n_frames,) y 'series_CM' (n_frames, 3).
+    'consistent_frames' es False si los modelos tienen distinta cantidad de P.
+    """
+    return _pcoord_analysis(*_p_atoms(data), hashlib.sha256(data).hexdigest())
+
+
+# Registros PDB reconocidos al validar el comienzo de un archivo subido; los
+# demás (USER, EXPDTA de otros programas, ...) se saltean
+PDB_HEADER_SCAN_BYTES = 1024 * 1024  # sin registros reconocidos hasta acá: no es un PDB
+PDB_RECORDS = {
+    'HEADER', 'TITLE', 'COMPND', 'SOURCE', 'KEYWDS', 'EXPDTA', 'AUTHOR', 'REVDAT',
+    'JRNL', 'REMARK', 'CAVEAT', 'OBSLTE', 'SPRSDE', 'SPLIT', 'NUMMDL', 'MDLTYP',
+    'DBREF', 'DBREF1', 'DBREF2', 'SEQADV', 'SEQRES', 'MODRES', 'HET', 'HETNAM',
+    'HETSYN', 'FORMUL', 'HELIX', 'SHEET', 'SSBOND', 'LINK', 'CISPEP', 'SITE',
+    'CRYST1', 'ORIGX1', 'ORIGX2', 'ORIGX3', 'SCALE1', 'SCALE2', 'SCALE3',
+    'MTRIX1', 'MTRIX2', 'MTRIX3', 'MODEL', 'ATOM', 'ANISOU', 'HETATM', 'TER',
+    'ENDMDL', 'CONECT', 'MASTER', 'END',
+}
+
+
+class PCoordStreamParser:
+    """Extrae coordenadas P de un PDB que llega por partes (p. ej. el cuerpo de una subida).
+
+    feed() recibe cada chunk, parsea solo las líneas completas (con el lector
+    columnar) y guarda el resto para el siguiente; también actualiza el hash.
+    Rechaza pronto contenido que no parece PDB: binario, o sin ningún registro
+    reconocido en los primeros PDB_HEADER_SCAN_BYTES (los desconocidos se saltean).
+    """
+
+    def __init__(self):
+        self._digest = hashlib.sha256()
+        self._pending = b''
+        self._checked = False
+        self._coords: List[np.ndarray] = []
+        self._models: List[np.ndarray] = []
+        self._models_seen = 0
+        self.size = 0
+
+    def _check_header(self, data: bytes) -> None:
+        if b'\x00' in data:
+            raise ValueError("Not a PDB file (binary content)")
+        for line in data.splitlines():
+            if line[:6].decode('ascii', errors='replace').strip() in PDB_RECORDS:
+                self._checked = True
+                return
+        if self.size > PDB_HEADER_SCAN_BYTES:
+            raise ValueError("Not a PDB file (no PDB records found)")
+
+    def feed(self, chunk: bytes) -> None:
+        self._digest.update(chunk)
+        self.size += len(chunk)
+        data = self._pending + chunk
+        cut = data.rfind(b'\n') + 1
+        lines, self._pending = data[:cut], data[cut:]
+        if not self._checked:
+            self._check_header(lines or data)
+        if lines:
+            self._parse(lines)
+
+    def _parse(self, lines: bytes) -> None:
+        # Los índices de modelo del lector son locales al chunk: se desplazan
+        # por los registros MODEL de los chunks anteriores
+        coords, models = _p_atoms(lines)
+        self._coords.append(coords)
+        self._models.append(models + self._models_seen)
+        self._models_seen += lines.startswith(b'MODEL') + lines.count(b'\nMODEL')
+
+    def finish(self) -> dict:
+        """Procesa la última línea sin salto y devuelve el análisis (ver analyze_pcoords)."""
+        if not self._checked:
+            self._check_header(self._pending)
+            if not self._checked:
+                raise ValueError("Not a PDB file (no PDB records found)")
+        if self._pending:
+            self._parse(self._pending)
+            self._pending = b''
+        coords = np.concatenate(self._coords) if self._coords else np.empty((0, 3))
+        models = np.concatenate(self._models) if self._models else np.empty(0, dtype=int)
+        return _pcoord_analysis(coords, models, self._digest.hexdigest())
+
+
+def save_pcoord_analysis(out_path: str, analysis: dict) -> str:
+    """Guarda el análisis en formato .npz (binario, sin indentación ni parseo de texto).
+
+    Escribe a un temporal y lo renombra: otro worker puede estar leyendo el anterior.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(out_path)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            np.savez(
+                out, hash=np.array(analysis['hash']), A=analysis['A'], B=analysis['B'],
+                r=np.array(analysis['r']), CM=np.array(analysis['CM']),
+                series_r=analysis['series_r'], series_CM=analysis['series_CM'],
+                consistent_frames=np.array(analysis['consistent_frames']),
+            )
+        os.replace(tmp_path, out_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return out_path
+
+
+def load_pcoord_analysis(path: str) -> dict:
+    """Lee un análisis guardado con save_pcoord_analysis."""
+    with np.load(path) as data:
+        A, B = data['A'], data['B']
+        if 'series_r' in data:
+            series_r, series_CM = data['series_r'], data['series_CM']
+        else:
+            series_r, series_CM = calc_radius_of_gyration_and_cm_series(A[None])
+        return {
+            'hash': str(data['hash']),
+            'A': A,
+            'B': B,
+            'r': float(data['r']),
+            'CM': data['CM'].tolist(),
+            'n_total': len(A) + len(B),
+            'n_frames': len(series_r),
+            'series_r': series_r,
+            'series_CM': series_CM,
+            'consistent_frames': bool(data['consistent_frames']) if 'consistent_frames' in data else True,
+        }
+
+
+def extract_and_store_pcoord_analysis(pdb_path: str, data: bytes = None) -> Tuple[str, dict]:
+    """Analiza un PDB (ya en memoria si se pasa data) y guarda el resultado en .npz.
+
+    Lee el archivo entero; para subidas que llegan por partes, usar PCoordStreamParser.
+    Devuelve (ruta del .npz, análisis, ver analyze_pcoords).
+    """
+    if data is None:
+        with open(pdb_path, 'rb') as f:
+            data = f.read()
+    analysis = analyze_pcoords(data)
+    out_path = save_pcoord_analysis(pcoord_analysis_path(pdb_path), analysis)
+    return out_path, analysis
+
+
 # =============================
 # Uso por línea de comando (opcional)
 # =============================
@@ -117,11 +334,3 @@ if __name__ == '__main__':
     out = extract_and_store_pcoord_sets(pdb_path_cli)
     print(f"Guardado: {out}")
 
-
-# =============================
-# INTEGRACIÓN FLASK (ejemplo)
-# =============================
-# Dentro de tu vista que maneja la subida de PDB (después de guardar el archivo):
-# from utils.pcoords_extraction import extract_and_store_pcoord_sets
-# out_json = extract_and_store_pcoord_sets(pdb_path)
-# app.logger.info(f"P coords guardadas en {out_json}")
@@ -0,0 +1,424 @@
+"""
+Lector columnar de PDB compartido por todos los módulos.
+
+Carga los registros ATOM/HETATM de un PDB en arrays NumPy por columna, sin
+construir un dict por línea: el archivo se lee en bloques de CHUNK_BYTES, en
+cada bloque se eligen primero las líneas del registro pedido y se copian a una
+matriz uint8 de ancho fijo (un reshape para las tiradas de líneas del mismo
+ancho), y cada campo se convierte desde sus columnas de bytes.
+
+Uso:
+    from pdb_reader import read_pdb
+    atoms = read_pdb('ADN.pdb')
+    atoms['coords']      # (N, 3) float
+    atoms['name']        # (N,) str, p. ej. 'P', "O3'"
+    atoms['chainID'], atoms['resSeq'], atoms['resName'], atoms['element']
+
+Los campos serial (5 columnas) y resSeq (4 columnas) admiten la codificación
+hybrid-36 que usan PyMOL, cctbx y VMD para pasar de 99,999 átomos y 9,999
+residuos: hybrid36_encode/hybrid36_decode convierten columnas enteras. Las
+coordenadas que no entran en 8.3f (círculos grandes) se escriben con menos
+decimales para conservar las columnas (format_coord_columns).
+"""
+from __future__ import annotations
+import re
+from typing import Dict, Iterable, Iterator, Optional, Union
+
+import numpy as np
+
+LINE_WIDTH = 80
+MIN_ATOM_LINE = 54  # hasta el final de la coordenada z
+CHUNK_BYTES = 1024 * 1024  # bloque de lectura y parseo
+MIN_RUN_LINES = 8  # tiradas más cortas se copian línea por línea
+
+# (inicio, fin) de cada campo de texto en el formato PDB
+_TEXT_FIELDS = {
+    'record': (0, 6),
+    'name': (12, 16),
+    'altLoc': (16, 17),
+    'resName': (17, 20),
+    'chainID': (21, 22),
+    'element': (76, 78),
+}
+_INT_FIELDS = {
+    'serial': (6, 11),
+    'resSeq': (22, 26),
+}
+_COORD_FIELDS = ((30, 38), (38, 46), (46, 54))
+COORD_DECIMAL_RANGE = (-999.9995, 9999.9995)  # lo que entra en %8.3f
+
+
+def _column(rows: np.ndarray, start: int, end: int) -> np.ndarray:
+    """Corta las columnas [start, end) de la matriz de bytes como array 'S'."""
+    return np.ascontiguousarray(rows[:, start:end]).view(f'S{end - start}').ravel()
+
+
+def _to_numbers(column: np.ndarray, dtype, fill) -> np.ndarray:
+    """Convierte una columna de bytes a números; los campos inválidos quedan en fill."""
+    try:
+        return column.astype(dtype)
+    except ValueError:
+        out = np.full(column.shape, fill, dtype=dtype)
+        for i, value in enumerate(column):
+            try:
+                out[i] = dtype(value)
+            except ValueError:
+                pass
+        return out
+
+
+def _hybrid36_limits(width: int):
+    """(tope decimal, tamaño de cada bloque base 36, desplazamiento de 'A00..0')."""
+    return 10 ** width, 26 * 36 ** (width - 1), 10 * 36 ** (width - 1)
+
+
+def hybrid36_bytes(values, width: int) -> np.ndarray:
+    """Codifica enteros en hybrid-36 como bytes ASCII (n, width), sin pasar por strings.
+
+    Mismo resultado que hybrid36_encode, para escribir las columnas directo en
+    un buffer de líneas PDB.
+    """
+    values = np.asarray(values, dtype=np.int64).reshape(-1)
+    decimal_max, block, offset = _hybrid36_limits(width)
+    if values.size and values.min() <= -10 ** (width - 1):
+        raise ValueError(f"Value too small for a {width}-column PDB field")
+    if values.size and values.max() >= decimal_max + 2 * block:
+        raise ValueError(f"Value too large for a {width}-column PDB field")
+
+    out = np.full((values.size, width), ord(' '), dtype=np.uint8)
+    decimal = values < decimal_max
+    if decimal.any():
+        absolute = np.abs(values[decimal])
+        powers = 10 ** np.arange(width - 1, -1, -1)
+        significant = (absolute[:, None] >= powers) | (powers == 1)
+        rows = np.where(significant, (absolute[:, None] // powers) % 10 + ord('0'), ord(' ')).astype(np.uint8)
+        negative = np.flatnonzero(values[decimal] < 0)
+        rows[negative, width - 1 - significant[negative].sum(axis=1)] = ord('-')
+        out[decimal] = rows
+    extended = ~decimal
+    if extended.any():
+        lower = values[extended] >= decimal_max + block
+        n = values[extended] - decimal_max + offset - lower * block
+        digits = np.empty((n.size, width), dtype=np.int64)
+        for column in range(width - 1, -1, -1):
+            n, digits[:, column] = np.divmod(n, 36)
+        alphabet = np.frombuffer(b'0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ', dtype=np.uint8)
+        chars = alphabet[digits]
+        chars[lower] |= np.where(chars[lower] >= ord('A'), 0x20, 0).astype(np.uint8)  # minúsculas
+        out[extended] = chars
+    return out
+
+
+def hybrid36_encode(values, width: int) -> np.ndarray:
+    """Codifica enteros en hybrid-36 de ancho width (decimal mientras entren).
+
+    Hasta 10**width - 1 se escribe en decimal; después siguen los bloques
+    'A000'..'ZZZZ' y 'a000'..'zzzz'. Devuelve un array str alineado a la derecha.
+    """
+    return np.ascontiguousarray(hybrid36_bytes(values, width)).view(f'S{width}').ravel().astype(f'U{width}')
+
+
+def coords_fit_columns(coords: np.ndarray) -> bool:
+    """True si todas las coordenadas entran en el formato %8.3f."""
+    low, high = COORD_DECIMAL_RANGE
+    return not len(coords) or (coords.min() > low and coords.max() < high)
+
+
+def _coord_text(value: float, decimals: int) -> str:
+    for decimals in range(decimals, -1, -1):
+        text = '%8.*f' % (decimals, value)
+        if len(text) == 8:
+            return text
+    raise ValueError(f"Coordinate {value} too large for an 8-column PDB field")
+
+
+def format_coord_columns(coords: np.ndarray) -> list:
+    """Columnas x, y, z (24 caracteres por átomo) con 3 decimales, o menos si no entran."""
+    coords = np.asarray(coords, dtype=float)
+    axes = []
+    for values in coords.T:
+        # Decimales que caben en 8 columnas según los dígitos enteros y el signo
+        digits = np.floor(np.log10(np.maximum(np.abs(values), 1))) + 1
+        decimals = np.clip(7 - digits - (values < 0), 0, 3).astype(int)
+        texts = ['%8.*f' % pair for pair in zip(decimals.tolist(), values.tolist())]
+        for i in np.flatnonzero(np.char.str_len(texts) != 8):  # redondeos en el borde (9999.9996)
+            texts[i] = _coord_text(values[i], int(decimals[i]))
+        axes.append(texts)
+    return [x + y + z for x, y, z in zip(*axes)]
+
+
+def hybrid36_decode(column: np.ndarray, width: int) -> np.ndarray:
+    """Decodifica una columna de bytes de ancho width (decimal o hybrid-36); inválidos quedan en 0."""
+    out = np.zeros(column.shape, dtype=int)
+    stripped = np.char.strip(column)
+    decimal = np.char.isdigit(np.char.lstrip(stripped, b'-'))
+    if decimal.any():
+        out[decimal] = stripped[decimal].astype(int)
+    chars = np.ascontiguousarray(column.astype(f'S{width}')).view(np.uint8).reshape(-1, width)
+    is_upper = (chars >= ord('A')) & (chars <= ord('Z'))
+    is_lower = (chars >= ord('a')) & (chars <= ord('z'))
+    is_digit = (chars >= ord('0')) & (chars <= ord('9'))
+    extended = ~decimal & (is_upper | is_lower | is_digit).all(axis=1) & (is_upper[:, 0] | is_lower[:, 0])
+    extended &= ~(is_upper & is_lower[:, :1]).any(axis=1) & ~(is_lower & is_upper[:, :1]).any(axis=1)
+    if extended.any():
+        rows = chars[extended].astype(np.int64)
+        digits = np.where(rows <= ord('9'), rows - ord('0'), (rows | 0x20) - ord('a') + 10)
+        n = digits @ (36 ** np.arange(width - 1, -1, -1, dtype=np.int64))
+        decimal_max, block, offset = _hybrid36_limits(width)
+        out[extended] = n - offset + decimal_max + is_lower[extended, 0] * block
+    return out
+
+
+def _line_bounds(buf: np.ndarray):
+    """Devuelve (inicios, longitudes, pasos) de cada línea del buffer.
+
+    longitudes no incluye el salto de línea; paso es la distancia al inicio de la
+    línea siguiente (con el salto de línea y el '\\r' de los finales Windows).
+    """
+    ends = np.flatnonzero(buf == ord('\n'))
+    if ends.size == 0 or ends[-1] != buf.size - 1:
+        ends = np.append(ends, buf.size)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    lengths = ends - starts
+    has_cr = (lengths > 0) & (buf[np.maximum(ends - 1, 0)] == ord('\r'))
+    return starts, lengths - has_cr, np.minimum(ends + 1, buf.size) - starts
+
+
+def _line_heads(buf: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """Primeros 8 bytes de cada línea como uint64, para comparar registros de una vez."""
+    heads = np.empty((len(starts), 8), dtype=np.uint8)
+    for k in range(8):
+        heads[:, k] = buf[np.minimum(starts + k, buf.size - 1)]
+    return heads.view(np.uint64).ravel()
+
+
+def _starts_with(heads: np.ndarray, lengths: np.ndarray, prefix: bytes) -> np.ndarray:
+    """True para las líneas que comienzan con prefix (hasta 8 bytes)."""
+    mask = np.frombuffer(b'\xff' * len(prefix) + b'\0' * (8 - len(prefix)), dtype=np.uint64)[0]
+    value = np.frombuffer(prefix.ljust(8, b'\0'), dtype=np.uint64)[0]
+    return (lengths >= len(prefix)) & ((heads & mask) == value)
+
+
+def _rows(buf: np.ndarray, starts: np.ndarray, lengths: np.ndarray, steps: np.ndarray) -> np.ndarray:
+    """Matriz (n, LINE_WIDTH) uint8 con las líneas indicadas, rellenadas con espacios.
+
+    Las tiradas de líneas consecutivas del mismo ancho (el caso normal: ATOM de
+    80 columnas seguidos) se copian como un reshape del buffer; solo las líneas
+    sueltas de ancho irregular se juntan con un índice por columna.
+    """
+    rows = np.full((len(starts), LINE_WIDTH), ord(' '), dtype=np.uint8)
+    if not len(starts):
+        return rows
+    breaks = np.flatnonzero((starts[1:] != starts[:-1] + steps[:-1]) | (steps[1:] != steps[:-1])
+                            | (lengths[1:] != lengths[:-1])) + 1
+    bounds = np.concatenate(([0], breaks, [len(starts)]))
+    scattered = np.ones(len(starts), dtype=bool)
+    for run in np.flatnonzero(np.diff(bounds) >= MIN_RUN_LINES):
+        lo, hi = int(bounds[run]), int(bounds[run + 1])
+        first, step, width = int(starts[lo]), int(steps[lo]), min(int(lengths[lo]), LINE_WIDTH)
+        if first + (hi - lo) * step <= buf.size:
+            rows[lo:hi, :width] = buf[first:first + (hi - lo) * step].reshape(hi - lo, step)[:, :width]
+            scattered[lo:hi] = False
+    lines = np.flatnonzero(scattered)
+    for column in range(LINE_WIDTH if len(lines) else 0):
+        inside = lines[lengths[lines] > column]
+        rows[inside, column] = buf[starts[inside] + column]
+    return rows
+
+
+def _fixed_point(chars: np.ndarray):
+    """Parsea números de ancho fijo ('  -12.345') columna a columna, en uint8.
+
+    Devuelve (mantisa entera, decimales, negativo, con punto, ok). ok es False
+    para los campos que no son espacios + signo opcional + dígitos con a lo sumo
+    un punto + espacios; esos se convierten aparte (exponentes, basura, vacíos).
+    """
+    n = len(chars)
+    mantissa = np.zeros(n, dtype=np.int64)
+    decimals = np.zeros(n, dtype=np.int64)
+    negative, has_dot, has_digit = np.zeros(n, bool), np.zeros(n, bool), np.zeros(n, bool)
+    started, ended, ok = np.zeros(n, bool), np.zeros(n, bool), np.ones(n, bool)
+    for column in np.ascontiguousarray(chars.T):
+        space = column == ord(' ')
+        digit = (column - ord('0')) < 10  # uint8: lo menor que '0' da la vuelta
+        dot = column == ord('.')
+        minus = column == ord('-')
+        sign = minus | (column == ord('+'))
+        ok &= (space | digit | dot | (sign & ~started)) & ~(ended & ~space) & ~(dot & has_dot)
+        ended |= started & space
+        started |= ~space
+        mantissa = np.where(digit, mantissa * 10 + (column - ord('0')), mantissa)
+        decimals += digit & has_dot
+        has_dot |= dot
+        negative |= minus
+        has_digit |= digit
+    return mantissa, decimals, negative, has_dot, ok & has_digit
+
+
+def _float_column(chars: np.ndarray) -> np.ndarray:
+    """Columna de números decimales; los campos inválidos quedan en NaN.
+
+    mantisa / 10**decimales es la división redondeada de dos valores exactos, así
+    que da el mismo float que parsear el texto.
+    """
+    mantissa, decimals, negative, _, ok = _fixed_point(chars)
+    values = mantissa / 10.0 ** decimals
+    values = np.where(negative, -values, values)
+    if not ok.all():
+        bad = np.flatnonzero(~ok)
+        values[bad] = _to_numbers(_column(chars[bad], 0, chars.shape[1]), float, np.nan)
+    return values
+
+
+def _int_column(chars: np.ndarray) -> np.ndarray:
+    """Columna de enteros decimales o hybrid-36 (ver hybrid36_decode)."""
+    mantissa, _, negative, has_dot, ok = _fixed_point(chars)
+    ok &= ~has_dot
+    values = np.where(negative, -mantissa, mantissa)
+    if not ok.all():
+        bad = np.flatnonzero(~ok)
+        values[bad] = hybrid36_decode(_column(chars[bad], 0, chars.shape[1]), chars.shape[1])
+    return values
+
+
+def _text_column(chars: np.ndarray) -> np.ndarray:
+    """Columna de texto sin espacios. Los campos tienen pocos valores distintos:
+    se recortan y convierten a str solo los de la tabla de valores únicos."""
+    n, width = chars.shape
+    keys = np.zeros((n, 8), dtype=np.uint8)
+    keys[:, :width] = chars
+    table, inverse = np.unique(keys.view(np.uint64).ravel(), return_inverse=True)
+    labels = np.char.strip(table.view('S8')).astype(f'U{width}')
+    return labels[inverse.reshape(-1)]
+
+
+def _parse_chunk(buf: np.ndarray, records: Iterable[str], dtype, elements=None):
+    """Átomos de un bloque de líneas completas (ver read_pdb) y cantidad de registros MODEL
+    del bloque; 'model' cuenta desde 0 en el bloque."""
+    starts, lengths, steps = _line_bounds(buf)
+    # Primero se eligen las líneas por su registro; igual que los parsers previos,
+    # se ignoran las demasiado cortas
+    heads = _line_heads(buf, starts)
+    matches = np.zeros(len(starts), dtype=bool)
+    for record in records:
+        matches |= _starts_with(heads, lengths, record.encode('ascii')[:8])
+    selected = np.flatnonzero(matches & (lengths >= MIN_ATOM_LINE))
+    # Índice de modelo: cantidad de registros MODEL vistos antes de cada línea
+    models = np.cumsum(_starts_with(heads, lengths, b'MODEL'))
+    model = models[selected]
+    rows = _rows(buf, starts[selected], lengths[selected], steps[selected])
+    atoms = {}
+    if elements is not None:
+        # Filtro por elemento antes de convertir el resto de los campos
+        atoms['name'] = _text_column(rows[:, slice(*_TEXT_FIELDS['name'])])
+        atoms['element'] = _text_column(rows[:, slice(*_TEXT_FIELDS['element'])])
+        keep = np.isin(infer_elements(atoms), elements) | np.isin(atoms['name'], elements)
+        if not keep.all():
+            rows, model = rows[keep], model[keep]
+            atoms = {field: values[keep] for field, values in atoms.items()}
+
+    coords = np.empty((len(rows), 3), dtype=dtype)
+    for axis, (start, end) in enumerate(_COORD_FIELDS):
+        coords[:, axis] = _float_column(rows[:, start:end])
+    valid = ~np.isnan(coords).any(axis=1)
+    if not valid.all():
+        rows, coords, model = rows[valid], coords[valid], model[valid]
+        atoms = {field: values[valid] for field, values in atoms.items()}
+
+    atoms.update({'coords': coords, 'model': model})
+    for field, (start, end) in _TEXT_FIELDS.items():
+        if field not in atoms:
+            atoms[field] = _text_column(rows[:, start:end])
+    for field, (start, end) in _INT_FIELDS.items():
+        atoms[field] = _int_column(rows[:, start:end])
+    atoms = {key: atoms[key] for key in ('coords', 'model', *_TEXT_FIELDS, *_INT_FIELDS)}
+    return atoms, int(models[-1]) if len(models) else 0
+
+
+def _iter_line_blocks(source: Union[str, bytes], chunk_bytes: int) -> Iterator[np.ndarray]:
+    """Bloques de hasta ~chunk_bytes que terminan en un salto de línea, como arrays uint8."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        data = bytes(source) if isinstance(source, memoryview) else source
+        position = 0
+        while position < len(data):
+            cut = data.rfind(b'\n', position, position + chunk_bytes) + 1
+            if cut <= position or position + chunk_bytes >= len(data):
+                cut = data.find(b'\n', position + chunk_bytes) + 1 or len(data)
+            yield np.frombuffer(data, dtype=np.uint8, count=cut - position, offset=position)
+            position = cut
+        return
+    with open(source, 'rb') as f:
+        carry = b''
+        while True:
+            block = f.read(chunk_bytes)
+            if not block:
+                break
+            block = carry + block
+            cut = block.rfind(b'\n') + 1
+            if not cut:
+                carry = block
+                continue
+            carry = block[cut:]
+            yield np.frombuffer(block, dtype=np.uint8, count=cut)
+        if carry:
+            yield np.frombuffer(carry, dtype=np.uint8)
+
+
+def _concat_atoms(parts, dtype) -> Dict[str, np.ndarray]:
+    if not parts:
+        atoms = {'coords': np.empty((0, 3), dtype=dtype), 'model': np.empty(0, dtype=np.int64)}
+        atoms.update({field: np.empty(0, dtype=f'U{end - start}') for field, (start, end) in _TEXT_FIELDS.items()})
+        atoms.update({field: np.empty(0, dtype=np.int64) for field in _INT_FIELDS})
+        return atoms
+    if len(parts) == 1:
+        return parts[0]
+    # Campo por campo, soltando los bloques ya copiados: el pico es la salida más un campo
+    return {key: np.concatenate([part.pop(key) for part in parts]) for key in list(parts[0])}
+
+
+def parse_pdb_bytes(data: bytes, records: Iterable[str] = ('ATOM', 'HETATM'), dtype=float,
+                    elements: Optional[Iterable[str]] = None, chunk_bytes: int = CHUNK_BYTES) -> Dict[str, np.ndarray]:
+    """Parsea el contenido de un PDB a columnas (ver read_pdb)."""
+    return _read_blocks(_iter_line_blocks(data, chunk_bytes), tuple(records), dtype, elements)
+
+
+def _read_blocks(blocks: Iterable[np.ndarray], records, dtype, elements) -> Dict[str, np.ndarray]:
+    if elements is not None:
+        elements = list(elements)
+    parts, models = [], 0
+    for buf in blocks:
+        atoms, block_models = _parse_chunk(buf, records, dtype, elements)
+        atoms['model'] += models
+        models += block_models
+        if len(atoms['coords']):
+            parts.append(atoms)
+    return _concat_atoms(parts, dtype)
+
+
+def read_pdb(source: Union[str, bytes], records: Iterable[str] = ('ATOM', 'HETATM'), dtype=float,
+             elements: Optional[Iterable[str]] = None, chunk_bytes: int = CHUNK_BYTES) -> Dict[str, np.ndarray]:
+    """Lee un PDB (ruta o bytes) y devuelve sus átomos como arrays por columna.
+
+    Claves: 'coords' (N, 3) de tipo dtype; 'serial' y 'resSeq' enteros
+    (decimales o hybrid-36);
+    'record', 'name', 'altLoc', 'resName', 'chainID' y 'element' como str;
+    'model', la cantidad de registros MODEL anteriores a cada átomo (0 si no hay).
+    Solo se incluyen líneas que comienzan con alguno de records y llegan al
+    menos hasta la coordenada z; las de coordenadas inválidas se descartan.
+    Con elements, solo los átomos cuyo elemento (ver infer_elements) o nombre
+    está en elements: el resto no llega a convertirse. El archivo se procesa en bloques de chunk_bytes: la memoria temporal no
+    depende del tamaño del archivo.
+    """
+    return _read_blocks(_iter_line_blocks(source, chunk_bytes), tuple(records), dtype, elements)
+
+
+def infer_elements(atoms: Dict[str, np.ndarray]) -> np.ndarray:
+    """Elemento de cada átomo; si la columna 77-78 está vacía, la primera letra de name."""
+    elements = atoms['element'].copy()
+    missing = np.flatnonzero(elements == '')
+    if len(missing):
+        # Se infiere una vez por nombre distinto
+        names, inverse = np.unique(atoms['name'][missing], return_inverse=True)
+        inferred = [re.sub(r'[^A-Za-z]', '', name)[:1].upper() for name in names.tolist()]
+        elements[missing] = np.array(inferred, dtype=elements.dtype)[inverse.reshape(-1)]
+    return elements
@@ -1,3 +1,6 @@
+import numpy as np
+
+
 def calc_radius_of_gyration_and_cm_from_A(A_list):
     """
     A_list: lista de [x, y, z] (matriz A).
@@ -22,3 +25,21 @@ def calc_radius_of_gyration_and_cm_from_A(A_list):
     mean_pairwise_sq = 2.0 * mean_sq_to_CM
     r = float(np.sqrt(mean_pairwise_sq))
     return r, [float(CM[0]), float(CM[1]), float(CM[2])]
+
+
+def calc_radius_of_gyration_and_cm_series(frames):
+    """
+    frames: array (n_frames, n, 3), una matriz A por cuadro de la trayectoria.
+    Devuelve: (r, CM) con r de forma (n_frames,) y CM de forma (n_frames, 3),
+              calculados para todos los cuadros a la vez con la misma fórmula.
+    """
+    frames = np.asarray(frames, dtype=float)
+    if frames.ndim != 3 or frames.shape[1] == 0:
+        n_frames = frames.shape[0] if frames.ndim == 3 else 0
+        return np.zeros(n_frames), np.zeros((n_frames, 3))
+
+    CM = frames.mean(axis=1)
+    dif = frames - CM[:, None, :]
+    mean_sq_to_CM = np.mean(np.sum(dif * dif, axis=2), axis=1)
+    r = np.sqrt(2.0 * mean_sq_to_CM)
+    return r, CM
@@ -0,0 +1,211 @@
+"""
+Caché de resultados de /generate direccionada por contenido.
+
+La clave es el SHA-256 de (secuencia normalizada, sigma, topología). Los PDB
+generados se guardan en un directorio con tope de tamaño (se desalojan los de
+acceso más antiguo) y los más pequeños se mantienen además en un LRU en memoria.
+Cada instancia maneja una extensión (suffix) en su propio subdirectorio
+(cache/pdb, cache/npz, ...), así el PDB y el .npz de un mismo resultado
+comparten raíz con topes independientes.
+
+El tamaño en disco se lleva de forma incremental: cada escritura suma su tamaño
+y el directorio se recorre (y se desaloja) solo cuando la cuenta pasa max_bytes.
+Los archivos que escriben otros procesos entran en la cuenta en ese recorrido.
+
+get_encoded devuelve la variante comprimida (gzip/br) de un resultado: se guarda
+una vez junto al archivo en disco (<key><suffix>.gz/.br) y, si es chica, también
+en el LRU en memoria.
+
+Uso:
+    cache = ResultCache('cache', max_bytes=512 * 1024 * 1024)
+    key = cache_key(sequence, sigma, topology)
+    data = cache.get(key)              # bytes o None
+    for chunk in cache.store_stream(key, chunks):
+        ...                            # reenvía los chunks mientras los guarda
+"""
+from __future__ import annotations
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Iterable, Iterator, Optional
+
+from compression import ensure_precompressed
+
+VARIANT_SUFFIXES = ('.gz', '.br')
+
+
+def cache_key(sequence: str, sigma: float, topology: str, output_format: str = 'pdb') -> str:
+    """Clave estable para una combinación (secuencia, sigma, topología) y formato de salida."""
+    normalized = f"{sequence.strip().upper()}|{float(sigma)!r}|{topology}"
+    if output_format != 'pdb':
+        normalized += f"|{output_format}"
+    return hashlib.sha256(normalized.encode('ascii')).hexdigest()
+
+
+def variant_key(base_key: str, **params) -> str:
+    """Clave de una variante derivada (p. ej. formato o nivel de detalle) de un resultado o una subida."""
+    normalized = '|'.join([base_key] + [f"{name}={params[name]}" for name in sorted(params)])
+    return hashlib.sha256(normalized.encode('ascii')).hexdigest()
+
+
+class ResultCache:
+    """LRU en memoria delante de un almacén en disco con tope de tamaño."""
+
+    def __init__(self, directory: str, max_bytes: int = 512 * 1024 * 1024,
+                 memory_items: int = 32, memory_item_max_bytes: int = 4 * 1024 * 1024, suffix: str = '.pdb'):
+        self.root = directory
+        self.directory = os.path.join(directory, suffix.lstrip('.'))
+        self.suffix = suffix
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self.memory_item_max_bytes = memory_item_max_bytes
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = None  # bytes en disco según este proceso; None hasta el primer recuento
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}{self.suffix}")
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Devuelve el resultado desde memoria (o disco, promoviéndolo), o None."""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                return data
+        disk_path = self.disk_path(key)
+        if disk_path is None:
+            return None
+        # Otro proceso puede desalojar el archivo en cualquier momento
+        try:
+            if os.path.getsize(disk_path) > self.memory_item_max_bytes:
+                return None
+            with open(disk_path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        self._remember(key, data)
+        return data
+
+    def get_encoded(self, key: str, encoding: str) -> Optional[bytes]:
+        """Variante comprimida de un resultado, desde memoria o desde su archivo .gz/.br
+        (que se crea la primera vez). None si el resultado no está en disco."""
+        memory_key = f"{key}-{encoding}"
+        with self._lock:
+            data = self._memory.get(memory_key)
+            if data is not None:
+                self._memory.move_to_end(memory_key)
+                return data
+        disk_path = self.disk_path(key)
+        encoded_path = ensure_precompressed(disk_path, encoding) if disk_path is not None else None
+        if encoded_path is None:
+            return None
+        try:
+            with open(encoded_path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        if len(data) <= self.memory_item_max_bytes:
+            self._remember(memory_key, data)
+        return data
+
+    def disk_path(self, key: str) -> Optional[str]:
+        """Ruta del resultado en disco si existe (y marca el acceso), o None."""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def put(self, key: str, data: bytes) -> str:
+        """Guarda un resultado completo en disco y en memoria."""
+        for _ in self.store_stream(key, [data]):
+            pass
+        return self.path(key)
+
+    def store_stream(self, key: str, chunks: Iterable) -> Iterator:
+        """Reenvía los chunks (str o bytes) y los guarda en disco al terminar.
+
+        Escribe a un temporal y lo renombra al final, de modo que un resultado
+        parcial (cliente desconectado, error) nunca queda en la caché.
+        """
+        # El directorio puede haberse borrado mientras la app corre
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        size = 0
+        collected = []
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in chunks:
+                    data = chunk.encode() if isinstance(chunk, str) else chunk
+                    tmp.write(data)
+                    size += len(data)
+                    if size <= self.memory_item_max_bytes:
+                        collected.append(data)
+                    yield chunk
+            os.replace(tmp_path, self.path(key))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        if size <= self.memory_item_max_bytes:
+            self._remember(key, b''.join(collected))
+        self._count_written(size)
+
+    def _count_written(self, size: int) -> None:
+        """Suma una escritura a la cuenta de bytes y desaloja si pasa max_bytes."""
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += size
+            over = self._disk_bytes is None or self._disk_bytes > self.max_bytes
+        if over:
+            self.evict()
+
+    def evict(self) -> None:
+        """Elimina los archivos de acceso más antiguo hasta respetar max_bytes y recuenta el total."""
+        # Las variantes comprimidas (<key><suffix>.gz/.br) cuentan y se borran con su original
+        entries = {}
+        variant_sizes = {}
+        try:
+            scan = list(os.scandir(self.directory))
+        except OSError:
+            scan = []
+        for entry in scan:
+            name, _, variant = entry.name.partition(self.suffix)
+            if not entry.name.startswith(name + self.suffix) or (variant and variant not in VARIANT_SUFFIXES):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            if variant:
+                variant_sizes[name] = variant_sizes.get(name, 0) + stat.st_size
+            else:
+                entries[name] = (stat.st_mtime, stat.st_size, entry.path)
+        total = sum(size for _, size, _ in entries.values()) + sum(variant_sizes.values())
+        for _, size, path in sorted(entries.values()):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            for variant in VARIANT_SUFFIXES:
+                try:
+                    os.remove(path + variant)
+                except OSError:
+                    continue
+            total -= variant_sizes.get(os.path.basename(path)[:-len(self.suffix)], 0)
+        with self._lock:
+            self._disk_bytes = total
+
+    def _remember(self, key: str, data: bytes) -> None:
+        with self._lock:
+            self._memory[key] = data
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
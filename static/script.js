@@ -2,6 +2,11 @@ const dropArea = document.getElementById('drop-area');
 const progressBar = document.getElementById('progress-bar');
 const status = document.getElementById('status');
 const fileInput = document.getElementById('fileElem');
+const lodSelect = document.getElementById('lodSelect');
+
+// Con "Auto", los archivos más grandes que esto se muestran como traza de fósforos
+const AUTO_LOD_BYTES = 2 * 1024 * 1024;
+let currentUpload = null;
 
 ['dragenter', 'dragover', 'dragleave', 'drop'].forEach(event => {
     dropArea.addEventListener(event, e => e.preventDefault());
@@ -18,26 +23,24 @@ fileInput.addEventListener('change', () => {
 });
 
 function handleFile(file) {
-    if (!file || !file.name.endsWith('.pdb')) {
-        status.textContent = "Please upload a valid .pdb file.";
+    if (!file || !(file.name.endsWith('.pdb') || file.name.endsWith('.pdb.gz'))) {
+        status.textContent = "Please upload a valid .pdb or .pdb.gz file.";
         return;
     }
 
-    const formData = new FormData();
-    formData.append('file', file);
-
+    // Cuerpo crudo (no multipart): el servidor lo parsea a medida que llega
     const xhr = new XMLHttpRequest();
-    xhr.open('POST', '/upload');
+    xhr.open('POST', `/upload?filename=${encodeURIComponent(file.name)}`);
+    xhr.setRequestHeader('Content-Type', 'application/octet-stream');
 
     xhr.onload = () => {
         const response = JSON.parse(xhr.responseText);
         if (xhr.status === 200 && response.success) {
             status.textContent = `File "${response.filename}" uploaded successfully.`;
-            fetch(`/uploads/${response.filename}`)
-                .then(res => res.text())
-                .then(pdbData => {
-                    renderMolecule(pdbData, response.filename);
-                });
+            // Para .pdb.gz se estima el tamaño descomprimido (el PDB comprime ~6x)
+            const size = file.name.endsWith('.gz') ? file.size * 6 : file.size;
+            currentUpload = { filename: response.filename, size };
+            loadUpload(currentUpload);
         } else {
             status.textContent = `Upload failed: ${response.error}`;
         }
@@ -53,7 +56,35 @@ function handleFile(file) {
         }
     });
 
-    xhr.send(formData);
+    xhr.send(file);
+}
+
+lodSelect.addEventListener('change', () => {
+    if (currentUpload) loadUpload(currentUpload);
+});
+
+function selectedLevelOfDetail(size) {
+    const lod = lodSelect.value;
+    if (lod !== 'auto') return lod;
+    return size > AUTO_LOD_BYTES ? 'backbone' : 'full';
+}
+
+function loadUpload(upload) {
+    const lod = selectedLevelOfDetail(upload.size);
+    const url = lod === 'full'
+        ? `/uploads/${upload.filename}`
+        : `/uploads/${upload.filename}?lod=${lod}`;
+    fetch(url)
+        .then(res => {
+            if (!res.ok) return res.json().then(data => { throw new Error(data.error); });
+            return res.text();
+        })
+        .then(pdbData => {
+            renderMolecule(pdbData, upload.filename, lod);
+        })
+        .catch(error => {
+            status.textContent = `Could not load the structure: ${error.message}`;
+        });
 }
 
 function openModal() {
@@ -85,21 +116,20 @@ function submitSequence() {
 
     status.textContent = 'Generating...';
 
-    fetch('/generate', {
+    // Encola la generación y sondea su estado; la descarga se hace al terminar
+    fetch('/jobs/generate', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ sequence, sigma, topology })
     })
     .then(response => {
         if (!response.ok) throw new Error("Failed to generate PDB.");
-        return response.blob();
+        return response.json();
     })
-    .then(blob => {
-        const timestamp = new Date().toISOString().replace(/[:.]/g, '-');
-        const url = window.URL.createObjectURL(blob);
+    .then(job => waitForJob(job.job_id, status))
+    .then(job => {
         const a = document.createElement('a');
-        a.href = url;
-        a.download = `ADN_${timestamp}.pdb`;
+        a.href = `/jobs/${job.job_id}/result`;
         document.body.appendChild(a);
         a.click();
         a.remove();
@@ -115,7 +145,31 @@ function submitSequence() {
     closeModal();
 }
 
-function renderMolecule(pdbData, filename) {
+function waitForJob(jobId, status, intervalMs = 1000) {
+    return new Promise((resolve, reject) => {
+        const poll = () => {
+            fetch(`/jobs/${jobId}`)
+                .then(res => {
+                    if (!res.ok) throw new Error("Generation job not found.");
+                    return res.json();
+                })
+                .then(job => {
+                    if (job.status === 'done') {
+                        resolve(job);
+                    } else if (job.status === 'failed') {
+                        reject(new Error(job.error || "DNA generation failed."));
+                    } else {
+                        status.textContent = job.stage ? `Generating... (${job.stage})` : 'Queued...';
+                        setTimeout(poll, intervalMs);
+                    }
+                })
+                .catch(reject);
+        };
+        poll();
+    });
+}
+
+function renderMolecule(pdbData, filename, lod = 'full') {
     const viewerDiv = document.getElementById('viewer3d');
     const scrollY = window.scrollY;
 
@@ -132,21 +186,36 @@ function renderMolecule(pdbData, filename) {
 
         viewer.addModel(pdbData, "pdb");
 
-        viewer.setStyle({}, {
-            sphere: {
-                scale: 0.3,
-                colorscheme: atom => {
-                    const colorMap = {
-                        H: "white",
-                        O: "red",
-                        C: "black",
-                        N: "blue",
-                        P: "orange"
-                    };
-                    return colorMap[atom.elem] || "green";
+        if (lod === 'full') {
+            viewer.setStyle({}, {
+                sphere: {
+                    scale: 0.3,
+                    colorscheme: atom => {
+                        const colorMap = {
+                            H: "white",
+                            O: "red",
+                            C: "black",
+                            N: "blue",
+                            P: "orange"
+                        };
+                        return colorMap[atom.elem] || "green";
+                    }
                 }
-            }
-        });
+            });
+        } else {
+            // Variantes reducidas: esferas más grandes, coloreadas por cadena
+            const chainColors = ["orange", "deepskyblue", "limegreen", "violet"];
+            const chains = [];
+            viewer.setStyle({}, {
+                sphere: {
+                    radius: lod === 'bead' ? 3.0 : 1.5,
+                    colorscheme: atom => {
+                        if (!chains.includes(atom.chain)) chains.push(atom.chain);
+                        return chainColors[chains.indexOf(atom.chain) % chainColors.length];
+                    }
+                }
+            });
+        }
 
         viewer.addLabel("X", { position: { x: 20, y: 0, z: 0 }, fontColor: "white" });
         viewer.addLabel("Y", { position: { x: 0, y: 20, z: 0 }, fontColor: "white" });
@@ -0,0 +1,308 @@
+"""
+Detección de choques estéricos entre átomos no enlazados, con una grilla de celdas.
+
+Dos átomos chocan si se superponen más de overlap Å respecto de la suma de sus
+radios de van der Waals (criterio de MolProbity, 0.4 Å por defecto). No se
+comparan los átomos unidos por EXCLUDED_BONDS enlaces covalentes o menos:
+dentro de un residuo, según la topología de su tipo (de las plantillas de
+B-DNA o, para otros residuos, inferida por distancias covalentes); entre
+residuos vecinos de la misma cadena, a través del enlace O3'(i)-P(i+1), también
+entre el último y el primero si la cadena está cerrada. Todos los demás pares
+de átomos, incluidos los de residuos vecinos, se comparan. Los pares H···N/O
+tienen HBOND_ALLOWANCE Å extra de tolerancia, para no contar los puentes de
+hidrógeno como choques. Un tipo de residuo sin plantilla con más de
+MAX_RESIDUE_ATOMS átomos (p. ej. una subida con todo en un mismo residuo) no
+tiene topología: no se comparan pares dentro de esos residuos.
+
+Los átomos se reparten en celdas cúbicas de lado igual a la mayor distancia de
+choque posible; cada celda solo se compara con ella misma y con 13 de sus 26
+vecinas (la otra mitad la cubre la celda vecina), así que el costo es O(N) en
+vez de O(N^2) para densidades atómicas normales.
+
+    report = find_clashes(structure)   # dict de build_duplex, read_pdb o el registro
+    report['residue_pairs']            # pares de residuos que chocan, peor primero
+"""
+from __future__ import annotations
+import itertools
+from typing import Dict, Optional
+
+import numpy as np
+
+from structure_format import residue_starts
+
+VDW_RADII = {'H': 1.1, 'C': 1.7, 'N': 1.55, 'O': 1.52, 'P': 1.8, 'S': 1.8}
+DEFAULT_RADIUS = 1.7
+CLASH_OVERLAP = 0.4
+HBOND_ALLOWANCE = 0.8
+BOND_MAX_DISTANCE = 2.0  # O3'-P más largo que esto: la cadena no se cierra
+CHUNK_ATOMS = 65536
+MIN_CELL_SIZE = 0.5  # Å; celdas más chicas no aceleran y agrandan la grilla
+MAX_GRID_CELLS = 2 ** 20  # por eje: (2^20)^3 ids de celda entran en int64
+COVALENT_RADII = {'H': 0.31, 'C': 0.76, 'N': 0.71, 'O': 0.66, 'P': 1.07, 'S': 1.05}
+COVALENT_TOLERANCE = 0.45
+EXCLUDED_BONDS = 3  # pares 1-2, 1-3 y 1-4: su distancia la fija la geometría de enlace
+MAX_RESIDUE_ATOMS = 256  # tipos sin plantilla más grandes: sin topología (la matriz de saltos es k x k)
+
+# Mitad de las 26 celdas vecinas (las mayores en orden lexicográfico) más la propia
+_HALF_SHELL = [offset for offset in itertools.product((-1, 0, 1), repeat=3) if offset > (0, 0, 0)]
+# Superposición a partir de la cual no queda distancia de choque posible
+MAX_OVERLAP = 2 * max(max(VDW_RADII.values()), DEFAULT_RADIUS)
+
+
+def _radii(elements: np.ndarray) -> np.ndarray:
+    table, index = np.unique(np.asarray(elements, dtype=str), return_inverse=True)
+    radii = np.array([VDW_RADII.get(element.strip().upper(), DEFAULT_RADIUS) for element in table])
+    return radii[index.reshape(-1)]
+
+
+def neighbor_pairs(coords, cutoff: float, chunk_atoms: int = CHUNK_ATOMS):
+    """Pares (i, j) con i < j a menos de cutoff Å, buscados por celdas. Devuelve (i, j, distancias).
+
+    Lanza ValueError si cutoff no es finito y positivo.
+    """
+    cutoff = float(cutoff)
+    if not np.isfinite(cutoff) or cutoff <= 0:
+        raise ValueError(f"Invalid neighbor cutoff: {cutoff}")
+    coords = np.asarray(coords, dtype=float)
+    n_atoms = len(coords)
+    if n_atoms < 2:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0)
+    if not np.all(np.isfinite(coords)):
+        raise ValueError("Coordinates must be finite")
+    # Celdas de al menos cutoff Å (más grandes siguen siendo correctas), con tope de celdas por eje
+    origin = coords.min(axis=0)
+    extent = float((coords.max(axis=0) - origin).max())
+    cell_size = max(cutoff, MIN_CELL_SIZE, extent / MAX_GRID_CELLS)
+    # Celdas corridas en 1 y con una de margen: las vecinas nunca salen de la grilla
+    cells = np.floor((coords - origin) / cell_size).astype(np.int64) + 1
+    dims = cells.max(axis=0) + 2
+    cell_ids = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+    order = np.argsort(cell_ids, kind='stable')
+    sorted_ids = cell_ids[order]
+    sorted_coords = coords[order]
+
+    found_i, found_j, found_d = [], [], []
+    for offset in [(0, 0, 0)] + _HALF_SHELL:
+        delta = (offset[0] * dims[1] + offset[1]) * dims[2] + offset[2]
+        for lo in range(0, n_atoms, chunk_atoms):
+            atoms = np.arange(lo, min(lo + chunk_atoms, n_atoms))
+            target = sorted_ids[atoms] + delta
+            if delta == 0:
+                start = atoms + 1  # misma celda: solo los que siguen en el orden
+            else:
+                start = np.searchsorted(sorted_ids, target, side='left')
+            end = np.searchsorted(sorted_ids, target, side='right')
+            counts = np.maximum(end - start, 0)
+            total = int(counts.sum())
+            if not total:
+                continue
+            i = np.repeat(atoms, counts)
+            j = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(start, counts)
+            dist = np.linalg.norm(sorted_coords[i] - sorted_coords[j], axis=1)
+            close = dist < cutoff
+            found_i.append(order[i[close]])
+            found_j.append(order[j[close]])
+            found_d.append(dist[close])
+    if not found_i:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0)
+    i, j = np.concatenate(found_i), np.concatenate(found_j)
+    return np.minimum(i, j), np.maximum(i, j), np.concatenate(found_d)
+
+
+def _closed_chains(structure, starts, residue_chain, names) -> set:
+    """Cadenas cuyo último O3' está enlazado con el primer P (moléculas circulares)."""
+    closed = set()
+    coords = structure['coords']
+    for chain in dict.fromkeys(residue_chain.tolist()):
+        residues = np.flatnonzero(residue_chain == chain)
+        if len(residues) < 3:
+            continue
+        first = np.arange(starts[residues[0]], starts[residues[0] + 1])
+        last = np.arange(starts[residues[-1]], starts[residues[-1] + 1])
+        p, o3 = first[names[first] == 'P'], last[names[last] == "O3'"]
+        if len(p) and len(o3) and np.linalg.norm(coords[p[0]] - coords[o3[0]]) < BOND_MAX_DISTANCE:
+            closed.add(chain)
+    return closed
+
+
+def _bond_hops(coords: np.ndarray, elements: np.ndarray) -> np.ndarray:
+    """Enlaces que separan cada par de átomos de un residuo (hasta EXCLUDED_BONDS + 1).
+
+    Los enlaces se infieren por distancia covalente sobre coordenadas de referencia.
+    """
+    radii = np.array([COVALENT_RADII.get(element.strip().upper(), 0.76) for element in elements.tolist()])
+    dist = np.linalg.norm(coords[:, None] - coords[None, :], axis=2)
+    bonds = (dist < radii[:, None] + radii[None, :] + COVALENT_TOLERANCE).astype(np.int64)
+    hops = np.full(dist.shape, EXCLUDED_BONDS + 1, dtype=np.int64)
+    reach = np.eye(len(coords), dtype=np.int64)
+    hops[reach > 0] = 0
+    for k in range(1, EXCLUDED_BONDS + 1):
+        reach = ((reach @ bonds) > 0).astype(np.int64)
+        hops = np.where((reach > 0) & (hops > k), k, hops)
+    return hops
+
+
+def _reference_residues() -> Dict[str, Dict[str, np.ndarray]]:
+    """Un residuo ideal (coords, name, element) por resName de las plantillas de B-DNA."""
+    from generate_b_dna import get_template_store
+
+    residues = {}
+    for template in get_template_store().values():
+        for block in template['residues'].values():
+            res_name = str(template['resName'][block.start])
+            if res_name not in residues:
+                residues[res_name] = {key: np.asarray(template[key][block]) for key in ('coords', 'name', 'element')}
+    return residues
+
+
+def _residue_topologies(structure, starts, names, elements):
+    """Topología de cada tipo de residuo y posición de cada átomo en la de su residuo.
+
+    Devuelve (hops, offsets, widths, atom_type, local, link): las matrices de
+    _bond_hops de todos los tipos aplanadas en hops (la del tipo t empieza en
+    offsets[t] y tiene widths[t] columnas), el tipo de cada átomo, su índice en la
+    matriz de su tipo (-1 si el nombre no está) y link[i], los enlaces del átomo i
+    a O3' y a P de su residuo, (n, 2).
+    """
+    res_names = np.asarray(structure['resName'], dtype=str)[starts[:-1]]
+    references = _reference_residues()
+    type_names, residue_type = np.unique(res_names, return_inverse=True)
+    residue_type = residue_type.reshape(-1)
+    atom_type = np.repeat(residue_type, np.diff(starts))
+    local = np.full(len(names), -1, dtype=np.int64)
+    link = np.full((len(names), 2), EXCLUDED_BONDS + 1, dtype=np.int64)
+    hops = []
+    for t, res_name in enumerate(type_names.tolist()):
+        reference = references.get(res_name)
+        if reference is None:
+            # Tipo sin plantilla: su primer residuo en la estructura como referencia
+            first = int(np.flatnonzero(residue_type == t)[0])
+            block = slice(starts[first], starts[first + 1])
+            reference = {'coords': np.asarray(structure['coords'][block], dtype=float),
+                         'name': names[block], 'element': elements[block]}
+            if block.stop - block.start > MAX_RESIDUE_ATOMS:
+                # Sin topología: sus átomos quedan con local -1 y se excluyen dentro del residuo
+                hops.append(np.empty((0, 0), dtype=np.int64))
+                continue
+        type_hops = _bond_hops(np.asarray(reference['coords'], dtype=float), np.asarray(reference['element'], dtype=str))
+        hops.append(type_hops)
+        order = {name: k for k, name in enumerate(np.asarray(reference['name'], dtype=str).tolist())}
+        atoms = np.flatnonzero(atom_type == t)
+        local[atoms] = [order.get(name, -1) for name in names[atoms].tolist()]
+        for column, anchor in enumerate(("O3'", 'P')):
+            if anchor in order:
+                known = atoms[local[atoms] >= 0]
+                link[known, column] = type_hops[local[known], order[anchor]]
+    widths = np.array([len(type_hops) for type_hops in hops], dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(widths ** 2)[:-1]))
+    return np.concatenate([type_hops.ravel() for type_hops in hops]), offsets, widths, atom_type, local, link
+
+
+def _covalently_close(i, j, ri, rj, same_chain, residue_pos, chain_len, closed, topology) -> np.ndarray:
+    """True para los pares a EXCLUDED_BONDS enlaces o menos (ver el docstring del módulo)."""
+    hops, offsets, widths, atom_type, local, link = topology
+    close = np.zeros(len(i), dtype=bool)
+    same = np.flatnonzero(ri == rj)
+    if len(same):
+        li, lj = local[i[same]], local[j[same]]
+        known = (li >= 0) & (lj >= 0)
+        # Átomos sin nombre en la topología de su residuo: se excluyen del propio residuo
+        close[same[~known]] = True
+        types = atom_type[i[same[known]]]
+        close[same[known]] = hops[offsets[types] + li[known] * widths[types] + lj[known]] <= EXCLUDED_BONDS
+    # Residuos vecinos: i antes de j (O3' de i con P de j) o al revés
+    pos_i, pos_j, length = residue_pos[ri], residue_pos[rj], chain_len[ri]
+    wraps = closed[ri] & (length > 2)
+    i_first = same_chain & ((pos_j == pos_i + 1) | (wraps & (pos_i == length - 1) & (pos_j == 0)))
+    j_first = same_chain & ((pos_i == pos_j + 1) | (wraps & (pos_j == length - 1) & (pos_i == 0)))
+    close |= i_first & (link[i, 0] + 1 + link[j, 1] <= EXCLUDED_BONDS)
+    close |= j_first & (link[j, 0] + 1 + link[i, 1] <= EXCLUDED_BONDS)
+    return close
+
+
+def find_clashes(structure: Dict[str, np.ndarray], overlap: float = CLASH_OVERLAP,
+                 max_pairs: Optional[int] = 50) -> dict:
+    """Choques estéricos de una estructura (dict de arrays por átomo).
+
+    Devuelve conteos de pares de átomos y de residuos en choque, la peor
+    superposición y, por cada par de residuos (hasta max_pairs, peor primero),
+    el par de átomos más superpuesto. Lanza ValueError si overlap no está en
+    [0, MAX_OVERLAP).
+    """
+    if not (np.isfinite(overlap) and 0 <= overlap < MAX_OVERLAP):
+        raise ValueError(f"overlap must be in [0, {MAX_OVERLAP}) Å")
+    coords = np.asarray(structure['coords'], dtype=float)
+    names = np.asarray(structure['name'], dtype=str)
+    chain_ids = np.asarray(structure['chainID'], dtype=str)
+    res_seqs = np.asarray(structure['resSeq'])
+    radii = _radii(structure['element'])
+    report = {'atoms': int(len(coords)), 'overlap_cutoff': overlap, 'clashing_atom_pairs': 0,
+              'clashing_residue_pairs': 0, 'worst_overlap': None, 'residue_pairs': []}
+    if len(coords) < 2:
+        return report
+
+    starts = np.asarray(structure['residue_starts']) if 'residue_starts' in structure else residue_starts(structure)
+    atom_residue = np.repeat(np.arange(len(starts) - 1), np.diff(starts))
+    residue_chain = chain_ids[starts[:-1]]
+    # Posición de cada residuo dentro de su cadena, y largo de la cadena
+    residue_pos = np.zeros(len(residue_chain), dtype=np.int64)
+    chain_len = np.zeros(len(residue_chain), dtype=np.int64)
+    for chain in dict.fromkeys(residue_chain.tolist()):
+        residues = np.flatnonzero(residue_chain == chain)
+        residue_pos[residues] = np.arange(len(residues))
+        chain_len[residues] = len(residues)
+    closed = np.isin(residue_chain, list(_closed_chains(structure, starts, residue_chain, names)))
+
+    cutoff = 2 * radii.max() - overlap
+    if cutoff <= 0:
+        return report  # con estos radios ningún par llega a superponerse tanto
+    i, j, dist = neighbor_pairs(coords, cutoff)
+    is_h = np.asarray(structure['element'], dtype=str) == 'H'
+    polar = np.isin(np.asarray(structure['element'], dtype=str), ('N', 'O'))
+    hbond = (is_h[i] & polar[j]) | (polar[i] & is_h[j])
+    pair_overlap = radii[i] + radii[j] - dist - np.where(hbond, HBOND_ALLOWANCE, 0.0)
+    # Solo los pares superpuestos pasan por la topología
+    candidate = pair_overlap > overlap
+    i, j, dist, pair_overlap = i[candidate], j[candidate], dist[candidate], pair_overlap[candidate]
+    ri, rj = atom_residue[i], atom_residue[j]
+    same_chain = residue_chain[ri] == residue_chain[rj]
+    topology = _residue_topologies(structure, starts, names, np.asarray(structure['element'], dtype=str))
+    clash = ~_covalently_close(i, j, ri, rj, same_chain, residue_pos, chain_len, closed, topology)
+    i, j, dist, pair_overlap = i[clash], j[clash], dist[clash], pair_overlap[clash]
+    if not len(i):
+        return report
+
+    # Un registro por par de residuos: el par de átomos más superpuesto
+    worst_first = np.argsort(-pair_overlap, kind='stable')
+    residue_pairs = np.stack([atom_residue[i], atom_residue[j]], axis=1)[worst_first]
+    _, first = np.unique(residue_pairs, axis=0, return_index=True)
+    first = worst_first[np.sort(first)]
+    report.update({
+        'clashing_atom_pairs': int(len(i)),
+        'clashing_residue_pairs': int(len(first)),
+        'worst_overlap': round(float(pair_overlap[first[0]]), 3),
+        'residue_pairs': [
+            {'chain_1': str(chain_ids[a]), 'residue_1': int(res_seqs[a]), 'atom_1': str(names[a]),
+             'chain_2': str(chain_ids[b]), 'residue_2': int(res_seqs[b]), 'atom_2': str(names[b]),
+             'distance': round(float(d), 3), 'overlap': round(float(o), 3)}
+            for a, b, d, o in zip(i[first[:max_pairs]], j[first[:max_pairs]],
+                                  dist[first[:max_pairs]], pair_overlap[first[:max_pairs]])
+        ],
+    })
+    return report
+
+
+def format_clash_report(report: dict) -> str:
+    """Resumen de find_clashes en pocas líneas de texto."""
+    lines = [f"Atoms checked: {report['atoms']}"]
+    if not report['clashing_atom_pairs']:
+        lines.append(f"No clashes (overlap > {report['overlap_cutoff']} Å)")
+        return "\n".join(lines)
+    lines.append(f"{report['clashing_atom_pairs']} clashing atom pairs in "
+                 f"{report['clashing_residue_pairs']} residue pairs, worst overlap {report['worst_overlap']:.2f} Å")
+    for pair in report['residue_pairs']:
+        lines.append(f"  {pair['chain_1']}{pair['residue_1']} {pair['atom_1']} - "
+                     f"{pair['chain_2']}{pair['residue_2']} {pair['atom_2']}: {pair['distance']:.2f} Å")
+    return "\n".join(lines)
@@ -0,0 +1,151 @@
+"""
+Formato binario compacto de estructuras (.npz) junto al PDB.
+
+Guarda los mismos arrays por átomo que usan build_duplex, read_pdb y los
+escritores de ordenar_pdb, sin pasar por texto de ancho fijo:
+
+    coords          (N, 3) float32
+    name_table      nombres de átomo únicos; name_index (N,) uint16 indexa la tabla
+    resName_table / resName_index, chainID_table / chainID_index,
+    element_table / element_index   (igual que name)
+    resSeq          (N,) int32, sin el tope de 9,999 del PDB
+    residue_starts  (R + 1,) int64, primer átomo de cada residuo y N al final
+    format_version  versión del formato
+
+Como no hay columnas fijas, no aplican los topes de 99,999 átomos ni de
+9,999 residuos. Los arrays se guardan sin comprimir, así np.load lee cada uno
+con una sola copia.
+
+Uso:
+    from structure_format import save_structure, load_structure
+    save_structure(structure, 'ADN.npz')
+    structure = load_structure('ADN.npz')
+
+Uso CLI (conversión en ambos sentidos según la extensión):
+    python structure_format.py ADN_ordenado.pdb ADN_ordenado.npz
+"""
+from __future__ import annotations
+import io
+import os
+import sys
+import tempfile
+from typing import BinaryIO, Dict, Union
+
+import numpy as np
+
+from pdb_reader import read_pdb
+
+FORMAT_VERSION = 1
+STRUCTURE_MIMETYPE = 'application/x-npz'
+STRUCTURE_FIELDS = ('coords', 'name', 'resName', 'chainID', 'resSeq', 'element')
+_TABLE_FIELDS = ('name', 'resName', 'chainID', 'element')
+
+
+def residue_starts(structure: Dict[str, np.ndarray]) -> np.ndarray:
+    """Índice del primer átomo de cada residuo (cambio de cadena o de resSeq), más N al final."""
+    chain_ids = np.asarray(structure['chainID'])
+    res_seqs = np.asarray(structure['resSeq'])
+    n_atoms = len(res_seqs)
+    if not n_atoms:
+        return np.zeros(1, dtype=np.int64)
+    changes = (chain_ids[1:] != chain_ids[:-1]) | (res_seqs[1:] != res_seqs[:-1])
+    return np.concatenate(([0], np.flatnonzero(changes) + 1, [n_atoms])).astype(np.int64)
+
+
+def structure_arrays(structure: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Arrays del formato binario para una estructura (ver el docstring del módulo)."""
+    arrays = {
+        'format_version': np.array(FORMAT_VERSION),
+        'coords': np.asarray(structure['coords'], dtype=np.float32),
+        'resSeq': np.asarray(structure['resSeq'], dtype=np.int32),
+        'residue_starts': residue_starts(structure),
+    }
+    for field in _TABLE_FIELDS:
+        table, index = np.unique(np.asarray(structure[field], dtype=str), return_inverse=True)
+        if len(table) > np.iinfo(np.uint16).max:
+            raise ValueError(f"Too many distinct {field} values")
+        arrays[f'{field}_table'] = table
+        arrays[f'{field}_index'] = index.astype(np.uint16)
+    return arrays
+
+
+def save_structure(structure: Dict[str, np.ndarray], target: Union[str, BinaryIO]) -> None:
+    """Guarda la estructura en target (ruta o archivo binario); las rutas se escriben de forma atómica."""
+    arrays = structure_arrays(structure)
+    if not isinstance(target, (str, os.PathLike)):
+        np.savez(target, **arrays)
+        return
+    directory = os.path.dirname(os.path.abspath(target))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            np.savez(tmp, **arrays)
+        os.replace(tmp_path, target)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def arrays_bytes(arrays: Dict[str, np.ndarray]) -> bytes:
+    """Contenido del .npz para arrays ya en este formato (ver structure_arrays)."""
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def structure_bytes(structure: Dict[str, np.ndarray]) -> bytes:
+    """Contenido del .npz de una estructura, para respuestas HTTP."""
+    return arrays_bytes(structure_arrays(structure))
+
+
+def load_structure(source: Union[str, bytes, BinaryIO], dtype=float) -> Dict[str, np.ndarray]:
+    """Carga un .npz (ruta, bytes o archivo) como dict de arrays por átomo.
+
+    Devuelve las claves de build_duplex ('coords' de tipo dtype, 'name',
+    'resName', 'chainID', 'resSeq', 'element') más 'residue_starts'.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(bytes(source))
+    with np.load(source, allow_pickle=False) as data:
+        version = int(data['format_version']) if 'format_version' in data.files else 0
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported structure format version: {version}")
+        structure = {
+            'coords': data['coords'].astype(dtype),
+            'resSeq': data['resSeq'].astype(int),
+            'residue_starts': data['residue_starts'],
+        }
+        for field in _TABLE_FIELDS:
+            structure[field] = data[f'{field}_table'][data[f'{field}_index']]
+    return structure
+
+
+def is_structure_file(path: str) -> bool:
+    return path.lower().endswith('.npz')
+
+
+def read_structure(path: str, dtype=float) -> Dict[str, np.ndarray]:
+    """Lee una estructura en formato binario (.npz) o PDB, según la extensión."""
+    if is_structure_file(path):
+        return load_structure(path, dtype)
+    atoms = read_pdb(path, dtype=dtype)
+    return {field: atoms[field] for field in STRUCTURE_FIELDS}
+
+
+def main(argv=None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print("Uso: python structure_format.py entrada.(pdb|npz) salida.(npz|pdb)")
+        sys.exit(1)
+    input_path, output_path = argv
+    structure = read_structure(input_path)
+    if is_structure_file(output_path):
+        save_structure(structure, output_path)
+    else:
+        from ordenar_pdb import write_structure_pdb
+        write_structure_pdb(structure, output_path)
+    print(f"{len(structure['coords'])} átomos guardados en {output_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Selección de átomos por cadena, rango de residuos, nombre de átomo o elemento.
+
+Trabaja sobre los arrays del formato binario (structure_format / registro de
+subidas) con índices precalculados, sin recorrer todos los átomos:
+
+    {field}_order    átomos ordenados por {field}_index (name, resName, chainID, element)
+    {field}_offsets  (len(tabla) + 1,): los átomos con el valor k de la tabla son
+                     {field}_order[offsets[k]:offsets[k + 1]], en orden de archivo
+    residue_chain    chainID_index del primer átomo de cada residuo
+    residue_resSeq   resSeq de cada residuo
+
+Una selección por cadena o residuos filtra la tabla de residuos (R elementos) y
+la expande a rangos de átomos con residue_starts; una por nombre o elemento toma
+la lista de ese valor. Los filtros restantes se aplican solo sobre esos átomos.
+
+    index = selection_index(arrays)
+    atoms = select_atoms(arrays, index, chains=['A'], residue_range=(10, 50), names=['P'])
+"""
+from __future__ import annotations
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+INDEXED_FIELDS = ('name', 'resName', 'chainID', 'element')
+INDEX_ARRAYS = tuple(f'{field}_{kind}' for field in INDEXED_FIELDS for kind in ('order', 'offsets')) + (
+    'residue_chain', 'residue_resSeq')
+
+
+def selection_index(arrays: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Índices de selección (ver el docstring del módulo) para arrays en formato binario."""
+    starts = np.asarray(arrays['residue_starts'])
+    index = {
+        'residue_chain': np.asarray(arrays['chainID_index'])[starts[:-1]],
+        'residue_resSeq': np.asarray(arrays['resSeq'])[starts[:-1]],
+    }
+    for field in INDEXED_FIELDS:
+        codes = np.asarray(arrays[f'{field}_index'])
+        index[f'{field}_order'] = np.argsort(codes, kind='stable').astype(np.int64)
+        counts = np.bincount(codes, minlength=len(arrays[f'{field}_table']))
+        index[f'{field}_offsets'] = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+    return index
+
+
+def _codes(arrays, field: str, values: Sequence[str]) -> np.ndarray:
+    """Posiciones en la tabla de field de los valores pedidos (los que no existen se ignoran)."""
+    return np.flatnonzero(np.isin(arrays[f'{field}_table'], list(values)))
+
+
+def _expand_ranges(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Concatenación de arange(starts[k], ends[k]) para todos los k."""
+    counts = ends - starts
+    total = int(counts.sum())
+    return np.arange(total, dtype=np.int64) - np.repeat(np.cumsum(counts) - counts - starts, counts)
+
+
+def select_atoms(arrays: Dict[str, np.ndarray], index: Dict[str, np.ndarray],
+                 chains: Optional[Sequence[str]] = None, residue_range: Optional[Tuple[int, int]] = None,
+                 names: Optional[Sequence[str]] = None, elements: Optional[Sequence[str]] = None) -> np.ndarray:
+    """Índices (en orden de archivo) de los átomos que cumplen todos los filtros dados."""
+    atoms = None
+    if chains is not None or residue_range is not None:
+        keep = np.ones(len(index['residue_chain']), dtype=bool)
+        if chains is not None:
+            keep &= np.isin(index['residue_chain'], _codes(arrays, 'chainID', chains))
+        if residue_range is not None:
+            low, high = residue_range
+            keep &= (index['residue_resSeq'] >= low) & (index['residue_resSeq'] <= high)
+        residues = np.flatnonzero(keep)
+        starts = np.asarray(arrays['residue_starts'])
+        atoms = _expand_ranges(starts[residues], starts[residues + 1])
+
+    for field, values in (('name', names), ('element', elements)):
+        if values is None:
+            continue
+        codes = _codes(arrays, field, values)
+        if atoms is None:
+            order, offsets = index[f'{field}_order'], index[f'{field}_offsets']
+            atoms = np.sort(np.concatenate([order[offsets[code]:offsets[code + 1]] for code in codes]
+                                           or [np.empty(0, dtype=np.int64)]))
+        else:
+            atoms = atoms[np.isin(np.asarray(arrays[f'{field}_index'])[atoms], codes)]
+
+    if atoms is None:
+        atoms = np.arange(len(arrays['coords']), dtype=np.int64)
+    return atoms
+
+
+def selected_structure(arrays: Dict[str, np.ndarray], atoms: np.ndarray) -> Dict[str, np.ndarray]:
+    """Dict por átomo (como el de build_duplex) con solo los átomos seleccionados."""
+    structure = {field: np.asarray(arrays[f'{field}_table'])[np.asarray(arrays[f'{field}_index'])[atoms]]
+                 for field in INDEXED_FIELDS}
+    structure['coords'] = np.asarray(arrays['coords'])[atoms]
+    structure['resSeq'] = np.asarray(arrays['resSeq'])[atoms].astype(int)
+    return structure
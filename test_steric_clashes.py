@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from generate_b_dna import build_duplex
+from steric_clashes import MAX_OVERLAP, MAX_RESIDUE_ATOMS, find_clashes, neighbor_pairs
+
+SEQUENCE = 'ACGTTGCAACGGATCCTAGCTAGGCATCGA'
+
+
+def _residue(structure, chain, res_seq):
+    return (structure['chainID'] == chain) & (structure['resSeq'] == res_seq)
+
+
+def test_intact_duplex_has_no_backbone_linkage_clashes():
+    report = find_clashes(build_duplex(SEQUENCE, 0.0), max_pairs=None)
+    linkage = {"O3'", 'P', 'OP1', 'OP2', "O5'", "C3'", "C4'", "C5'"}
+    assert report['worst_overlap'] is None or report['worst_overlap'] < 1.0
+    assert not [pair for pair in report['residue_pairs']
+                if {pair['atom_1'], pair['atom_2']} <= linkage and pair['chain_1'] == pair['chain_2']]
+
+
+def test_collapsed_neighbour_residue_clashes():
+    structure = build_duplex(SEQUENCE, 0.0)
+    a20, a21 = _residue(structure, 'A', 20), _residue(structure, 'A', 21)
+    structure['coords'] = structure['coords'].copy()
+    structure['coords'][a21] += 0.9 * (structure['coords'][a20].mean(axis=0) - structure['coords'][a21].mean(axis=0))
+
+    report = find_clashes(structure, max_pairs=None)
+    neighbours = [pair for pair in report['residue_pairs']
+                  if {pair['residue_1'], pair['residue_2']} == {20, 21} and pair['chain_1'] == pair['chain_2'] == 'A']
+    assert neighbours and neighbours[0]['overlap'] > 2.0
+    assert report['worst_overlap'] == max(pair['overlap'] for pair in report['residue_pairs'])
+    assert np.isfinite(report['worst_overlap'])
+
+
+def test_oversized_untemplated_residue_skips_intra_residue_pairs():
+    n_atoms = 4 * MAX_RESIDUE_ATOMS
+    structure = {
+        'coords': np.zeros((n_atoms, 3)),
+        'name': np.array(['C%d' % k for k in range(n_atoms)]),
+        'resName': np.full(n_atoms, 'UNK'),
+        'chainID': np.full(n_atoms, 'A'),
+        'resSeq': np.ones(n_atoms, dtype=int),
+        'element': np.full(n_atoms, 'C'),
+    }
+    report = find_clashes(structure)
+    assert report['atoms'] == n_atoms
+    assert report['clashing_atom_pairs'] == 0
+
+
+@pytest.mark.parametrize('overlap', [-0.1, MAX_OVERLAP, 3.6, float('inf'), float('nan')])
+def test_out_of_range_overlap_is_rejected(overlap):
+    with pytest.raises(ValueError):
+        find_clashes(build_duplex('ACGT', 0.0), overlap=overlap)
+
+
+@pytest.mark.parametrize('cutoff', [0.0, -1.0, float('inf'), float('nan')])
+def test_neighbor_pairs_rejects_invalid_cutoff(cutoff):
+    with pytest.raises(ValueError):
+        neighbor_pairs(np.zeros((4, 3)), cutoff)
+
+
+def test_tiny_cutoff_keeps_a_bounded_grid():
+    coords = np.array([[0.0, 0.0, 0.0], [1e-4, 0.0, 0.0], [5000.0, 5000.0, 5000.0]])
+    i, j, dist = neighbor_pairs(coords, 1e-3)
+    assert list(zip(i.tolist(), j.tolist())) == [(0, 1)]
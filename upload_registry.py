@@ -0,0 +1,246 @@
+"""
+Registro de estructuras subidas, compartido entre workers por memoria mapeada.
+
+Cada PDB subido se parsea una sola vez y sus arrays (los de structure_format:
+coords float32, índices de nombres, resSeq, residue_starts) se guardan como
+.npy sueltos en uploads/structures/<hash>/, direccionados por el SHA-256 del
+contenido. Los análisis los abren con np.load(mmap_mode='r'): los workers de
+gunicorn del mismo host comparten las páginas del page cache en lugar de tener
+cada uno su copia parseada.
+
+    registry = UploadRegistry('uploads')
+    registry.add(content_hash, tmp_path)          # al terminar la subida, antes de
+    registry.link('miADN.pdb', content_hash)      # reemplazar uploads/miADN.pdb
+    entry = registry.get('miADN.pdb')             # parsea si no se registró antes
+    entry.coords                                  # (N, 3) memmap float32
+    entry.mask('name', 'P')                       # sin decodificar los nombres
+    entry.select(chains=['A'], residue_range=(10, 50))  # con índices precalculados
+
+Las entradas de acceso más antiguo se desalojan cuando el total pasa de
+max_bytes (el acceso se marca con la fecha de modificación del directorio).
+Un worker que ya tiene mapeada una entrada desalojada la sigue leyendo hasta
+soltarla.
+"""
+from __future__ import annotations
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+from pdb_reader import read_pdb
+from structure_format import FORMAT_VERSION, STRUCTURE_FIELDS, structure_arrays
+from structure_selection import INDEX_ARRAYS, select_atoms, selection_index
+
+_HASH_RE = re.compile(r'[0-9a-f]{64}')
+_TABLE_FIELDS = ('name', 'resName', 'chainID', 'element')
+_MAPPED_ARRAYS = ('coords', 'resSeq', 'residue_starts') + tuple(f'{field}_index' for field in _TABLE_FIELDS)
+
+
+def file_hash(path: str, chunk_bytes: int = 1024 * 1024) -> str:
+    """SHA-256 del contenido de un archivo (el mismo que calcula PCoordStreamParser)."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_bytes), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _save_arrays(directory: str, arrays: Dict[str, np.ndarray]) -> None:
+    """Guarda cada array como <nombre>.npy con escritura atómica (otro worker puede estar leyendo)."""
+    for name, array in arrays.items():
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                np.save(tmp, array)
+            os.replace(tmp_path, os.path.join(directory, f'{name}.npy'))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+class RegisteredStructure:
+    """Arrays mapeados de una estructura registrada; los nombres quedan como tabla + índice."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.content_hash = os.path.basename(directory)
+        arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+                  for name in _MAPPED_ARRAYS}
+        self.coords = arrays['coords']
+        self.resSeq = arrays['resSeq']
+        self.residue_starts = arrays['residue_starts']
+        self.indexes = {field: arrays[f'{field}_index'] for field in _TABLE_FIELDS}
+        self.tables = {field: np.load(os.path.join(directory, f'{field}_table.npy'))
+                       for field in _TABLE_FIELDS}
+        self._selection_index = None
+
+    def __len__(self) -> int:
+        return len(self.coords)
+
+    def column(self, field: str) -> np.ndarray:
+        """Columna decodificada (copia en memoria del proceso) de name, resName, chainID o element."""
+        return self.tables[field][self.indexes[field]]
+
+    def mask(self, field: str, value: str) -> np.ndarray:
+        """Átomos cuyo field es value, comparando índices (sin decodificar la columna)."""
+        matches = np.flatnonzero(self.tables[field] == value)
+        if not matches.size:
+            return np.zeros(len(self), dtype=bool)
+        return self.indexes[field] == matches[0]
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """Arrays en el formato de structure_format (para servir el .npz sin decodificar nada)."""
+        arrays = {'format_version': np.array(FORMAT_VERSION), 'coords': self.coords, 'resSeq': self.resSeq,
+                  'residue_starts': self.residue_starts}
+        for field in _TABLE_FIELDS:
+            arrays[f'{field}_table'] = self.tables[field]
+            arrays[f'{field}_index'] = self.indexes[field]
+        return arrays
+
+    def selection_index(self) -> Dict[str, np.ndarray]:
+        """Índices de structure_selection, mapeados; se calculan y guardan si la entrada es anterior a ellos."""
+        if self._selection_index is None:
+            paths = {name: os.path.join(self.directory, f'{name}.npy') for name in INDEX_ARRAYS}
+            if not all(os.path.exists(path) for path in paths.values()):
+                _save_arrays(self.directory, selection_index(self.arrays()))
+            self._selection_index = {name: np.load(path, mmap_mode='r') for name, path in paths.items()}
+        return self._selection_index
+
+    def select(self, **filters) -> np.ndarray:
+        """Índices de los átomos seleccionados (ver structure_selection.select_atoms)."""
+        return select_atoms(self.arrays(), self.selection_index(), **filters)
+
+    def structure(self, dtype=float) -> Dict[str, np.ndarray]:
+        """Dict por átomo como el de build_duplex (para los escritores y análisis existentes)."""
+        structure = {field: self.column(field) for field in _TABLE_FIELDS}
+        structure['coords'] = np.asarray(self.coords, dtype=dtype)
+        structure['resSeq'] = np.asarray(self.resSeq, dtype=int)
+        return structure
+
+
+class UploadRegistry:
+    """Arrays parseados de las subidas en disco, por hash de contenido, con tope de tamaño."""
+
+    def __init__(self, upload_dir: str, max_bytes: int = 1024 * 1024 * 1024, open_items: int = 64):
+        self.upload_dir = upload_dir
+        self.directory = os.path.join(upload_dir, 'structures')
+        self.names_dir = os.path.join(self.directory, 'names')
+        self.max_bytes = max_bytes
+        self.open_items = open_items
+        self._open: OrderedDict[str, RegisteredStructure] = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(self.names_dir, exist_ok=True)
+
+    def _entry_dir(self, content_hash: str) -> str:
+        return os.path.join(self.directory, content_hash)
+
+    def link(self, filename: str, content_hash: str) -> None:
+        """Asocia el nombre de un archivo subido con el hash de su contenido actual."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.names_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='ascii') as tmp:
+                tmp.write(content_hash)
+            os.replace(tmp_path, os.path.join(self.names_dir, filename))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def lookup(self, filename: str) -> Optional[str]:
+        """Hash asociado a un archivo subido; si no hay vínculo, se calcula del archivo. None si no existe."""
+        try:
+            with open(os.path.join(self.names_dir, filename), 'r', encoding='ascii') as f:
+                content_hash = f.read().strip()
+            if _HASH_RE.fullmatch(content_hash):
+                return content_hash
+        except OSError:
+            pass
+        path = os.path.join(self.upload_dir, filename)
+        if not os.path.isfile(path):
+            return None
+        content_hash = file_hash(path)
+        self.link(filename, content_hash)
+        return content_hash
+
+    def add(self, content_hash: str, source) -> str:
+        """Parsea source (ruta o bytes de un PDB) y guarda sus arrays; no hace nada si ya están."""
+        entry_dir = self._entry_dir(content_hash)
+        if os.path.isdir(entry_dir):
+            return entry_dir
+        atoms = read_pdb(source)
+        arrays = structure_arrays({field: atoms[field] for field in STRUCTURE_FIELDS})
+        arrays.pop('format_version')
+        arrays.update(selection_index(arrays))
+        tmp_dir = tempfile.mkdtemp(dir=self.directory, prefix='.tmp-')
+        try:
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp_dir, f'{name}.npy'), array)
+            try:
+                os.rename(tmp_dir, entry_dir)
+            except OSError:
+                # Otro worker registró el mismo contenido en paralelo
+                if not os.path.isdir(entry_dir):
+                    raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.evict()
+        return entry_dir
+
+    def get(self, filename: str) -> Optional[RegisteredStructure]:
+        """Estructura registrada de un archivo subido (la registra si hace falta), o None si no existe."""
+        content_hash = self.lookup(filename)
+        if content_hash is None:
+            return None
+        with self._lock:
+            entry = self._open.get(content_hash)
+            if entry is not None and os.path.isdir(entry.directory):
+                self._open.move_to_end(content_hash)
+                self._touch(entry.directory)
+                return entry
+        entry_dir = self._entry_dir(content_hash)
+        if not os.path.isdir(entry_dir):
+            path = os.path.join(self.upload_dir, filename)
+            if not os.path.isfile(path):
+                return None
+            self.add(content_hash, path)
+        self._touch(entry_dir)
+        entry = RegisteredStructure(entry_dir)
+        with self._lock:
+            self._open[content_hash] = entry
+            self._open.move_to_end(content_hash)
+            while len(self._open) > self.open_items:
+                self._open.popitem(last=False)
+        return entry
+
+    @staticmethod
+    def _touch(entry_dir: str) -> None:
+        try:
+            os.utime(entry_dir)
+        except OSError:
+            pass
+
+    def evict(self) -> None:
+        """Borra las entradas de acceso más antiguo hasta respetar max_bytes."""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if not _HASH_RE.fullmatch(entry.name):
+                continue
+            try:
+                size = sum(f.stat().st_size for f in os.scandir(entry.path))
+                mtime = entry.stat().st_mtime
+            except OSError:
+                continue
+            entries.append((mtime, size, entry.path))
+            total += size
+        # La más reciente se conserva aunque sola pase el tope: es la que se está usando
+        for _, size, path in sorted(entries)[:-1]:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
@@ -0,0 +1,218 @@
+"""
+Writhe (Wr), twist (Tw) y número de enlace (Lk) a partir de las hebras de P.
+
+Con las matrices A y B de pcoords_extraction (P de cada hebra en orden de
+archivo; B empieza por el nucleótido apareado con el último de A):
+
+    eje     punto medio de cada par A[i] / B[n-1-i], suavizado con una media
+            móvil de una vuelta de hélice (cancela el desplazamiento de los P)
+    Wr      integral doble de Gauss del eje sobre sí mismo
+    Lk      integral de enlace de Gauss entre el eje y la hebra A (entero si
+            la molécula es circular)
+    Tw      Lk - Wr en moléculas circulares; en lineales, el giro local de la
+            hebra alrededor del eje con transporte paralelo (y Lk = Tw + Wr)
+
+Las integrales dobles son O(n^2) en pares de segmentos: se evalúan en bloques
+de TILE x TILE segmentos (arrays de unos cientos de KB, que entran en caché)
+repartidos en un pool de hilos; NumPy libera el GIL en la aritmética.
+Con method='sampled', el Wr se calcula sobre el eje submuestreado a
+max_segments puntos (el eje ya es suave, así que el error es chico) y el Tw con
+la fórmula local O(n); Lk = Tw + Wr deja de ser exactamente entero.
+"""
+from __future__ import annotations
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import numpy as np
+
+TILE = 128
+HELICAL_REPEAT = 10.5
+SAMPLED_MAX_SEGMENTS = 2000
+THREADS = int(os.environ.get('WRITHE_THREADS', os.cpu_count() or 1))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=THREADS, thread_name_prefix='writhe')
+        return _pool
+
+
+def _unit(v: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(v, axis=-1, keepdims=True)
+    return np.divide(v, norm, out=np.zeros_like(v), where=norm > 0)
+
+
+def _segments(points: np.ndarray, closed: bool):
+    """(inicios, finales) de los segmentos de una curva poligonal."""
+    ends = np.roll(points, -1, axis=0) if closed else points[1:]
+    return (points if closed else points[:-1]), ends
+
+
+def _solid_angles(r1, r2, r3, r4) -> np.ndarray:
+    """Ángulo sólido con signo entre los segmentos r1->r2 (filas) y r3->r4 (columnas).
+
+    Fórmula de Klenin y Langowski (2000); los pares degenerados (segmentos
+    que se tocan) dan 0.
+    """
+    r1, r2 = r1[:, None, :], r2[:, None, :]
+    r3, r4 = r3[None, :, :], r4[None, :, :]
+    r13, r14, r23, r24 = r3 - r1, r4 - r1, r3 - r2, r4 - r2
+    n1 = _unit(np.cross(r13, r14))
+    n2 = _unit(np.cross(r14, r24))
+    n3 = _unit(np.cross(r24, r23))
+    n4 = _unit(np.cross(r23, r13))
+    omega = sum(np.arcsin(np.clip(np.einsum('ijk,ijk->ij', a, b), -1.0, 1.0))
+                for a, b in ((n1, n2), (n2, n3), (n3, n4), (n4, n1)))
+    sign = np.sign(np.einsum('ijk,ijk->ij', np.cross(r4 - r3, r2 - r1), r13))
+    return omega * sign
+
+
+def _tile_sum(starts1, ends1, starts2, ends2, i0, j0, exclude_adjacent, n_segments, closed) -> float:
+    i1, j1 = min(i0 + TILE, len(starts1)), min(j0 + TILE, len(starts2))
+    omega = _solid_angles(starts1[i0:i1], ends1[i0:i1], starts2[j0:j1], ends2[j0:j1])
+    if exclude_adjacent:
+        # Writhe: se descartan i == j y los segmentos vecinos (comparten un vértice)
+        gap = np.abs(np.arange(i0, i1)[:, None] - np.arange(j0, j1)[None, :])
+        if closed:
+            gap = np.minimum(gap, n_segments - gap)
+        omega = np.where(gap > 1, omega, 0.0)
+        if i0 == j0:
+            omega = np.triu(omega, 1)  # el bloque diagonal solo cuenta i < j
+    return float(np.nansum(omega))
+
+
+def _gauss_sum(starts1, ends1, starts2, ends2, symmetric: bool, closed: bool) -> float:
+    """Suma de ángulos sólidos sobre todos los pares de segmentos, por bloques en el pool de hilos."""
+    n1, n2 = len(starts1), len(starts2)
+    tiles = [(i0, j0) for i0 in range(0, n1, TILE) for j0 in range(0, n2, TILE) if not symmetric or j0 >= i0]
+    pool = _get_pool()
+    futures = [pool.submit(_tile_sum, starts1, ends1, starts2, ends2, i0, j0, symmetric, n1, closed)
+               for i0, j0 in tiles]
+    return sum(future.result() for future in futures)
+
+
+def calc_writhe(curve, closed: bool = True) -> float:
+    """Writhe de una curva poligonal (n, 3) con la integral doble de Gauss."""
+    curve = np.asarray(curve, dtype=float)
+    if len(curve) < 4:
+        return 0.0
+    starts, ends = _segments(curve, closed)
+    return 2.0 * _gauss_sum(starts, ends, starts, ends, symmetric=True, closed=closed) / (4 * math.pi)
+
+
+def calc_linking_number(curve1, curve2) -> float:
+    """Número de enlace de Gauss entre dos curvas cerradas (n, 3) y (m, 3)."""
+    s1, e1 = _segments(np.asarray(curve1, dtype=float), True)
+    s2, e2 = _segments(np.asarray(curve2, dtype=float), True)
+    return _gauss_sum(s1, e1, s2, e2, symmetric=False, closed=True) / (4 * math.pi)
+
+
+def calc_local_twist(axis, strand, closed: bool = True) -> float:
+    """Vueltas de la hebra alrededor del eje, con transporte paralelo del vector radial."""
+    axis = np.asarray(axis, dtype=float)
+    strand = np.asarray(strand, dtype=float)
+    if len(axis) < 3:
+        return 0.0
+    if closed:
+        tangents = _unit(np.roll(axis, -1, axis=0) - np.roll(axis, 1, axis=0))
+    else:
+        tangents = _unit(np.gradient(axis, axis=0))
+    radial = strand - axis
+    u = _unit(radial - np.einsum('ij,ij->i', radial, tangents)[:, None] * tangents)
+
+    t0, u0 = tangents, u
+    t1, u1 = np.roll(tangents, -1, axis=0), np.roll(u, -1, axis=0)
+    if not closed:
+        t0, u0, t1, u1 = t0[:-1], u0[:-1], t1[:-1], u1[:-1]
+    # Rotación mínima (Rodrigues) que lleva t1 a t0, aplicada a u1
+    k = np.cross(t1, t0)
+    sin_a = np.linalg.norm(k, axis=1)
+    cos_a = np.einsum('ij,ij->i', t1, t0)
+    k = _unit(k)
+    u1 = (u1 * cos_a[:, None] + np.cross(k, u1) * sin_a[:, None]
+          + k * np.einsum('ij,ij->i', k, u1)[:, None] * (1 - cos_a)[:, None])
+    angles = np.arctan2(np.einsum('ij,ij->i', np.cross(u0, u1), t0), np.einsum('ij,ij->i', u0, u1))
+    return float(angles.sum() / (2 * math.pi))
+
+
+def helix_axis(A, B, closed: bool, helical_repeat: float = HELICAL_REPEAT) -> np.ndarray:
+    """Eje de la doble hélice: puntos medios de los pares de P suavizados sobre una vuelta."""
+    A = np.asarray(A, dtype=float)
+    B = np.asarray(B, dtype=float)[::-1]
+    midpoints = (A + B) / 2
+    window = max(1, int(round(helical_repeat)))
+    if window == 1 or len(midpoints) < window:
+        return midpoints
+    kernel = np.ones(window) / window
+    if closed:
+        padded = np.concatenate([midpoints[-(window // 2):], midpoints, midpoints[:window - 1 - window // 2]])
+        return np.stack([np.convolve(padded[:, axis], kernel, mode='valid') for axis in range(3)], axis=1)
+    # En los extremos de una molécula lineal la ventana se acorta
+    counts = np.convolve(np.ones(len(midpoints)), kernel * window, mode='same')
+    return np.stack([np.convolve(midpoints[:, axis], kernel * window, mode='same') / counts
+                     for axis in range(3)], axis=1)
+
+
+def is_closed(A, B, tolerance: float = 3.0) -> bool:
+    """True si el dúplex se cierra: el último punto medio de par está a menos de tolerance
+    veces el paso medio del primero (se miran los pares y no una hebra, cuya fase al cerrar varía)."""
+    A = np.asarray(A, dtype=float)
+    if len(A) < 4:
+        return False
+    midpoints = (A + np.asarray(B, dtype=float)[::-1]) / 2
+    steps = np.linalg.norm(np.diff(midpoints, axis=0), axis=1)
+    return bool(np.linalg.norm(midpoints[-1] - midpoints[0]) < tolerance * np.median(steps))
+
+
+def calc_supercoiling_from_AB(A, B, closed: Optional[bool] = None, method: str = 'exact',
+                              max_segments: int = SAMPLED_MAX_SEGMENTS,
+                              helical_repeat: float = HELICAL_REPEAT) -> dict:
+    """Wr, Tw y Lk de un dúplex a partir de las matrices A y B de P.
+
+    closed=None detecta si la molécula es circular (ver is_closed).
+    Devuelve también Lk0 = n / helical_repeat y sigma = (Lk - Lk0) / Lk0.
+    """
+    A = np.asarray(A, dtype=float)
+    B = np.asarray(B, dtype=float)
+    if len(A) != len(B) or len(A) < 4:
+        raise ValueError("Writhe needs two strands with the same number (>= 4) of P atoms")
+    if method not in ('exact', 'sampled'):
+        raise ValueError(f"Unknown method: {method}")
+    if closed is None:
+        closed = is_closed(A, B)
+
+    axis = helix_axis(A, B, closed, helical_repeat)
+    sampled = method == 'sampled' and len(axis) > max_segments
+    if sampled:
+        coarse = axis[np.linspace(0, len(axis), max_segments, endpoint=False).astype(int)]
+        writhe = calc_writhe(coarse, closed)
+    else:
+        writhe = calc_writhe(axis, closed)
+
+    if closed and not sampled:
+        linking = calc_linking_number(axis, A)
+        twist = linking - writhe
+    else:
+        twist = calc_local_twist(axis, A, closed)
+        linking = twist + writhe
+
+    lk0 = len(A) / helical_repeat
+    return {
+        'Wr': writhe,
+        'Tw': twist,
+        'Lk': linking,
+        'Lk_rounded': int(round(linking)) if closed else None,
+        'Lk0': lk0,
+        'sigma': (linking - lk0) / lk0,
+        'closed': closed,
+        'method': 'sampled' if sampled else 'exact',
+        'n_base_pairs': len(A),
+    }